@@ -12,197 +12,428 @@
 # Complete test data:
 # python climate_trace.py -d ../test/climate-trace -c ../templates/climate-trace-specification.csv -s ../templates/ermin-specification.csv
 #
+# Complete test data, processing sectors in 4 worker processes:
+# python climate_trace.py -d ../test/climate-trace -c ../templates/climate-trace-specification.csv -s ../templates/ermin-specification.csv -w 4
+#
+# Complete test data, staged as Parquet so that re-runs skip CSV parsing:
+# python climate_trace.py -d ../test/climate-trace -c ../templates/climate-trace-specification.csv -s ../templates/ermin-specification.csv -S ../staged/climate-trace
+#
+# Complete test data, reusing results for sector files unchanged since the last run:
+# python climate_trace.py -d ../test/climate-trace -c ../templates/climate-trace-specification.csv -s ../templates/ermin-specification.csv -C ../cache/climate-trace
+#
+# Complete test data, writing per-step timings and profiling the aluminum sector:
+# python climate_trace.py -d ../test/climate-trace -c ../templates/climate-trace-specification.csv -s ../templates/ermin-specification.csv -R run_report.json -P aluminum-test
+#
+# Complete test data, validating only rows changed since the last uploaded drop of each sector:
+# python climate_trace.py -d ../test/climate-trace -c ../templates/climate-trace-specification.csv -s ../templates/ermin-specification.csv -D ../snapshots/climate-trace --delta_output delta.csv
+#
+# Complete test data, streaming each sector file in blocks of 100000 rows into a Parquet dataset:
+# python climate_trace.py -d ../test/climate-trace -c ../templates/climate-trace-specification.csv -s ../templates/ermin-specification.csv -k 100000 --ermin_output ../ermin_parquet
+#
 # Test data with errors:
 # python climate_trace.py -d ../test/climate-trace2-missing-data -c ../templates/climate-trace-specification.csv -s ../templates/ermin-specification.csv
 
 import pandas as pd
-from datetime import datetime
 import re
-from utils.import_data import import_data_from_local
+import os
+from utils.import_data import list_data_files, data_file_info, read_data_file, spec_read_options
 import utils.validation as eev
 import argparse
-import ermin.syntax as ermin_syntax
 import ermin.validation as ev
-from collections import defaultdict
 from pathlib import Path
-from utils.versions import record_version
-
-
-def year_to_datetime(x):
-    start_time = datetime.isoformat(datetime.strptime(x.start_date, '%m/%d/%y'))
-    end_time = datetime.isoformat(datetime.strptime(x.end_date, '%m/%d/%y'))
-    return start_time, end_time
+from utils.versions import VersionRegistry
+from utils.reshape import wide_to_long, constant_column, compact_frame, CT_EMISSIONS_COLUMNS
+from utils.specification import load_specification
+from utils.staging import stage_raw_data, write_ermin_parquet
+from utils.arrow import ermin_table
+from utils.countries import country_names
+from utils.dates import detect_format, to_iso, ISO_FORMAT
+from utils.instrumentation import RunReport
+from utils.sources import Source, Unit, register_source, run_sources, process_unit
+from utils.diagnostics import Diagnostics
+from utils.fill_values import FillValues, fill_columns, TIMESTAMP_COLUMN
+
+# stage names in run reports (see --report_output), besides those of utils.sources
+STAGE_DATES = 'step0_dates'
+STAGE_CT_SPECIFICATION = 'step1_ct_specification'
+STAGE_CT_REQUIREMENTS = 'step1.5_ct_requirements'
+STAGE_RESHAPE = 'step2_reshape'
+STAGE_FILL = 'step2.5_fill'
+STAGE_UPLOAD = 'step4_upload'
+
+ERMIN_SPECIFICATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates', 'ermin-specification.csv')
+CT_SPECIFICATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates', 'climate-trace-specification.csv')
 
 
 def create_long_df(df):
-    """iterate through each value column, appending it to an empty df to make a long df"""
-
-    long_df = pd.DataFrame(columns = ['start_time', 'end_time', 'producing_entity_id', 'emission_quantity', \
-                                      'emission_quantity_units', 'emitted_product_formula', 'carbon_equivalency_method'])
-
-    data_columns = ['CO2_emissions_tonnes', 'CH4_emissions_tonnes', 'N2O_emissions_tonnes', 'total_CO2e_20yrGWP', \
-                'total_CO2e_100yrGWP']
-
-    for data_column in data_columns:
-        anchor_columns = ['start_time', 'end_time', 'producing_entity_id']
-        anchor_columns.append(data_column)
-        data_df = df[anchor_columns].copy() # copy to avoid warning re: setting values in a slice
-        data_df.rename(columns={f'{data_column}': 'emission_quantity'}, inplace=True)
-        data_df['emission_quantity_units'] = 'tonnes'
-        if data_column.endswith('GWP'):
-            data_df['emitted_product_formula'] = 'CO2e'
-            if data_column == 'total_CO2e_100yrGWP':
-                equivalency = '100-year'
-            elif data_column == 'total_CO2e_20yrGWP':
-                equivalency = '20-year'
-            data_df['carbon_equivalency_method'] = equivalency
-        else:
-            data_df['emitted_product_formula'] = data_column.split('_')[0]
-            data_df['carbon_equivalency_method'] = "NA"
-
-        long_df = pd.concat([long_df, data_df]) # use concat as append was deprecated
-    return long_df
-
-
-def main(ct_specification, ermin_specification, datadir, all_errors, error_output, missing_value_input, missing_value_output, verbose=True):
-    climate_trace_dictionary = import_data_from_local(
-        reporting_entity='climate-trace',
-        path_to_data=datadir,
-        verbose=verbose)
-
-    ct_warnings = defaultdict(list) # from CT specification checking, keyed by sector
-    ct_errors = defaultdict(list) # from CT specification checking, keyed by sector
-    ermin_warnings = defaultdict(list) # from ERMIN specification checking, keyed by sector
-    ermin_errors = defaultdict(list) # from ERMIN specification checking, keyed by sector
-    missing_values = {} # dict of missing fields keyed by sector
-    fill_values = defaultdict(list) # dict of lists of [column, value], keyed by sector
-
-    # Load missing values fill table, if given
-    if missing_value_input is not None:
-        with open(missing_value_input, 'r') as f:
-            for line in f:
-                words = line.split(',')
-                # format of fill_values is {sector:[(column, value), (column, value),...]}
-                fill_values[words[0].strip()].append((words[1].strip(),words[2].strip()))
-
-    # Loop through sectors, validating each table
-    reshaped_clean_data = {}
-
-    for key, df in climate_trace_dictionary.items():
-        sector = key.split('_')[0]
-        date = key.split('_')[1] # do something with the date later to get version
-        record_version('climate-trace', sector, date, 'versioning.csv')
-        if verbose:
-            print("Sector: " + sector)
-        try:
-            df = df.drop(columns=['Unnamed: 0'])
-        except KeyError:
-            pass
-
-
-        #### Step 0: Perform any manual hacking of input file to allow non-compliant inputs
-        # Manually convert old-style timestamps if necessary before checking CT specification
-        if 'start_date' in df and 'end_date' in df:
-            if not ermin_syntax.is_valid_timestamp(df.at[0,'start_date']):
-                try:
-                    df['start_date'], df['end_date'] = zip(*df.apply(year_to_datetime, axis=1))
-                except ValueError:
-                    errors.append(sector + ': Dates to not appear in YYYY-MM-DD or MM/DD/YY format')
-
+    """reshape the wide CT table into a long df with one row per emissions column value"""
+    return wide_to_long(df,
+                        id_columns=['start_time', 'end_time', 'producing_entity_id'],
+                        value_columns=CT_EMISSIONS_COLUMNS,
+                        value_name='emission_quantity')
 
-        #### Step 1: check that input file matches internal CT specification and exit if not
-        # USE CT specification to check input data before doing conversions
-        warnings, errors = eev.check_input_dataframe(df, spec_file = ct_specification,
-                                                     repair = False,
-                                                     allow_unknown_stringtypes=True)
-        if len(warnings) > 0:
-            print('\nThere were ' + str(len(warnings)) + " warnings when checking sector file " + sector + " against internal CT specification:")
-            print('\n'.join(warnings))
-            ct_warnings[sector] += warnings
-        if len(errors) > 0:
-            print('\nThere were ' + str(len(errors)) + " errors when checking sector file " + sector + " against internal CT specification:")
-            print('\n'.join(errors))
-            # If Errors when checking CT spec, terminate now;  do not continue
-            errors.append('Sector ' + sector + ' did not match internal CT specification. Skipping sector before checking additional CT requirements.')
-            ct_errors[sector] += errors
-            continue # Continue to next sector.
-
-        #### Step 1.5: check additional requirements specificed for CT data
-        warnings, errors = eev.check_ct_requirements(df, sector=sector)
-        ct_warnings[sector] += warnings
-        if len(errors) > 0:
-            errors.append('Sector ' + sector + ' did not match additional CT requirements. Skipping sector before conversion to ERMIN format.')
-            ct_errors[sector] += errors
-            continue # Continue to next sector.
 
-        #### Step 2: Do conversions/additions to fit ERMIN format
+def normalize_dates(sector, df, result):
+    """Step 0: convert old-style start_date/end_date to ISO in place, noting failures in result"""
+    if 'start_date' in df and 'end_date' in df:
+        try:
+            for column in ['start_date', 'end_date']:
+                # format detected per column from a sample; ISO dates are left as they are
+                date_format = detect_format(df[column])
+                if date_format != ISO_FORMAT:
+                    df[column] = to_iso(df[column], date_format)
+        except ValueError:
+            result['ct_errors'].append(sector + ': Dates to not appear in YYYY-MM-DD or MM/DD/YY format')
+
+
+def convert_to_ermin(sector, df, fill_values, verbose=True, report=None, dtypes=None):
+    """Steps 2 and 2.5: reshape a (block of a) CT table into ERMIN rows and fill constant columns
+
+    The result is in the compact frame schema given by dtypes (see utils.reshape.compact_frame):
+    repeated text as categoricals, times as datetime64 and quantities as float64.
+    dtypes defaults to the schema of the ERMIN specification in templates/.
+    fill_values is {column: value} for the sector, e.g. FillValues()[sector].
+    """
+    if report is None:
+        report = RunReport(enabled=False)
+    if dtypes is None:
+        dtypes = load_specification(ERMIN_SPECIFICATION).frame_dtypes()
+    with report.stage(sector, STAGE_RESHAPE, rows_in=len(df)) as stage:
         df = df.rename(columns={'start_date': 'start_time',
                                 'end_date': 'end_time',
                                 'iso3_country': 'producing_entity_id'})
+        # convert the id columns while the table is still wide, the reshape keeps their dtypes
+        df = compact_frame(df[['start_time', 'end_time', 'producing_entity_id'] + list(CT_EMISSIONS_COLUMNS)], dtypes)
         reshaped_df = create_long_df(df)
-        reshaped_df['original_inventory_sector'] = sector
-        reshaped_df['reporting_entity'] = 'climate-trace'
-        reshaped_df['producing_entity_name'] = ''
+        reshaped_df['original_inventory_sector'] = constant_column(sector, len(reshaped_df))
+        reshaped_df['reporting_entity'] = constant_column('climate-trace', len(reshaped_df))
         # Replace producing_entity with country name from COUNTRIES_DICT
-        for i,row in reshaped_df.iterrows():
-            country_code = row['producing_entity_id']
-            country_name = eev.COUNTRIES_DICT[country_code]
-            row['producing_entity_name'] = country_name
-
-        # TO DO
-        #### Step 2.5: Load a key:value CSV if provided on command line,
-        ####           fill in any expected missing columns intelligently
-        if sector in fill_values:
-            for keyvalue_tuple in fill_values[sector]:
-                column = keyvalue_tuple[0]
-                value = keyvalue_tuple[1]
-                print('Sector ' + sector + ', filling column ' + column + ' with value ' + value)
-                reshaped_df[column] = value
-
-
-        #### Step 3: Test with ERMIN validator, get missing columns/fields
-        warnings, errors, reshaped_df = ev.check_input_dataframe(reshaped_df, spec_file=ermin_specification,repair=True)
-
-        ermin_warnings[sector] += warnings
-        if len(errors) > 0:
-            errors.append('Sector ' + sector + ' did not match additional ERMIN specification. Stopping before DB upload.')
-            ermin_errors[sector] += errors
-            continue # skip to next sector; do not continue to process this sector
-
-        #### TO DO: Step 4: If nothing missing, then proceed to submit to DB
-        reshaped_clean_data[sector] = reshaped_df
-
-
-    #### All sectors processed, report errors (and save to file)
-    for key in ct_errors:
-        print('\nSector ' + key + ' encountered errors when checking CT requirements, ERMIN conversion skipped (printing up to 10):')
-        print('\n'.join(ct_errors[key][:10]))
-
-    for key in ermin_errors:
-        print('\nSector ' + key + ' encountered errors when checking ERMIN requirements, DB upload skipped (printing up to 10):')
-        print('\n'.join(ermin_errors[key][:10]))
-
-    if error_output is not None:
-        print('Writing all warnings and errors to output file ' + error_output)
-        # write new output file containing all warnings and errors
-        path = Path(error_output)
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with open(error_output,'w') as f:
-            for key in climate_trace_dictionary.keys():
-                sector = key.split('_')[0]
-                if len(ct_warnings[sector]) > 0:
-                    f.write('\nSector ' + sector + ' encountered warnings when checking CT requirements:')
-                    f.write('\n'.join(ct_warnings[sector]))
-                if len(ct_errors[sector]) > 0:
-                    f.write('\nSector ' + sector + ' encountered errors when checking CT requirements:')
-                    f.write('\n'.join(ct_warnings[sector]))
-                if len(ermin_warnings[sector]) > 0:
-                    f.write('\nSector ' + sector + ' encountered warnings when checking ERMIN requirements:')
-                    f.write('\n'.join(ermin_warnings[sector]))
-                if len(ermin_errors[sector]) > 0:
-                    f.write('\nSector ' + sector + ' encountered errors when checking ERMIN requirements:')
-                    f.write('\n'.join(ermin_errors[sector]))
+        reshaped_df['producing_entity_name'] = country_names(reshaped_df['producing_entity_id'])
+        stage['rows_out'] = len(reshaped_df)
+
+    # TO DO
+    #### Step 2.5: Load a key:value CSV if provided on command line,
+    ####           fill in any expected missing columns intelligently
+    with report.stage(sector, STAGE_FILL, rows_in=len(reshaped_df)):
+        fill_values = dict(fill_values)
+        if verbose:
+            for column, value in fill_values.items():
+                print('Sector ' + sector + ', filling column ' + column + ' with value ' + str(value))
+        fill_columns(reshaped_df, fill_values, dtypes)
+
+    return reshaped_df
+
+
+def _report_ct_specification(sector, warnings, errors, result):
+    """record Step 1 results; return True if the sector must be skipped"""
+    result['warnings'], result['errors'] = warnings, errors
+    if len(warnings) > 0:
+        print('\nThere were ' + str(len(warnings)) + " warnings when checking sector file " + sector + " against internal CT specification:")
+        print('\n'.join(warnings))
+        result['ct_warnings'] += warnings
+    if len(errors) > 0:
+        print('\nThere were ' + str(len(errors)) + " errors when checking sector file " + sector + " against internal CT specification:")
+        print('\n'.join(errors))
+        # If Errors when checking CT spec, terminate now;  do not continue
+        errors.append('Sector ' + sector + ' did not match internal CT specification. Skipping sector before checking additional CT requirements.')
+        result['ct_errors'] += errors
+        return True
+    return False
+
+
+def _report_ct_requirements(sector, warnings, errors, result):
+    """record Step 1.5 results; return True if the sector must be skipped"""
+    result['warnings'], result['errors'] = warnings, errors
+    result['ct_warnings'] += warnings
+    if len(errors) > 0:
+        errors.append('Sector ' + sector + ' did not match additional CT requirements. Skipping sector before conversion to ERMIN format.')
+        result['ct_errors'] += errors
+        return True
+    return False
+
+
+def _new_result(sector):
+    """collects the warnings and errors of Steps 0-1.5 of a sector"""
+    return {'sector': sector, 'ct_warnings': Diagnostics(), 'ct_errors': Diagnostics(), 'warnings': [], 'errors': []}
+
+
+def _check_and_convert(sector, df, ct_specification, ermin_specification, fill_values, verbose, result, report):
+    """Steps 0-2.5 for a whole sector table; returns the ERMIN rows, or None if a CT check failed"""
+
+    if verbose:
+        print("Sector: " + sector)
+    try:
+        df = df.drop(columns=['Unnamed: 0'])
+    except KeyError:
+        pass
+
+
+    #### Step 0: Perform any manual hacking of input file to allow non-compliant inputs
+    # Manually convert old-style timestamps if necessary before checking CT specification
+    with report.stage(sector, STAGE_DATES, rows_in=len(df)):
+        normalize_dates(sector, df, result)
+
+
+    #### Step 1: check that input file matches internal CT specification and exit if not
+    # USE CT specification to check input data before doing conversions
+    with report.stage(sector, STAGE_CT_SPECIFICATION, rows_in=len(df)):
+        warnings, errors = eev.check_input_dataframe(df, spec_file = ct_specification,
+                                                     repair = False,
+                                                     allow_unknown_stringtypes=True)
+    if _report_ct_specification(sector, warnings, errors, result):
+        return None
 
+    #### Step 1.5: check additional requirements specificed for CT data
+    with report.stage(sector, STAGE_CT_REQUIREMENTS, rows_in=len(df)):
+        warnings, errors = eev.check_ct_requirements(df, sector=sector)
+    if _report_ct_requirements(sector, warnings, errors, result):
+        return None
+
+    #### Step 2: Do conversions/additions to fit ERMIN format
+    dtypes = load_specification(ermin_specification).frame_dtypes()
+    return convert_to_ermin(sector, df, fill_values, verbose=verbose, report=report, dtypes=dtypes)
+
+
+def _check_blocks(sector, blocks, ct_specification, verbose, result, report):
+    """Steps 0-1.5 for a sector table read in row blocks: the CT specification block by block,
+    the CT requirements through a running CTRequirementsAccumulator"""
+
+    if verbose:
+        print("Sector: " + sector + " (in blocks)")
+
+    ct_warnings, ct_errors = Diagnostics(), Diagnostics()
+    accumulator = eev.CTRequirementsAccumulator(sector)
+    for df in blocks:
+        with report.stage(sector, STAGE_DATES, rows_in=len(df)):
+            normalize_dates(sector, df, result)
+        with report.stage(sector, STAGE_CT_SPECIFICATION, rows_in=len(df)):
+            warnings, errors = eev.check_input_dataframe(df, spec_file = ct_specification,
+                                                         repair = False,
+                                                         allow_unknown_stringtypes=True)
+        ct_warnings += warnings
+        ct_errors += errors
+        with report.stage(sector, STAGE_CT_REQUIREMENTS, rows_in=len(df)):
+            accumulator.update(df)
+    # blocks repeat the same structural problems, report each once
+    result['ct_errors'] = result['ct_errors'].unique()
+    if _report_ct_specification(sector, ct_warnings.unique(), ct_errors.unique(), result):
+        return
+
+    with report.stage(sector, STAGE_CT_REQUIREMENTS):
+        warnings, errors = accumulator.finalize()
+    _report_ct_requirements(sector, warnings, errors, result)
+
+
+def load_fill_values(missing_value_input, ermin_specification, version_registry=None, reporting_timestamp=None):
+    """Step 2.5 fill table with values cast to the ERMIN frame schema (empty if missing_value_input is None)
+
+    If version_registry is given, data_version and data_version_changelog fills of sectors
+    with a recorded version are taken from it; if reporting_timestamp is given, it fills
+    reporting_timestamp. Neither is written back to the fill table file.
+    """
+    dtypes = load_specification(ermin_specification).frame_dtypes()
+    if missing_value_input is None:
+        return FillValues(dtypes=dtypes)
+    fill_values = FillValues.load(missing_value_input, dtypes=dtypes)
+    if version_registry is not None:
+        fill_values.set_versions(version_registry, 'climate-trace')
+    if reporting_timestamp is not None:
+        fill_values.set_all(TIMESTAMP_COLUMN, reporting_timestamp)
+    return fill_values
+
+
+@register_source
+class ClimateTraceSource(Source):
+    """Climate TRACE sector files for utils.sources.run_sources, one unit per sector
+
+    normalize runs Steps 0-2.5 (check_blocks and convert the same steps for a table read
+    in blocks); validate (Step 3) is the shared one.
+
+    Parameters beyond those of Source:
+    ct_specification (str): path to CT specification CSV
+    missing_value_input (str): fill table, see utils.fill_values (default None)
+    version_registry (VersionRegistry): if given, data_version and changelog fills are taken from
+                                        the versions recorded in it so far
+    reporting_timestamp (datetime): if given, fills reporting_timestamp where the fill table lists it
+    stage_dir (str): if given, raw files are staged as Parquet here and read from there
+    """
+
+    name = 'climate-trace'
+
+    def __init__(self, datadir, ct_specification=CT_SPECIFICATION, missing_value_input=None,
+                 version_registry=None, reporting_timestamp=None, stage_dir=None, **kwargs):
+        super().__init__(datadir, **kwargs)
+        self.ct_specification = ct_specification
+        self.missing_value_input = missing_value_input
+        self.stage_dir = stage_dir
+        self.reporting_timestamp = reporting_timestamp
+        self.fill_values = load_fill_values(missing_value_input, self.ermin_specification,
+                                            version_registry, reporting_timestamp)
+
+    def discover(self):
+        files = list_data_files(self.name, self.datadir)
+        if self.stage_dir is not None:
+            # Convert new or changed raw files to typed Parquet once, then read the staged
+            # copies of the files in datadir (not those of earlier drops left in stage_dir)
+            staged = stage_raw_data(self.name, path_to_data=self.datadir, staging_dir=self.stage_dir,
+                                    verbose=self.verbose, **spec_read_options(self.ct_specification))
+            files = [(data_file_info(os.path.basename(path)), path) for path in staged]
+        # e.g. climate-trace_aluminum_20220403.csv is sector aluminum, version date 20220403
+        return [Unit(file_info.split('_')[0], path, None, file_info.split('_')[1]) for file_info, path in files]
+
+    def load(self, unit):
+        read_options = spec_read_options(self.ct_specification)
+        for _, df in read_data_file(unit.name, unit.path, verbose=self.verbose, **read_options):
+            return df
+
+    def normalize(self, unit, df, report):
+        result = _new_result(unit.name)
+        reshaped_df = _check_and_convert(unit.name, df, self.ct_specification, self.ermin_specification,
+                                         self.fill_values[unit.name], self.verbose, result, report)
+        return result['ct_warnings'], result['ct_errors'], reshaped_df
+
+    def load_blocks(self, unit, chunksize):
+        read_options = spec_read_options(self.ct_specification)
+        return (df for _, df in read_data_file(unit.name, unit.path, verbose=False, chunksize=chunksize, **read_options))
+
+    def check_blocks(self, unit, blocks, report):
+        result = _new_result(unit.name)
+        _check_blocks(unit.name, blocks, self.ct_specification, self.verbose, result, report)
+        return result['ct_warnings'], result['ct_errors']
+
+    def convert(self, unit, df, report):
+        normalize_dates(unit.name, df, {'ct_errors': Diagnostics()}) # already reported by check_blocks
+        dtypes = load_specification(self.ermin_specification).frame_dtypes()
+        return convert_to_ermin(unit.name, df, self.fill_values[unit.name], verbose=False, report=report, dtypes=dtypes)
+
+    def set_version(self, unit, version, changelog):
+        self.fill_values.set_version(unit.name, version, changelog)
+
+    def dependencies(self):
+        return [self.ct_specification, self.ermin_specification, self.missing_value_input]
+
+    def refresh(self, unit, df):
+        fills = self.fill_values[unit.name]
+        if self.reporting_timestamp is not None and TIMESTAMP_COLUMN in fills:
+            fill_columns(df, {TIMESTAMP_COLUMN: fills[TIMESTAMP_COLUMN]},
+                         load_specification(self.ermin_specification).frame_dtypes())
+        return df
+
+    def fingerprint(self, unit):
+        # versions are not in the fill table file; the timestamp of this run is filled by refresh
+        fills = self.fill_values[unit.name]
+        fills.pop(TIMESTAMP_COLUMN, None)
+        return fills
+
+
+def process_sector(sector, df, ct_specification, ermin_specification, fill_values, verbose=True, instrument=False, snapshots=None, ermin_workers=1):
+    """run Steps 0-3 for a single sector table already in memory, as run_sources does for each sector file
+
+    Parameters:
+    sector (str): sector name
+    df (DataFrame): sector table as loaded from the input file
+    ct_specification (str): path to CT specification CSV
+    ermin_specification (str): path to ERMIN specification CSV
+    fill_values (dict): {column: value} to fill for this sector
+    verbose (bool): print progress
+    instrument (bool): measure each step, see utils.instrumentation
+    snapshots (SnapshotStore): if given, only rows added or changed since the snapshot of the
+                               sector's last ingested drop are validated and returned
+    ermin_workers (int): worker processes checking partitions of the ERMIN rows in Step 3
+                         (see utils.validation.check_ermin_partitioned)
+
+    Returns:
+    result (dict): see utils.sources.process_unit
+    """
+    source = ClimateTraceSource(None, ct_specification=ct_specification,
+                                ermin_specification=ermin_specification, verbose=verbose)
+    for column, value in dict(fill_values).items():
+        source.fill_values.set(sector, column, value)
+    return process_unit(source, Unit(sector, None, None, None), instrument, snapshots, ermin_workers, df=df)
+
+
+def main(ct_specification, ermin_specification, datadir, all_errors, error_output, missing_value_input, missing_value_output, verbose=True, workers=1, stage_dir=None, cache_dir=None, cache_max_mb=2048, version_registry=None, chunksize=None, sink=None, report_output=None, profile_sector=None, report=None, reporting_timestamp=None, snapshot_dir=None, delta_output=None, removed_sink=None, ermin_workers=1, ermin_output=None, when_loaded=None):
+    """validate and convert every climate-trace sector file in datadir, see the command line help
+
+    Runs utils.sources.run_sources with ClimateTraceSource.
+
+    Parameters beyond the command line options:
+    version_registry (VersionRegistry): registry to record versions in, flushed by the caller;
+                                        if None, versioning.csv is loaded and flushed here
+    sink (callable): if given, called as sink(sector, df) with each sector's (or, with chunksize,
+                     each block's) clean ERMIN data instead of collecting it in reshaped_clean_data
+                     (with chunksize and neither sink nor ermin_output, the data is validated only)
+    report (RunReport): report to record step measurements in, written by the caller;
+                        if None, one is made here when report_output is given
+    reporting_timestamp (datetime): if given, fills reporting_timestamp where the fill table lists it
+                                    (data_version and its changelog are filled from the version registry)
+    removed_sink (callable): with snapshot_dir, called as removed_sink(sector, keys) with the key columns
+                             (see utils.delta.ROW_KEY) of rows of the last ingested drop missing from this one
+    when_loaded (callable): with snapshot_dir and a sink storing rows asynchronously, called as
+                            when_loaded(sector, commit), see utils.sources.run_sources. Without sink,
+                            the rows are not stored, so snapshots are compared with but not saved
+
+    Returns:
+    reshaped_clean_data (dict): clean ERMIN DataFrames keyed by sector (empty if sink is given)
+    errors, warnings (Diagnostics): of the last sector processed
+    """
+    if snapshot_dir is not None and ermin_output is not None:
+        raise ValueError('ermin_output would only get the rows changed since the snapshots in snapshot_dir')
+    source = ClimateTraceSource(datadir, ct_specification=ct_specification, ermin_specification=ermin_specification,
+                                missing_value_input=missing_value_input, reporting_timestamp=reporting_timestamp,
+                                stage_dir=stage_dir, verbose=verbose)
+    # run_sources keys results by <source>_<sector>
+    prefix = source.name + '_'
+
+    def by_sector(function):
+        return None if function is None else (lambda key, df: function(key[len(prefix):], df))
+
+    if sink is None and when_loaded is None:
+        def when_loaded(sector, commit):
+            pass # nothing ingested
+
+    if sink is None and ermin_output is not None:
+        written = set()
+
+        def sink(sector, df):
+            write_ermin_parquet(ermin_table(df), ermin_output, append=sector in written)
+            written.add(sector)
+
+    # Steps are measured when a run report is requested, or when the caller passes
+    # its own report (e.g. to add upload times to it)
+    if report is None:
+        report = RunReport(enabled=report_output is not None)
+    # profiler output for profile_sector goes next to the run report
+    profile_prefix = 'profile_' if report_output is None else os.path.splitext(report_output)[0] + '_'
+
+    # Versions are looked up in memory and written once at the end, unless
+    # the caller passed its own registry, in which case the caller flushes it
+    owns_registry = version_registry is None
+    if owns_registry:
+        version_registry = VersionRegistry('versioning.csv')
+
+    clean_data, diagnostics, deltas = run_sources([source], sink=by_sector(sink), workers=workers,
+                                                  cache_dir=cache_dir, cache_max_mb=cache_max_mb,
+                                                  version_registry=version_registry, report=report,
+                                                  error_output=error_output, verbose=verbose, all_errors=all_errors,
+                                                  snapshot_dir=snapshot_dir, removed_sink=by_sector(removed_sink),
+                                                  when_loaded=by_sector(when_loaded),
+                                                  chunksize=chunksize, ermin_workers=ermin_workers,
+                                                  profile_unit=None if profile_sector is None else prefix + profile_sector,
+                                                  profile_prefix=profile_prefix)
+
+    if owns_registry:
+        version_registry.flush()
+
+    if delta_output is not None:
+        print('Writing changes since the last ingested drops to output file ' + delta_output)
+        Path(delta_output).parent.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame([dict(sector=key[len(prefix):], **stats) for key, stats in deltas.items()],
+                     columns=['sector', 'added', 'changed', 'removed', 'unchanged']).to_csv(delta_output, index=False)
+
+    if report_output is not None:
+        print('Writing run report to output file ' + report_output)
+        report.write(report_output)
 
     #### Step 5: If missing columns/data, write empty key:value CSV with missing headers and exit
     # Write missing value output file if requested
@@ -212,20 +443,12 @@ def main(ct_specification, ermin_specification, datadir, all_errors, error_outpu
         path = Path(missing_value_output)
         path.parent.mkdir(parents=True, exist_ok=True)
         with open(missing_value_output,'w') as f:
-            for key in climate_trace_dictionary.keys():
-                sector = key.split('_')[0]
-                if sector in ermin_errors:
-                    errors = ermin_errors[sector]
-                    # find all missing columns, e.g. errors in this format
-                    # Missing this required column: "unfccc_annex_1_category".
-                    for error in errors:
-                        if error.startswith('Missing this required column: "'):
-                            column = error[31:-2] # remove the start and end of the error
-                            f.write(','.join([sector, column,'NULL']) + '\n')
-
-
+            for key, (_, errors) in diagnostics.items():
+                for column in errors.fields('missing_column', 'column'):
+                    f.write(','.join([key[len(prefix):], column,'NULL']) + '\n')
 
-    return reshaped_clean_data, errors, warnings
+    warnings, errors = list(diagnostics.values())[-1] if len(diagnostics) > 0 else ([], [])
+    return {key[len(prefix):]: df for key, df in clean_data.items()}, errors, warnings
 
 if __name__ == '__main__':
 
@@ -246,7 +469,37 @@ if __name__ == '__main__':
                         help='Missing value output file (will write sector, field, NULL CSV for each missing field).')
     parser.add_argument('-v', '--verbose', help='More verbose output',
                         action='store_true')
+    parser.add_argument('-S', '--stage_dir', metavar='dirname', type=str, default=None,
+                        help='Stage raw input files as Parquet in this directory and read from there (default None).')
+    parser.add_argument('-C', '--cache_dir', metavar='dirname', type=str, default=None,
+                        help='Cache per-sector results here and reuse them for unchanged input files (default None).')
+    parser.add_argument('--cache_max_mb', metavar='MB', type=int, default=2048,
+                        help='Evict least recently used cache entries beyond this size (default 2048).')
+    parser.add_argument('-k', '--chunksize', metavar='rows', type=int, default=None,
+                        help='Stream each sector file in blocks of this many rows, bounding memory use (default None, whole files). '
+                             'The blocks of a sector are passed on once all of them are valid, and the cache is not used. '
+                             'Without --ermin_output, the data is only validated.')
+    parser.add_argument('--ermin_output', metavar='dirname', type=str, default=None,
+                        help='Write the clean ERMIN data as a Parquet dataset partitioned by entity, sector and year to this directory (default None).')
+    parser.add_argument('-R', '--report_output', metavar='filename', type=str, default=None,
+                        help='Measure time, CPU, rows and memory growth of each step per sector and write them to this JSON or CSV file (default None).')
+    parser.add_argument('-P', '--profile_sector', metavar='sector', type=str, default=None,
+                        help='Run this sector under cProfile and tracemalloc, writing .prof and .tracemalloc.txt files next to the run report.')
+    parser.add_argument('-D', '--snapshot_dir', metavar='dirname', type=str, default=None,
+                        help='Compare each sector with its snapshot here, kept by the pipeline uploading the data (see execute.py), '
+                             'and only validate rows added or changed since (default None, all rows). The snapshots are not updated. '
+                             'Not used with --chunksize.')
+    parser.add_argument('--delta_output', metavar='filename', type=str, default=None,
+                        help='With --snapshot_dir, write the number of rows added, changed, removed and unchanged per sector to this CSV file.')
+    parser.add_argument('--ermin_workers', metavar='N', type=int, default=1,
+                        help='Number of worker processes checking partitions of each sector against the ERMIN specification, '
+                             'when sectors are processed one at a time (default 1, each sector checked whole). '
+                             'Partitions are checked without relating constant columns to the others.')
+    parser.add_argument('-w', '--workers', metavar='N', type=int, default=1,
+                        help='Number of worker processes used to process sectors in parallel (default 1).')
     args = parser.parse_args()
+    if args.snapshot_dir is not None and args.ermin_output is not None:
+        parser.error('--ermin_output would only get the rows changed since the snapshots in --snapshot_dir')
     kwargs = vars(args)
     main(**kwargs)
 
@@ -1,5 +1,13 @@
-from climate_trace import main
+from climate_trace import main, STAGE_UPLOAD
+import edgar # registers the EDGAR source
 from utils.database import *
+from utils.staging import write_ermin_parquet, write_ermin_csv
+from utils.arrow import ermin_table
+from utils.import_data import list_data_files
+from utils.versions import VersionRegistry
+from utils.instrumentation import RunReport
+from utils.upload import UploadQueue, DONE, FAILED
+from utils.sources import SOURCES, run_sources
 from datetime import datetime
 
 
@@ -8,6 +16,16 @@ current_timestamp = datetime.now()
 record_missing_input = False
 fill_missing_columns = True
 push_to_db = True
+upsert = True # merge on the ERMIN natural key and only write new/changed rows, instead of appending everything
+dump_format = 'parquet' # 'parquet' writes a dataset partitioned by reporting_entity/sector/year, 'csv' one file per sector; None for no dump
+run_report_output = 'run_report_ct.json' # per-step time, CPU, rows and memory growth of each sector, including upload; None to skip
+upload_workers = 2 # threads uploading sectors that passed validation while later sectors are validated
+upload_max_pending = 2 # sectors waiting per upload thread before validation pauses
+workers = 4 # processes validating units of all sources at once
+ermin_workers = 1 # processes validating partitions of each unit, when units are processed one at a time; 1 validates units whole
+chunksize = None # e.g. 1000000 to read and process each unit in blocks of this many rows, bounding memory use
+cache_dir = None # e.g. '../cache' to reuse results of units whose input did not change since the last run
+snapshot_dir = None # e.g. '../snapshots' to only validate and upload rows changed since the last uploaded drop of each unit (needs push_to_db and dump_format = None)
 
 kwargs = {
           'ct_specification': '../templates/climate-trace-specification.csv',
@@ -17,8 +35,19 @@ kwargs = {
           'error_output': 'errors_ct.txt',
           'missing_value_input': '/Users/christyjlewis/ermin-etl/missing_values/filled_values_climate-trace.csv',
           'missing_value_output': '/Users/christyjlewis/ermin-etl/missing_values/missing_values_climate-trace.csv',
-          'verbose': True
+          'verbose': True,
+          'stage_dir': None # e.g. '../staged/climate-trace' to convert raw inputs to Parquet once
           }
+# Registered sources to process in one job (see utils.sources), with their settings.
+# Units of all of them share the worker processes and the upload threads.
+sources = {
+           'climate-trace': {'datadir': kwargs['datadir'],
+                             'ct_specification': kwargs['ct_specification'],
+                             'ermin_specification': kwargs['ermin_specification'],
+                             'missing_value_input': kwargs['missing_value_input'],
+                             'stage_dir': kwargs['stage_dir']},
+           # 'edgar': {'datadir': '../data', 'ermin_specification': kwargs['ermin_specification']},
+           }
 # missing_value_path = '../supplemental_information'
 # ct_specification = '../templates/climate-trace-specification.csv'
 # ermin_specification = '../templates/ermin-specification.csv'
@@ -30,39 +59,102 @@ kwargs = {
 # verbose = True
 
 
+def queue_sector(key, df):
+    """convert one clean sector (or block) to an ERMIN Arrow table once, and queue it for upload"""
+    uploads.put(key, ermin_table(df))
+
+
+def delta_snapshot_dir():
+    """snapshot_dir to pass to run_sources: in delta mode only rows changed since the last upload
+    are passed on, so it is off unless pushing to the database, and off when a dump is written,
+    as the dump would then only hold the changed rows"""
+    if snapshot_dir is None or not push_to_db:
+        return None
+    if dump_format is not None:
+        print('Not using snapshot_dir: the dump needs every row, set dump_format = None to upload changed rows only')
+        return None
+    return snapshot_dir
+
+
+def dump_sector(key, value, first):
+    """write one clean sector (or block of it) to the dump, see dump_format"""
+    if dump_format == 'parquet':
+        write_ermin_parquet(value, 'ermin_parquet', append=not first)
+    elif dump_format == 'csv':
+        write_ermin_csv(value, f'{key}.csv', append=not first)
+
+
+def upload_sector(key, value, first):
+    """dump and upload one clean sector (or, with chunksize, one block of it; first is True for the first)
+
+    value is an ERMIN Arrow table; the dump and the database load read the same buffers."""
+    dump_sector(key, value, first)
+    if upsert:
+        inserted, updated = upsert_clean_data(value)
+        print(f'{key}: {inserted} rows inserted, {updated} rows updated')
+    else:
+        copy_clean_data(value)
+
+
+def remove_rows(key, keys):
+    """delete rows missing from the latest drop of a unit"""
+    print(f'{key}: {delete_clean_data(keys)} rows deleted')
+
+
 if __name__ == '__main__':
 
+    run_report = RunReport(enabled=run_report_output is not None)
+
+    # Sectors that pass validation are uploaded by these threads as they come out of
+    # main, overlapping the uploads with the validation of the remaining sectors
+    uploads = None
+    if push_to_db:
+        uploads = UploadQueue(upload_sector, workers=upload_workers, max_pending=upload_max_pending,
+                              report=run_report, stage=STAGE_UPLOAD)
+
     if record_missing_input:
         kwargs['missing_value_input'] = None
         main(**kwargs)
 
+    version_registry = None
     if fill_missing_columns:
         kwargs['missing_value_output'] = None
-        filled_values = pd.read_csv(kwargs['missing_value_input'],
-                                  names=['sector', 'missing_column', 'input'])
-        idx = filled_values[filled_values.missing_column == 'reporting_timestamp'].index
-        filled_values.loc[idx, 'input'] = datetime.isoformat(current_timestamp)
-        versions = pd.read_csv('versioning.csv')
+        # record versions for all sectors in this drop at once, so that the
+        # data_version and changelog fills carry this drop's version
+        version_registry = VersionRegistry('versioning.csv')
+        version_registry.record_many(('climate-trace', file_info.split('_')[0], file_info.split('_')[1])
+                                     for file_info, _ in list_data_files('climate-trace', kwargs['datadir']))
+        # the fill table itself is left as is; versions and the timestamp of this run are filled in memory
+        sources['climate-trace'].update(version_registry=version_registry, reporting_timestamp=current_timestamp)
 
-        for sector in filled_values.sector.unique():
-            print(sector)
-            version = versions[(versions.sector == sector)]['version'].values
-            changelog = versions[(versions.sector == sector)]['changelog'].values[0]
-            changelog_idx = filled_values[(filled_values.sector == sector) & (filled_values.missing_column == 'data_version_changelog')].index
-            version_idx = filled_values[(filled_values.sector == sector) & (filled_values.missing_column == 'data_version')].index
-            filled_values.loc[version_idx, 'input'] = version
-            filled_values.loc[changelog_idx, 'input'] = changelog
+        sink = queue_sector if uploads is not None else None
+        removed_sink = remove_rows if push_to_db and upsert else None
+        # snapshots record what was uploaded: each is saved once its unit's upload is done
+        clean_data, diagnostics, changes = run_sources([SOURCES[name](**settings) for name, settings in sources.items()],
+                                                       sink=sink, workers=workers, cache_dir=cache_dir,
+                                                       version_registry=version_registry, report=run_report,
+                                                       error_output=kwargs['error_output'], verbose=kwargs['verbose'],
+                                                       all_errors=kwargs['all_errors'],
+                                                       snapshot_dir=delta_snapshot_dir(),
+                                                       removed_sink=removed_sink,
+                                                       when_loaded=uploads.after if uploads is not None else None,
+                                                       chunksize=chunksize, ermin_workers=ermin_workers)
+        for key, stats in changes.items():
+            print(f'{key}: {stats["added"]} rows added, {stats["changed"]} changed, {stats["removed"]} removed, {stats["unchanged"]} unchanged')
 
-        filled_values.to_csv(kwargs['missing_value_input'],header = False, index=False) # get rid of index when writing
+    if uploads is not None:
+        status = uploads.close()
+        for key, sector_status in status.items():
+            if sector_status['state'] == FAILED:
+                print(f'{key}: upload failed after {sector_status["blocks"]} blocks\n{sector_status["error"]}')
+        print(f'Uploaded {sum(s["state"] == DONE for s in status.values())} of {len(status)} units. '
+              'Units with validation errors were not uploaded, check errors report.')
 
-        reshaped_clean_data, errors, warnings = main(**kwargs)
+    # after the uploads, which fill in changelogs
+    if version_registry is not None:
+        version_registry.flush()
 
-    if push_to_db:
-        if len(errors) > 0:
-            print('Errors need to be resolved. Check errors report.')
-        else:
-            for key, value in reshaped_clean_data.items():
-                value.to_csv(f'{key}.csv')
-                insert_clean_data(value)
+    if run_report_output is not None:
+        run_report.write(run_report_output)
 
 
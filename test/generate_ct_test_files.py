@@ -1,22 +1,156 @@
+# Generate Climate TRACE style test input files
+#
+# run from the test directory with
+# python generate_ct_test_files.py
+# to write the fixed test files in climate-trace/ (one per subsector, every country and year 2015-2021), or e.g.
+# python generate_ct_test_files.py --rows 1000000 --facilities 50 --error-rate 0.001 --subsectors aluminum --output synthetic
+# for larger or faulty inputs, see --help.
+
+import argparse
+import os
 import pandas as pd
 import numpy as np
 
-data_requirements = pd.read_csv('climate-trace_subsector_data_requirements.csv')
-required_dates_countries = pd.read_csv('climate-trace_required_dates_countries.csv')
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+data_requirements = pd.read_csv(os.path.join(HERE, 'climate-trace_subsector_data_requirements.csv'))
+required_dates_countries = pd.read_csv(os.path.join(HERE, 'climate-trace_required_dates_countries.csv'))
+
+VALUE_COLUMNS = data_requirements.drop(['sector', 'subsector', 'start_date', 'end_date', 'iso3_country'], axis=1).columns
+
+# subsectors whose emissions are negative (sinks), and the constant values written for them and for the others
+NEGATIVE_SUBSECTORS = ['other-agricultural-soil-emissions', 'forest-sink', 'net-forest-emissions']
+NEGATIVE_VALUE = -100000
+POSITIVE_VALUE = 1000000
+
+# kinds of faulty rows injected by generate_ct_frame, in equal shares
+ERROR_KINDS = ['negative', 'spanning', 'country']
+
+
+def generate_ct_frame(subsector,
+                      rows=None,
+                      countries=None,
+                      years=range(2015, 2022),
+                      facilities=1,
+                      error_rate=0.0,
+                      values='constant',
+                      seed=0,
+                      date_format=None):
+    """Generate a Climate TRACE style input table for one subsector
+
+       Rows are ordered by country, then year, then facility.
+
+       Parameters:
+       subsector (str): subsector from climate-trace_subsector_data_requirements.csv,
+                        which decides the emissions columns that get values
+       rows (int): if given, the country/year/facility rows are repeated or cut to exactly this many rows
+       countries (list): iso3 codes, default every country in climate-trace_required_dates_countries.csv
+       years (iterable): years with data for every country
+       facilities (int): rows per country and year (e.g. facility-level data)
+       error_rate (float): fraction of rows made faulty, spread over ERROR_KINDS: a negative value in the
+                           first emissions column (not an error for sink subsectors, which are negative anyway),
+                           an entry spanning two years, or an invalid country code
+       values (str): 'constant' for the fixed test files' values, or 'random'
+       seed (int): random seed for values and error placement
+       date_format (str): strftime format of start_date and end_date, default like 1/1/15
+
+       Returns:
+       df (DataFrame): table with the CT input columns
+    """
+    rng = np.random.default_rng(seed)
+    if countries is None:
+        countries = required_dates_countries['iso3_country'].unique()
+    countries = np.asarray(countries, dtype=object)
+    years = np.asarray(list(years))
+    if rows is None:
+        rows = len(countries) * len(years) * facilities
+
+    # row i belongs to facility i % facilities of year (i // facilities) % len(years), and so on
+    index = np.arange(rows)
+    year_index = index // facilities % len(years)
+    country_index = index // (facilities * len(years)) % len(countries)
+
+    start_dates = np.array([_format_date(year, 1, 1, date_format) for year in years], dtype=object)
+    end_dates = np.array([_format_date(year, 12, 31, date_format) for year in years], dtype=object)
+    df = pd.DataFrame({'start_date': start_dates[year_index],
+                       'end_date': end_dates[year_index],
+                       'iso3_country': countries[country_index]})
+
+    has_values = data_requirements[data_requirements.subsector == subsector].iloc[0]
+    negative = subsector in NEGATIVE_SUBSECTORS
+    columns_with_data = [column for column in VALUE_COLUMNS if has_values[column] == True]
+    for column in VALUE_COLUMNS:
+        if has_values[column] != True:
+            df[column] = np.nan
+        elif values == 'random':
+            df[column] = (-1 if negative else 1) * rng.uniform(1, 1e6, rows).round()
+        else:
+            df[column] = NEGATIVE_VALUE if negative else POSITIVE_VALUE
+
+    if error_rate > 0:
+        faulty = np.flatnonzero(rng.random(rows) < error_rate)
+        kinds = rng.integers(len(ERROR_KINDS), size=len(faulty))
+        for kind, name in enumerate(ERROR_KINDS):
+            rows_of_kind = faulty[kinds == kind]
+            if name == 'negative':
+                df.loc[rows_of_kind, columns_with_data[0]] = -POSITIVE_VALUE
+            elif name == 'spanning':
+                next_year_ends = np.array([_format_date(year + 1, 12, 31, date_format) for year in years], dtype=object)
+                df.loc[rows_of_kind, 'end_date'] = next_year_ends[year_index[rows_of_kind]]
+            elif name == 'country':
+                df.loc[rows_of_kind, 'iso3_country'] = 'XXX'
+
+    return df
+
+
+def _format_date(year, month, day, date_format):
+    if date_format is None:
+        return f'{month}/{day}/{year % 100:02d}'
+    return pd.Timestamp(year, month, day).strftime(date_format)
+
 
+def write_test_files(output_dir=os.path.join(HERE, 'climate-trace'), subsectors=None, date='20220403', **kwargs):
+    """write climate-trace_<subsector>-test_<date>.csv for each subsector, see generate_ct_frame for kwargs"""
+    os.makedirs(output_dir, exist_ok=True)
+    if subsectors is None:
+        subsectors = data_requirements.subsector
+    for subsector in subsectors:
+        df = generate_ct_frame(subsector, **kwargs)
+        # value columns without data are left empty
+        df.to_csv(os.path.join(output_dir, f'climate-trace_{subsector}-test_{date}.csv'))
 
-for subsector in data_requirements.subsector:
-    columns = data_requirements.drop(['sector', 'subsector'], axis=1).columns
-    df = pd.DataFrame(columns=columns)
-    data_columns_bool = data_requirements[data_requirements.subsector == subsector].drop(['sector', 'subsector', 'start_date', 'end_date'], axis=1)
-    df[['start_date', 'end_date', 'iso3_country']] = required_dates_countries[['start_date', 'end_date', 'iso3_country']]
-    value_columns = columns.drop(['start_date', 'end_date', 'iso3_country'])
 
-    for column in value_columns:
-        if data_columns_bool[f'{column}'].values[0] == True:
-            if subsector in ['other-agricultural-soil-emissions', 'forest-sink', 'net-forest-emissions']:
-                df[column] = -100000
-            else:
-                df[column] = 1000000
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', metavar='dirname', type=str, default=os.path.join(HERE, 'climate-trace'),
+                        help='Directory to write files to (default climate-trace).')
+    parser.add_argument('-s', '--subsectors', metavar='subsector', type=str, nargs='+', default=None,
+                        help='Subsectors to generate (default all).')
+    parser.add_argument('-r', '--rows', metavar='N', type=int, default=None,
+                        help='Rows per file (default one per country, year and facility).')
+    parser.add_argument('-c', '--countries', metavar='N', type=int, default=None,
+                        help='Use only the first N countries (default all).')
+    parser.add_argument('-y', '--years', metavar='year', type=int, nargs=2, default=[2015, 2021],
+                        help='First and last year with data (default 2015 2021).')
+    parser.add_argument('-f', '--facilities', metavar='N', type=int, default=1,
+                        help='Rows per country and year (default 1).')
+    parser.add_argument('-e', '--error-rate', metavar='fraction', type=float, default=0.0,
+                        help='Fraction of rows with injected errors (default 0).')
+    parser.add_argument('-v', '--values', type=str, choices=['constant', 'random'], default='constant',
+                        help='Constant values like the fixed test files, or random ones (default constant).')
+    parser.add_argument('--seed', metavar='N', type=int, default=0,
+                        help='Random seed (default 0).')
+    args = parser.parse_args()
 
-    df.to_csv(f'climate-trace/climate-trace_{subsector}-test_20220403.csv')
+    countries = None
+    if args.countries is not None:
+        countries = required_dates_countries['iso3_country'].unique()[:args.countries]
+    write_test_files(args.output,
+                     subsectors=args.subsectors,
+                     rows=args.rows,
+                     countries=countries,
+                     years=range(args.years[0], args.years[1] + 1),
+                     facilities=args.facilities,
+                     error_rate=args.error_rate,
+                     values=args.values,
+                     seed=args.seed)
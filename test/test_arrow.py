@@ -0,0 +1,33 @@
+import pandas as pd
+import pyarrow as pa
+from utils.arrow import ermin_table, ermin_schema
+from utils.staging import write_ermin_parquet, read_ermin_parquet, write_ermin_csv
+
+def test_ermin_table(tmp_path):
+    """Ensure clean rows convert once to the ERMIN schema and the dumpers write that table as it is
+    """
+
+    df = pd.DataFrame({'emission_quantity': [1.0, 2.0],
+                       'producing_entity_id': pd.Categorical(['ABW', 'AFG']),
+                       'start_time': pd.to_datetime(['2015-01-01', '2016-01-01']),
+                       'end_time': ['2015-12-31', '2016-12-31'], # text is parsed
+                       'reporting_entity': pd.Categorical(['climate-trace'] * 2),
+                       'original_inventory_sector': pd.Categorical(['aluminum'] * 2),
+                       'not_ermin': [0, 0]})
+    table = ermin_table(df)
+
+    assert table.schema.equals(ermin_schema())
+    assert table.column_names == pd.read_csv('../templates/ermin-specification.csv')['Structured name'].tolist()
+    assert pa.types.is_dictionary(table['producing_entity_id'].type)
+    assert table['end_time'].to_pylist()[1] == pd.Timestamp('2016-12-31')
+    assert table['data_version'].null_count == 2 # missing column
+    assert ermin_table(table) is table # already converted
+
+    write_ermin_parquet(table, str(tmp_path / 'ermin'))
+    written = read_ermin_parquet(str(tmp_path / 'ermin'), columns=['producing_entity_id', 'emission_quantity', 'year'])
+    assert sorted(written['producing_entity_id'].astype(str)) == ['ABW', 'AFG']
+    assert sorted(written['year'].astype(str)) == ['2015', '2016']
+
+    write_ermin_csv(table, str(tmp_path / 'aluminum.csv'))
+    write_ermin_csv(table, str(tmp_path / 'aluminum.csv'), append=True)
+    assert pd.read_csv(tmp_path / 'aluminum.csv')['emission_quantity'].tolist() == [1.0, 2.0, 1.0, 2.0]
@@ -0,0 +1,54 @@
+import multiprocessing
+import numpy as np
+import pandas as pd
+from utils import dimensions
+from utils.parallel import process_pool
+from utils.countries import country_registry, country_names, invalid_country_codes
+import utils.validation as eev
+
+def test_country_lookups():
+    """Ensure country codes are validated and named column-wise
+    """
+
+    registry = country_registry()
+    assert registry.loc['FRA', 'alpha2'] == 'FR'
+    assert registry.loc['FRA', 'numeric'] == 250
+    assert registry.loc['NAM', 'alpha2'] == 'NA' # not read as missing
+    assert pd.isna(registry.loc['XKX', 'alpha2']) # CT code without an ISO entry
+
+    codes = pd.Series(['ABW', 'XXX', 'AFG', None, 'XXX'], index=[5, 6, 7, 8, 9])
+    assert invalid_country_codes(codes).tolist() == [False, True, False, True, True]
+
+    names = country_names(codes)
+    assert names.index.tolist() == [5, 6, 7, 8, 9]
+    assert names[5] == 'Aruba' and names[7] == 'Afghanistan'
+    assert names[[6, 8, 9]].isna().all()
+
+    # every invalid code is reported once by the CT check
+    df = pd.DataFrame({'iso3_country': ['ABW', 'XXX', 'YYY', 'XXX']})
+    warnings, errors = eev.check_input_dataframe(df, spec_file='../templates/climate-trace-specification.csv',
+                                                 allow_unknown_stringtypes=True)
+    assert errors[:2] == ['The value XXX was not a valid iso3_country code.',
+                          'The value YYY was not a valid iso3_country code.']
+
+
+def _worker_countries():
+    countries = dimensions.table('countries')
+    inherited = country_registry.cache_info().currsize == 1 # not cleared by attach
+    return isinstance(countries, np.memmap), inherited, country_names(pd.Series(['FRA'])).tolist()
+
+
+def test_shared_country_table():
+    """Ensure pool workers share the country table: forked ones keep the parent's, others attach to the published one
+    """
+
+    countries = dimensions.table('countries')
+    assert countries.dtype.names == ('iso3', 'name', 'iso_name', 'alpha2', 'numeric')
+    assert countries.dtype['numeric'] == np.int32
+    assert countries['numeric'][list(countries['iso3']).index('XKX')] == -1
+
+    country_registry()
+    with process_pool(2, mp_context=multiprocessing.get_context('fork')) as executor:
+        assert executor.submit(_worker_countries).result() == (False, True, ['France'])
+    with process_pool(2, mp_context=multiprocessing.get_context('spawn')) as executor:
+        assert executor.submit(_worker_countries).result() == (True, False, ['France'])
@@ -0,0 +1,130 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+import utils.database as db
+
+def test_copy_clean_data():
+    """Ensure sectors are padded to ERMIN columns and loaded all-or-nothing
+    """
+
+    engine = create_engine('sqlite://')
+    df = pd.DataFrame({'original_inventory_sector': ['aluminum'] * 100,
+                       'producing_entity_id': ['ABW'] * 100,
+                       'emission_quantity': [float(i) for i in range(100)],
+                       'start_time': ['2015-01-01T00:00:00'] * 100,
+                       'end_time': ['2015-12-31T00:00:00'] * 100,
+                       'reporting_timestamp': ['2022-04-17'] * 100})
+
+    rows = db.copy_clean_data(df, engine=engine)
+    assert rows == 100
+
+    loaded = pd.read_sql('SELECT * FROM ermin', engine)
+    ermin_columns = pd.read_csv(db.ERMIN_SPEC_PATH)['Structured name'].tolist()
+    assert loaded.columns.tolist() == ermin_columns
+    assert len(loaded) == 100
+    assert loaded['emission_quantity'].sum() == sum(range(100))
+
+
+
+    # A sector that fails part way through leaves nothing behind
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE ermin_strict AS SELECT * FROM ermin WHERE 0'))
+        connection.execute(text('CREATE TRIGGER no_negatives BEFORE INSERT ON ermin_strict '
+                                'WHEN NEW.emission_quantity < 0 BEGIN SELECT RAISE(ABORT, \'negative\'); END'))
+
+    bad_df = df.copy()
+    bad_df.loc[99, 'emission_quantity'] = -1.0
+    with pytest.raises(Exception):
+        db.copy_clean_data(bad_df, engine=engine, table='ermin_strict')
+
+    assert pd.read_sql('SELECT COUNT(*) AS n FROM ermin_strict', engine)['n'][0] == 0
+
+
+def test_copy_clean_data_missing_table(monkeypatch):
+    """Ensure a missing table is created from the ERMIN columns before rows are bulk loaded into it
+    """
+
+    engine = create_engine('sqlite://')
+    df = pd.DataFrame({'original_inventory_sector': ['aluminum'] * 3,
+                       'producing_entity_id': ['ABW', 'AFG', 'AGO'],
+                       'emission_quantity': [1.0, 2.0, 3.0]})
+
+    # COPY on PostgreSQL needs the table to exist, unlike the to_sql fallback used here
+    load_frame = db._load_frame
+    def checked_load_frame(connection, ermin_rows, table):
+        assert db.inspect(connection).has_table(table)
+        assert pd.read_sql(text(f'SELECT COUNT(*) AS n FROM {table}'), connection)['n'][0] == 0
+        load_frame(connection, ermin_rows, table)
+    monkeypatch.setattr(db, '_load_frame', checked_load_frame)
+
+    assert db.copy_clean_data(df, engine=engine, table='ermin_new') == 3
+    loaded = pd.read_sql('SELECT * FROM ermin_new', engine)
+    assert loaded.columns.tolist() == pd.read_csv(db.ERMIN_SPEC_PATH)['Structured name'].tolist()
+    assert loaded['producing_entity_id'].tolist() == ['ABW', 'AFG', 'AGO']
+
+    # the first upsert into a missing table takes the same path
+    assert db.upsert_clean_data(df, engine=engine, table='ermin_upsert') == (3, 0)
+    assert db.upsert_clean_data(df.assign(emission_quantity=[1.0, 2.0, 4.0]), engine=engine, table='ermin_upsert') == (0, 1)
+    loaded = pd.read_sql('SELECT * FROM ermin_upsert ORDER BY producing_entity_id', engine)
+    assert loaded['emission_quantity'].tolist() == [1.0, 2.0, 4.0]
+
+
+def test_upsert_clean_data():
+    """Ensure re-uploading a sector only writes new or changed rows
+    """
+
+    engine = create_engine('sqlite://')
+    df = pd.DataFrame({'reporting_entity': ['climate-trace'] * 4,
+                       'original_inventory_sector': ['aluminum'] * 4,
+                       'producing_entity_id': ['ABW', 'ABW', 'AFG', 'AFG'],
+                       'emitted_product_formula': ['CO2'] * 4,
+                       'carbon_equivalency_method': ['NA'] * 4,
+                       'emission_quantity': [1.0, 2.0, 3.0, 4.0],
+                       'data_version': [0.0] * 4,
+                       'start_time': ['2015-01-01T00:00:00', '2016-01-01T00:00:00'] * 2,
+                       'end_time': ['2015-12-31T00:00:00', '2016-12-31T00:00:00'] * 2})
+
+    assert db.upsert_clean_data(df, engine=engine) == (4, 0)
+
+    # identical upload writes nothing
+    assert db.upsert_clean_data(df, engine=engine) == (0, 0)
+
+    # one changed value, one new row
+    new_df = pd.concat([df, df.iloc[[0]].assign(producing_entity_id='AGO')], ignore_index=True)
+    new_df.loc[1, 'emission_quantity'] = 20.0
+    assert db.upsert_clean_data(new_df, engine=engine) == (1, 1)
+
+    loaded = pd.read_sql('SELECT * FROM ermin ORDER BY producing_entity_id, start_time', engine)
+    assert len(loaded) == 5
+    assert loaded['emission_quantity'].tolist() == [1.0, 20.0, 3.0, 4.0, 1.0]
+
+    # rows missing from a later drop are deleted by key
+    assert db.delete_clean_data(new_df.loc[[1, 4], db.ERMIN_NATURAL_KEY], engine=engine) == 2
+    loaded = pd.read_sql('SELECT * FROM ermin ORDER BY producing_entity_id, start_time', engine)
+    assert loaded['emission_quantity'].tolist() == [1.0, 3.0, 4.0]
+
+
+def test_upsert_clean_data_keys():
+    """Ensure null key columns match on merge and delete, and duplicate keys in an upload are merged once
+    """
+
+    engine = create_engine('sqlite://')
+    df = pd.DataFrame({'reporting_entity': ['climate-trace'] * 3,
+                       'original_inventory_sector': ['aluminum'] * 3,
+                       'producing_entity_id': ['ABW', 'AFG', 'AFG'],
+                       'emitted_product_formula': ['CO2'] * 3,
+                       'emission_quantity': [1.0, 2.0, 3.0],
+                       'data_version': [0.0] * 3,
+                       'start_time': ['2015-01-01T00:00:00'] * 3,
+                       'end_time': ['2015-12-31T00:00:00'] * 3}) # no carbon_equivalency_method: null
+
+    assert db.upsert_clean_data(df.iloc[[0]], engine=engine) == (1, 0)
+    assert db.upsert_clean_data(df, engine=engine) == (1, 0) # AFG once, with the last value
+    assert db.upsert_clean_data(df, engine=engine) == (0, 0)
+
+    loaded = pd.read_sql('SELECT * FROM ermin ORDER BY producing_entity_id', engine)
+    assert loaded['emission_quantity'].tolist() == [1.0, 3.0]
+    assert loaded['carbon_equivalency_method'].isna().all()
+
+    keys = df.reindex(columns=db.ERMIN_NATURAL_KEY).iloc[[0]]
+    assert db.delete_clean_data(keys, engine=engine) == 1
@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+from utils.dates import detect_format, parse_dates, to_iso, ISO_FORMAT
+
+def test_date_normalization():
+    """Ensure date formats are detected per column and distinct values converted once
+    """
+
+    us_dates = pd.Series(['1/1/15', '12/31/15', None, '1/1/15'])
+    assert detect_format(us_dates) == '%m/%d/%y'
+    assert detect_format(pd.Series(['2015-01-01', '2015-12-31'])) == ISO_FORMAT
+    assert detect_format(pd.Series([2015, 2016])) == '%Y'
+    assert detect_format(pd.Series(['first of may'])) is None
+
+    iso_dates = to_iso(us_dates)
+    assert iso_dates[[0, 1, 3]].tolist() == ['2015-01-01T00:00:00', '2015-12-31T00:00:00', '2015-01-01T00:00:00']
+    assert pd.isna(iso_dates[2])
+    parsed = parse_dates(us_dates)
+    assert parsed.dtype == 'datetime64[ns]'
+    assert parsed.isna().tolist() == [False, False, True, False]
+    assert parsed[1] == pd.Timestamp('2015-12-31')
+
+    # years, e.g. melted EDGAR year columns
+    years = pd.Series(pd.Categorical([1970, 1971, 1970]))
+    assert to_iso(years, '%Y').tolist() == ['1970-01-01T00:00:00', '1971-01-01T00:00:00', '1970-01-01T00:00:00']
+
+    # a value past the sample that does not match the detected format
+    with pytest.raises(ValueError):
+        to_iso(pd.Series(['1/1/15'] * 100 + ['2015-01-01']))
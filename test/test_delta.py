@@ -0,0 +1,49 @@
+import pandas as pd
+import utils.delta as delta
+from utils.delta import SnapshotStore
+from utils.versions import VersionRegistry
+
+def ermin_rows(countries, quantities):
+    return pd.DataFrame({'reporting_entity': 'climate-trace',
+                         'original_inventory_sector': 'aluminum',
+                         'producing_entity_id': pd.Categorical(countries),
+                         'emitted_product_formula': 'CO2',
+                         'carbon_equivalency_method': 'NA',
+                         'start_time': pd.Timestamp('2015-01-01'),
+                         'end_time': pd.Timestamp('2015-12-31'),
+                         'emission_quantity': quantities,
+                         'emission_quantity_units': 'tonnes',
+                         'data_version_changelog': 'NULL'})
+
+def test_delta(tmp_path):
+    """Ensure only added and changed rows are passed on, removed keys are reported and the changelog records the changes
+    """
+
+    snapshots = SnapshotStore(str(tmp_path / 'snapshots'))
+    registry = VersionRegistry(str(tmp_path / 'versioning.csv'))
+    registry.record('climate-trace', 'aluminum', '20220403')
+
+    # first drop: everything is new
+    first = ermin_rows(['ABW', 'AFG', 'AGO'], [1.0, 2.0, 3.0])
+    rows, changes = delta.keep_changes(first, snapshots, 'climate-trace', 'aluminum')
+    assert len(rows) == 3 and changes['changelog'] is None
+    delta.record_changes(changes, snapshots, 'climate-trace', 'aluminum', registry)
+    assert registry.latest('climate-trace', 'aluminum')[2] == 'initial commit, first round of data'
+
+    # next drop: AFG changed, AGO removed, ALB added; categories in another order hash the same
+    registry.record('climate-trace', 'aluminum', '20220501')
+    second = ermin_rows(['ALB', 'AFG', 'ABW'], [4.0, 20.0, 1.0])
+    rows, changes = delta.keep_changes(second, snapshots, 'climate-trace', 'aluminum')
+    assert changes['delta'] == {'added': 1, 'changed': 1, 'removed': 1, 'unchanged': 1}
+    assert rows['producing_entity_id'].tolist() == ['ALB', 'AFG']
+    assert rows['data_version_changelog'].tolist() == ['1 rows added, 1 changed, 1 removed'] * 2
+
+    removed = []
+    delta.record_changes(changes, snapshots, 'climate-trace', 'aluminum', registry,
+                         removed_sink=lambda sector, keys: removed.append(keys))
+    assert removed[0]['producing_entity_id'].tolist() == ['AGO']
+    assert registry.latest('climate-trace', 'aluminum')[1:] == (0.1, '1 rows added, 1 changed, 1 removed')
+
+    # the same drop again changes nothing
+    rows, changes = delta.keep_changes(second, snapshots, 'climate-trace', 'aluminum')
+    assert len(rows) == 0 and delta.is_unchanged(changes['delta'])
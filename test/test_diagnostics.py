@@ -0,0 +1,37 @@
+import numpy as np
+from utils.diagnostics import Diagnostics
+
+def test_diagnostics():
+    """Ensure occurrences are counted per code while only capped examples are kept and formatted
+    """
+
+    errors = Diagnostics(max_examples=2)
+    values = np.array([-1.0, 5.0, -2.0, -3.0])
+    errors.add('negative_emissions', rows=np.flatnonzero(values < 0), column='CO2_emissions_tonnes',
+               value=values, year=np.array([2015, 2016, 2017, 2018]), country=np.array(['ABW', 'AFG', 'AGO', 'ALB'], dtype=object))
+    errors.append('Missing this required column: "data_version".')
+    errors.append('Some ERMIN error')
+
+    assert len(errors) == 5
+    assert errors.summary() == {'negative_emissions': 3, 'missing_column': 1, 'message': 1}
+    assert list(errors) == ['Error: Negative CO2_emissions_tonnes emissions -1.0 reported in 2015 for country ABW',
+                            'Error: Negative CO2_emissions_tonnes emissions -2.0 reported in 2017 for country AGO',
+                            '... and 1 more negative_emissions (not shown)',
+                            'Missing this required column: "data_version".',
+                            'Some ERMIN error']
+    assert errors[:1] == list(errors)[:1]
+    assert errors.fields('missing_column', 'column') == ['data_version']
+
+    # merging keeps the counts of occurrences that were not kept
+    merged = Diagnostics(max_examples=2)
+    merged += errors
+    merged += errors
+    assert merged.summary() == {'negative_emissions': 6, 'missing_column': 2, 'message': 2}
+    assert merged.unique().fields('missing_column', 'column') == ['data_version']
+
+    # occurrences whose examples were gathered beforehand, e.g. the first 2 of 10
+    gathered = Diagnostics(max_examples=2)
+    gathered.add('spanning_entry', count=10, start_date=np.array(['2015-01-01', '2016-01-01']),
+                 end_date=np.array(['2016-12-31', '2017-12-31']), country='AFG')
+    assert gathered.summary() == {'spanning_entry': 10}
+    assert gathered[2] == '... and 8 more spanning_entry (not shown)'
@@ -0,0 +1,73 @@
+import pandas as pd
+from utils.edgar import iter_edgar_data, list_sheets, workbook_gas, workbook_date
+
+def edgar_sheet():
+    """raw EDGAR sheet: header block, then column names in row 8 and one row per country/category"""
+    width = 8
+    rows = [['Compound:', 'CH4'], ['Unit:', 'Gg'], ['Data download:', 'https://edgar.jrc.ec.europa.eu']]
+    rows += [[None, None]] * 5
+    rows = [row + [None] * (width - 2) for row in rows]
+    rows.append(['IPCC_annex', 'C_group_IM24_sh', 'Country_code_A3', 'Name',
+                 'ipcc_code_2006_for_standard_report', 'ipcc_code_2006_for_standard_report_name', 'Y_1970', 'Y_1971'])
+    rows.append(['Annex_I', 'OECD', 'ABW', 'Aruba', '1.A.1.a', 'Main Activity', 1.0, 2.0])
+    rows.append(['Annex_I', 'OECD', 'ABW', 'Aruba', '1.A.1.a', 'Main Activity', 10.0, 20.0]) # bio and fossil rows
+    rows.append(['Annex_I', 'OECD', 'AFG', 'Afghanistan', '4.A', 'Solid Waste', 3.0, 4.0])
+    return pd.DataFrame(rows, columns=['Content:', 'Emissions by country and main source category'] +
+                                      ['Unnamed: ' + str(i) for i in range(2, width)])
+
+def test_iter_edgar_data(tmp_path):
+    """Ensure EDGAR sheets are cleaned the same way from workbooks, staged copies and worker processes
+    """
+
+    data_dir = tmp_path / 'raw'
+    data_dir.mkdir()
+    with pd.ExcelWriter(data_dir / 'edgar_v60-CH4_20220414.xlsx') as writer:
+        edgar_sheet().to_excel(writer, sheet_name='IPCC 2006', index=False)
+        edgar_sheet().to_excel(writer, sheet_name='IPCC 1996', index=False)
+        edgar_sheet().to_excel(writer, sheet_name='TOTALS BY COUNTRY', index=False)
+
+    sheets = list(iter_edgar_data(str(data_dir), verbose=False))
+    assert [sheet for sheet, _ in sheets] == ['IPCC 2006']
+    df = sheets[0][1].sort_values(['producing_entity_id', 'start_time']).reset_index(drop=True)
+    assert df['original_inventory_sector'].tolist() == ['1.A.1.a Main Activity'] * 2 + ['4.A Solid Waste'] * 2
+    assert df['emission_quantity'].tolist() == [11.0, 22.0, 3.0, 4.0]
+    assert df['start_time'].tolist() == ['1970-01-01T00:00:00', '1971-01-01T00:00:00'] * 2
+    assert (df['emitted_product_formula'] == 'CH4').all()
+    assert (df['emission_quantity_units'] == 'Gg').all()
+
+    for kwargs in [{'stage_dir': str(tmp_path / 'staged')}, {'workers': 2}]:
+        other = list(iter_edgar_data(str(data_dir), verbose=False, **kwargs))
+        assert [sheet for sheet, _ in other] == ['IPCC 2006']
+        other_df = other[0][1].sort_values(['producing_entity_id', 'start_time']).reset_index(drop=True)
+        assert other_df['emission_quantity'].tolist() == df['emission_quantity'].tolist()
+        assert other_df['original_inventory_sector'].tolist() == df['original_inventory_sector'].tolist()
+
+
+def test_staged_sheets(tmp_path):
+    """Ensure sheets of the same name in different workbooks are staged to separate files
+    """
+
+    data_dir = tmp_path / 'raw'
+    data_dir.mkdir()
+    for gas in ['CH4', 'N2O']:
+        with pd.ExcelWriter(data_dir / f'edgar_v60-{gas}_20220414.xlsx') as writer:
+            edgar_sheet().replace('CH4', gas).to_excel(writer, sheet_name='IPCC 2006', index=False)
+
+    sheets = list_sheets(str(data_dir), stage_dir=str(tmp_path / 'staged'), verbose=False)
+    assert [sheet for sheet, _ in sheets] == ['IPCC 2006', 'IPCC 2006']
+    assert len({path for _, path in sheets}) == 2
+    gases = {df['emitted_product_formula'].iat[0]
+             for _, df in iter_edgar_data(str(data_dir), stage_dir=str(tmp_path / 'staged'), verbose=False)}
+    assert gases == {'CH4', 'N2O'}
+
+
+def test_workbook_names():
+    """Ensure units are named by gas, the same from one drop to the next
+    """
+
+    assert workbook_gas('edgar_v60-CH4_20220414') == 'CH4'
+    assert workbook_gas('edgar v60-N2O-1970-2018_20220414') == 'N2O'
+    assert workbook_gas('edgar_EDGARv6.0_FT2020_fossil_CO2_GHG_booklet2021') == 'CO2'
+    assert workbook_gas('edgar_SF6-totals_20220414') == 'SF6-totals'
+    assert workbook_date('edgar_v60-CH4_20220414') == '20220414'
+    assert workbook_date('edgar_EDGARv6.0_FT2020_fossil_CO2_GHG_booklet2021') is None
@@ -0,0 +1,87 @@
+import os
+import shutil
+import sys
+import pandas as pd
+
+# scripts/ holds the pipeline entry points
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import execute
+from climate_trace import ClimateTraceSource
+from utils.arrow import ermin_table
+from utils.sources import run_sources
+from utils.staging import read_ermin_parquet
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+INPUT = os.path.join(HERE, 'climate-trace3-reduced_input')
+
+
+def test_dump_complete_with_snapshots(tmp_path, monkeypatch):
+    """Ensure a run over a changed drop leaves the dump complete, with delta mode configured
+    """
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(execute, 'push_to_db', True)
+    monkeypatch.setattr(execute, 'snapshot_dir', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(execute, 'dump_format', 'parquet')
+    datadir = tmp_path / 'input'
+    datadir.mkdir()
+    shutil.copy(os.path.join(INPUT, 'climate-trace_aluminum_20220403.csv'), datadir)
+
+    def dump(key, df):
+        execute.dump_sector(key, ermin_table(df), first=True)
+
+    def run():
+        source = ClimateTraceSource(str(datadir), missing_value_input=os.path.join(INPUT, 'fill_values_table.csv'),
+                                    verbose=False)
+        run_sources([source], sink=dump, snapshot_dir=execute.delta_snapshot_dir(), verbose=False)
+        return len(read_ermin_parquet('ermin_parquet'))
+
+    rows = run()
+    assert rows > 0
+
+    # the next drop changes one value
+    drop = pd.read_csv(datadir / 'climate-trace_aluminum_20220403.csv', index_col=0)
+    drop.loc[0, 'total_CO2e_100yrGWP'] += 1
+    os.remove(datadir / 'climate-trace_aluminum_20220403.csv')
+    drop.to_csv(datadir / 'climate-trace_aluminum_20220501.csv')
+    assert run() == rows
+
+    # without a dump, changed rows only are uploaded
+    monkeypatch.setattr(execute, 'dump_format', None)
+    assert execute.delta_snapshot_dir() == str(tmp_path / 'snapshots')
+
+
+def test_run_sources_workers(tmp_path):
+    """Ensure the fixture sectors give the same clean frames and errors, in the same order, with one or two workers
+    """
+
+    # the fixture sectors, and two more failing the specification and the CT requirements
+    datadir = tmp_path / 'input'
+    shutil.copytree(INPUT, datadir)
+    aluminum = pd.read_csv(datadir / 'climate-trace_aluminum_20220403.csv', index_col=0)
+    aluminum.assign(iso3_country=aluminum['iso3_country'].mask(aluminum.index.isin([3, 50]), 'XXX')) \
+        .to_csv(datadir / 'climate-trace_cement_20220403.csv')
+    aluminum.assign(total_CO2e_100yrGWP=aluminum['total_CO2e_100yrGWP'].mask(aluminum.index.isin([7, 8, 90]), -1.0)) \
+        .to_csv(datadir / 'climate-trace_steel_20220403.csv')
+
+    def run(workers):
+        source = ClimateTraceSource(str(datadir), missing_value_input=str(datadir / 'fill_values_table.csv'),
+                                    verbose=False)
+        clean_data, diagnostics, _ = run_sources([source], workers=workers, verbose=False,
+                                                 error_output=str(tmp_path / f'errors_{workers}.txt'))
+        return clean_data, diagnostics
+
+    clean_data, diagnostics = run(1)
+    parallel_clean_data, parallel_diagnostics = run(2)
+
+    assert len(clean_data) == 3
+    assert len(diagnostics['climate-trace_cement'][1]) > 0
+    assert len(diagnostics['climate-trace_steel'][1]) > 1
+    assert list(parallel_clean_data) == list(clean_data)
+    for key, df in clean_data.items():
+        pd.testing.assert_frame_equal(parallel_clean_data[key], df)
+    assert list(parallel_diagnostics) == list(diagnostics)
+    for key, (warnings, errors) in diagnostics.items():
+        assert parallel_diagnostics[key][0].messages() == warnings.messages()
+        assert parallel_diagnostics[key][1].messages() == errors.messages()
+    assert (tmp_path / 'errors_2.txt').read_text() == (tmp_path / 'errors_1.txt').read_text()
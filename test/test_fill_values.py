@@ -0,0 +1,41 @@
+import pandas as pd
+from utils.fill_values import FillValues, fill_columns
+from utils.versions import VersionRegistry
+
+def test_fill_values(tmp_path):
+    """Ensure quoted values load intact, values are typed, versions come from the registry and fills are categorical constants
+    """
+
+    path = tmp_path / 'filled_values.csv'
+    path.write_text('aluminum,unfccc_annex_1_category,2.C.3  Aluminium Production\n'
+                    'aluminum,data_version,0.0\n'
+                    'aluminum,data_version_changelog,"initial commit, first round of data"\n'
+                    'aluminum,reporting_timestamp,2022-04-18T21:40:04.124658\n'
+                    'cement, data_version ,NULL\n')
+    dtypes = {'data_version': 'float64', 'reporting_timestamp': 'datetime64[ns]'}
+    fill_values = FillValues.load(str(path), dtypes=dtypes)
+
+    assert fill_values.sectors() == ['aluminum', 'cement']
+    assert fill_values['aluminum'] == {'unfccc_annex_1_category': '2.C.3  Aluminium Production',
+                                       'data_version': 0.0,
+                                       'data_version_changelog': 'initial commit, first round of data',
+                                       'reporting_timestamp': pd.Timestamp('2022-04-18T21:40:04.124658')}
+    assert fill_values['cement'] == {'data_version': 'NULL'} # left for the validator
+    assert fill_values['steel'] == {}
+
+    registry = VersionRegistry(str(tmp_path / 'versioning.csv'))
+    registry.record('climate-trace', 'aluminum', '20220403')
+    registry.record('climate-trace', 'aluminum', '20220501', changelog='new drop')
+    fill_values.set_versions(registry, 'climate-trace')
+    fill_values.set_all('reporting_timestamp', '2022-05-02')
+    assert fill_values['aluminum']['data_version'] == 0.1
+    assert fill_values['aluminum']['data_version_changelog'] == 'new drop'
+    assert fill_values['aluminum']['reporting_timestamp'] == pd.Timestamp('2022-05-02')
+    assert 'reporting_timestamp' not in fill_values['cement'] # only where listed
+    assert path.read_text().count('initial commit') == 1 # file untouched
+
+    df = pd.DataFrame({'emission_quantity': [1.0, 2.0, 3.0]})
+    fill_columns(df, fill_values['aluminum'], dtypes)
+    assert df['unfccc_annex_1_category'].dtype == 'category'
+    assert df['data_version'].dtype == 'float64' and df['data_version'].tolist() == [0.1] * 3
+    assert df['reporting_timestamp'].dtype == 'datetime64[ns]'
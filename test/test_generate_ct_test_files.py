@@ -0,0 +1,18 @@
+import pandas as pd
+from generate_ct_test_files import generate_ct_frame
+
+def test_generate_ct_frame():
+    """Ensure generated inputs have the requested shape and inject the requested share of faulty rows
+    """
+
+    df = generate_ct_frame('aluminum', countries=['ABW', 'AFG'], years=range(2015, 2017), facilities=3)
+    assert len(df) == 2 * 2 * 3
+    assert df['iso3_country'].tolist() == ['ABW'] * 6 + ['AFG'] * 6
+    assert df['start_date'].tolist()[:6] == ['1/1/15'] * 3 + ['1/1/16'] * 3
+    assert (df['CO2_emissions_tonnes'] == 1000000).all() and df['CH4_emissions_tonnes'].isna().all()
+
+    df = generate_ct_frame('aluminum', rows=30000, countries=['ABW'], error_rate=0.3, values='random', date_format='%Y-%m-%d')
+    assert len(df) == 30000
+    spanning = pd.to_datetime(df['end_date']).dt.year != pd.to_datetime(df['start_date']).dt.year
+    for faulty in [df['CO2_emissions_tonnes'] < 0, spanning, df['iso3_country'] == 'XXX']:
+        assert 0.05 < faulty.mean() < 0.15
@@ -0,0 +1,53 @@
+import pandas as pd
+from utils.import_data import read_data_file, iter_data_from_local
+
+
+def test_read_chunks_fallback(tmp_path):
+    """Ensure a numeric column that does not parse in one block is read as text in that block only
+    """
+
+    path = tmp_path / 'test.csv'
+    pd.DataFrame({'a': ['1', '2', 'abc', '4'], 'b': ['w', 'x', 'y', 'z']}).to_csv(path, index=False)
+
+    blocks = [df for _, df in read_data_file('test', str(path), verbose=False, chunksize=2, dtype={'a': 'float64'})]
+    assert blocks[0]['a'].dtype == 'float64'
+    assert blocks[0]['a'].tolist() == [1.0, 2.0]
+    assert blocks[1]['a'].tolist() == ['abc', '4']
+
+
+def test_iter_data_from_local(tmp_path):
+    """Ensure an inventory's CSV files are read with the given dtypes and columns, whole or in chunks
+    """
+
+    pd.DataFrame({'id': ['001', '002', '003', '004', '005'],
+                  'emissions': ['1.5', '2', '', '4', '5e3'],
+                  'note': ['a', 'b', 'c', 'd', 'e']}).to_csv(tmp_path / 'ct_sector-a_20220101.csv', index=False)
+    pd.DataFrame({'id': ['010'], 'emissions': ['7'], 'note': ['f']}).to_csv(tmp_path / 'ct_sector-b_20220101.csv', index=False)
+    pd.DataFrame({'id': ['999']}).to_csv(tmp_path / 'other_sector-a_20220101.csv', index=False)
+
+    options = {'dtype': {'id': str, 'emissions': 'float64'}, 'usecols': ['id', 'emissions']}
+    whole = dict(iter_data_from_local('ct', path_to_data=str(tmp_path), verbose=False, **options))
+    assert sorted(whole) == ['sector-a_20220101', 'sector-b_20220101']
+    table = whole['sector-a_20220101']
+    assert table.columns.tolist() == ['id', 'emissions']
+    assert table['id'].tolist() == ['001', '002', '003', '004', '005']
+    assert table['emissions'].dtype == 'float64'
+    assert table['emissions'].tolist()[:2] == [1.5, 2.0] and table['emissions'].isna().tolist()[2]
+
+    # blocks of 2 rows split the 5 row file after '002' and '004'
+    chunks = {}
+    for file_info, chunk in iter_data_from_local('ct', path_to_data=str(tmp_path), verbose=False,
+                                                 chunksize=2, **options):
+        assert chunk.columns.tolist() == ['id', 'emissions']
+        assert chunk['emissions'].dtype == 'float64'
+        chunks.setdefault(file_info, []).append(chunk)
+    assert [len(chunk) for chunk in chunks['sector-a_20220101']] == [2, 2, 1]
+    assert chunks['sector-a_20220101'][1]['id'].tolist() == ['003', '004']
+    for file_info, table in whole.items():
+        pd.testing.assert_frame_equal(pd.concat(chunks[file_info], ignore_index=True), table)
+
+    # a callable usecols, as from spec_read_options, selects the same way
+    only_id = dict(iter_data_from_local('ct', path_to_data=str(tmp_path), verbose=False, chunksize=2,
+                                        dtype={'id': str}, usecols=lambda column: column == 'id'))
+    assert only_id['sector-b_20220101'].columns.tolist() == ['id']
+    assert only_id['sector-b_20220101']['id'].tolist() == ['010']
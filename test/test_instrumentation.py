@@ -0,0 +1,50 @@
+import json
+import numpy as np
+import pandas as pd
+from utils.instrumentation import RunReport, REPORT_COLUMNS
+
+def test_run_report(tmp_path):
+    """Ensure stage measurements are added up per sector and stage and written as JSON or CSV
+    """
+
+    report = RunReport()
+    for rows in [10, 20]:
+        with report.stage('aluminum', 'step2_reshape', rows_in=rows) as stage:
+            stage['rows_out'] = 5 * rows
+    with report.stage('aluminum', 'load') as stage:
+        stage['discard'] = True
+    with report.stage('cement', 'step2_reshape', rows_in=1):
+        pass
+
+    # measurements made elsewhere, e.g. in a worker process
+    worker_report = RunReport()
+    with worker_report.stage('cement', 'step2_reshape', rows_in=2):
+        pass
+    report.extend(worker_report.to_list())
+
+    records = report.to_list()
+    assert [(r['sector'], r['stage'], r['calls']) for r in records] == [('aluminum', 'step2_reshape', 2), ('cement', 'step2_reshape', 2)]
+    assert records[0]['rows_in'] == 30 and records[0]['rows_out'] == 150
+    assert records[1]['rows_in'] == 3 and records[1]['rows_out'] is None
+    assert all(r['wall_seconds'] >= 0 and r['cpu_seconds'] >= 0 for r in records)
+
+    # memory left allocated by a stage, not the process's high-water mark
+    with report.stage('cement', 'load'):
+        kept = np.ones(64 * 1024 ** 2 // 8)
+    with report.stage('cement', 'reshape'):
+        pass
+    records = report.to_list()
+    if records[-2]['rss_delta_mb'] is not None: # None without /proc
+        assert records[-2]['rss_delta_mb'] > 60 and abs(records[-1]['rss_delta_mb']) < 10
+    del kept
+
+    report.write(str(tmp_path / 'report.json'))
+    assert json.load(open(tmp_path / 'report.json')) == records
+    report.write(str(tmp_path / 'report.csv'))
+    assert pd.read_csv(tmp_path / 'report.csv').columns.tolist() == REPORT_COLUMNS
+
+    # nothing is measured when disabled
+    disabled = RunReport(enabled=False)
+    with disabled.stage('aluminum', 'load'):
+        pass
+    assert disabled.to_list() == []
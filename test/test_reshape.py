@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+from utils.reshape import wide_to_long, constant_column, compact_frame, concat_frames, CT_EMISSIONS_COLUMNS
+
+def test_wide_to_long():
+    """Ensure CT emissions columns are stacked with the right descriptors
+    """
+
+    df = pd.DataFrame({'start_time': ['2015-01-01T00:00:00', '2016-01-01T00:00:00'],
+                       'end_time': ['2015-12-31T00:00:00', '2016-12-31T00:00:00'],
+                       'producing_entity_id': ['ABW', 'AFG'],
+                       'CO2_emissions_tonnes': [1.0, 2.0],
+                       'CH4_emissions_tonnes': [np.nan, 3.0],
+                       'N2O_emissions_tonnes': [4.0, 5.0],
+                       'total_CO2e_20yrGWP': [6.0, 7.0],
+                       'total_CO2e_100yrGWP': [8.0, 9.0]})
+
+    long_df = wide_to_long(df, id_columns=['start_time', 'end_time', 'producing_entity_id'],
+                           value_columns=CT_EMISSIONS_COLUMNS)
+
+    assert list(long_df.columns) == ['start_time', 'end_time', 'producing_entity_id', 'emission_quantity',
+                                     'emission_quantity_units', 'emitted_product_formula', 'carbon_equivalency_method']
+    assert len(long_df) == 10
+    assert long_df['emission_quantity'].dtype == 'float64'
+    for column in ['emission_quantity_units', 'emitted_product_formula', 'carbon_equivalency_method']:
+        assert isinstance(long_df[column].dtype, pd.CategoricalDtype)
+
+    assert long_df['producing_entity_id'].tolist() == ['ABW', 'AFG'] * 5
+    assert long_df['emitted_product_formula'].tolist() == ['CO2', 'CO2', 'CH4', 'CH4', 'N2O', 'N2O',
+                                                           'CO2e', 'CO2e', 'CO2e', 'CO2e']
+    assert long_df['carbon_equivalency_method'].tolist() == ['NA'] * 6 + ['20-year'] * 2 + ['100-year'] * 2
+    assert long_df['emission_quantity'].tolist()[3:] == [3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0]
+    assert np.isnan(long_df.at[2, 'emission_quantity'])
+
+
+
+    # EDGAR-style year columns become a single descriptor column
+    df = pd.DataFrame({'producing_entity_id': ['ABW'], 1970: [1.5], 1971: [2.5]})
+
+    long_df = wide_to_long(df, id_columns=['producing_entity_id'],
+                           value_columns={year: {'year': year} for year in [1970, 1971]})
+
+    assert long_df['year'].tolist() == [1970, 1971]
+    assert long_df['emission_quantity'].tolist() == [1.5, 2.5]
+
+
+def test_compact_frame():
+    """Ensure frames are cast to the compact schema and keep it through concatenation
+    """
+
+    dtypes = {'start_time': 'datetime64[ns]', 'emission_quantity': 'float64', 'data_version': 'float64',
+              'producing_entity_id': 'category', 'reporting_entity': 'category'}
+    df = pd.DataFrame({'start_time': ['2015-01-01T00:00:00', '2016-01-01T00:00:00', 'not a date', '2015-01-01T00:00:00'],
+                       'emission_quantity': ['1.5', '2', '3', '4'],
+                       'data_version': ['1.0', 'NULL', '1.0', '1.0'],
+                       'producing_entity_id': ['ABW', 'ABW', 'AFG', 'AFG']})
+    df['reporting_entity'] = constant_column('climate-trace', len(df))
+    compact_frame(df, dtypes)
+
+    assert not pd.api.types.is_datetime64_any_dtype(df['start_time']) # left for the validators to report
+    assert df['emission_quantity'].dtype == 'float64'
+    assert df['data_version'].tolist() == ['1.0', 'NULL', '1.0', '1.0']
+    assert isinstance(df['producing_entity_id'].dtype, pd.CategoricalDtype)
+    assert df['reporting_entity'].cat.codes.dtype == 'int8'
+
+    blocks = [compact_frame(df.iloc[:2].assign(start_time=['2015-01-01', '2016-01-01']), dtypes),
+              compact_frame(df.iloc[2:].assign(start_time=['2017-01-01', '2018-01-01']), dtypes)]
+    assert blocks[0]['start_time'].dtype == 'datetime64[ns]'
+    combined = concat_frames(blocks)
+    assert isinstance(combined['producing_entity_id'].dtype, pd.CategoricalDtype)
+    assert combined['producing_entity_id'].tolist() == ['ABW', 'ABW', 'AFG', 'AFG']
+    assert constant_column('1.0', 3, 'float64').tolist() == [1.0] * 3
+    assert constant_column(None, 3, 'float64').isna().all()
+    assert constant_column(2, 3, 'float64').tolist() == [2.0] * 3
+    # values that are not strings or numbers stay categorical rather than raising TypeError
+    assert constant_column(True, 3, 'datetime64[ns]').tolist() == [True] * 3
+    assert constant_column(('NULL',), 3, 'float64').tolist() == [('NULL',)] * 3
@@ -0,0 +1,161 @@
+import pandas as pd
+from utils.diagnostics import Diagnostics
+from utils.sources import Source, Unit, run_sources
+from utils.versions import VersionRegistry
+import utils.validation as eev
+
+
+class CountingSource(Source):
+    """one unit per CSV file named <name>_<unit>_<date>.csv in datadir; counts the units it loads"""
+
+    def __init__(self, datadir, name, **kwargs):
+        super().__init__(datadir, verbose=False, **kwargs)
+        self.name = name
+        self.loaded = []
+
+    def discover(self):
+        return [Unit(path.stem.split('_')[1], str(path), None, path.stem.split('_')[2])
+                for path in sorted(self.datadir.glob(self.name + '_*.csv'))]
+
+    def load(self, unit):
+        self.loaded.append(unit.name)
+        return pd.read_csv(unit.path)
+
+    def normalize(self, unit, df, report):
+        errors = Diagnostics()
+        errors.add('negative_emissions', rows=(df['value'] < 0).to_numpy().nonzero()[0],
+                   column='value', value=df['value'].to_numpy(), year=2020, country='USA')
+        return Diagnostics(), errors, df
+
+    def validate(self, unit, df, report, workers=1):
+        return Diagnostics(), Diagnostics(), df
+
+    def dependencies(self):
+        return []
+
+
+def test_run_sources(tmp_path, capsys):
+    """Ensure units of all sources are interleaved, failed units are not emitted, and unchanged units come from the cache
+    """
+
+    pd.DataFrame({'value': [1.0, 2.0]}).to_csv(tmp_path / 'a_one_20220101.csv', index=False)
+    pd.DataFrame({'value': [3.0]}).to_csv(tmp_path / 'a_two_20220101.csv', index=False)
+    pd.DataFrame({'value': [4.0]}).to_csv(tmp_path / 'a_three_20220101.csv', index=False)
+    pd.DataFrame({'value': [-5.0]}).to_csv(tmp_path / 'b_one_20220201.csv', index=False)
+
+    emitted = []
+    registry = VersionRegistry(str(tmp_path / 'versioning.csv'))
+    sources = [CountingSource(tmp_path, 'a'), CountingSource(tmp_path, 'b')]
+    clean_data, diagnostics, _ = run_sources(sources, sink=lambda key, df: emitted.append(key),
+                                             cache_dir=str(tmp_path / 'cache'), version_registry=registry,
+                                             error_output=str(tmp_path / 'errors.txt'), verbose=False)
+
+    assert emitted == ['a_one', 'a_three', 'a_two'] # b_one (second in turn) failed
+    assert clean_data == {}
+    assert list(diagnostics) == ['a_one', 'b_one', 'a_three', 'a_two']
+    assert diagnostics['b_one'][1].summary() == {'negative_emissions': 1}
+    assert 'b_one encountered errors' in (tmp_path / 'errors.txt').read_text()
+    assert 'b_one encountered 1 errors (negative_emissions: 1)' in capsys.readouterr().out # printed without verbose
+    assert registry.latest('b', 'one')[1] == 0.0
+
+    # second run: nothing loaded again, same results
+    sources = [CountingSource(tmp_path, 'a'), CountingSource(tmp_path, 'b')]
+    clean_data, diagnostics, _ = run_sources(sources, cache_dir=str(tmp_path / 'cache'), verbose=False)
+    assert [source.loaded for source in sources] == [[], []]
+    assert sorted(clean_data) == ['a_one', 'a_three', 'a_two']
+    assert clean_data['a_one']['value'].tolist() == [1.0, 2.0]
+
+
+def test_run_sources_cache_per_file(tmp_path):
+    """Ensure two files of the same unit (e.g. two drops) are cached under their own keys
+    """
+
+    pd.DataFrame({'value': [1.0]}).to_csv(tmp_path / 'a_one_20220101.csv', index=False)
+    pd.DataFrame({'value': [2.0]}).to_csv(tmp_path / 'a_one_20220201.csv', index=False)
+
+    for _ in range(2):
+        emitted = []
+        source = CountingSource(tmp_path, 'a')
+        run_sources([source], sink=lambda key, df: emitted.append(df['value'].tolist()),
+                    cache_dir=str(tmp_path / 'cache'), verbose=False)
+        assert emitted == [[1.0], [2.0]]
+    assert source.loaded == [] # both from the cache
+
+
+class StampingSource(CountingSource):
+    """CountingSource stamping its results with the run they were passed on in"""
+
+    def __init__(self, datadir, name, run):
+        super().__init__(datadir, name)
+        self.run = run
+
+    def refresh(self, unit, df):
+        df['run'] = self.run
+        return df
+
+
+def test_run_sources_refresh(tmp_path):
+    """Ensure values specific to a run are filled into cached results, and do not change the cache key
+    """
+
+    pd.DataFrame({'value': [1.0]}).to_csv(tmp_path / 'a_one_20220101.csv', index=False)
+
+    for run in [1, 2]:
+        source = StampingSource(tmp_path, 'a', run)
+        clean_data, _, _ = run_sources([source], cache_dir=str(tmp_path / 'cache'), verbose=False)
+        assert clean_data['a_one']['run'].tolist() == [run]
+    assert source.loaded == [] # from the cache
+
+
+class BlockSource(CountingSource):
+    """CountingSource reading units in blocks; negative values fail validation of their block"""
+
+    def load_blocks(self, unit, chunksize):
+        return pd.read_csv(unit.path, chunksize=chunksize)
+
+    def convert(self, unit, df, report):
+        return df
+
+    def validate(self, unit, df, report, workers=1):
+        return self.normalize(unit, df, report)
+
+
+def test_run_sources_blocks(tmp_path):
+    """Ensure blocks of a unit are only passed on once all of them are valid, and are not kept without a sink
+    """
+
+    pd.DataFrame({'value': [1.0, 2.0, 3.0]}).to_csv(tmp_path / 'a_one_20220101.csv', index=False)
+    pd.DataFrame({'value': [4.0, 5.0, -6.0]}).to_csv(tmp_path / 'a_two_20220101.csv', index=False)
+
+    emitted = []
+    spill_dir = tmp_path / 'spill'
+    spill_dir.mkdir()
+    _, diagnostics, _ = run_sources([BlockSource(tmp_path, 'a')], chunksize=2, spill_dir=str(spill_dir),
+                                    sink=lambda key, df: emitted.append((key, df['value'].tolist())), verbose=False)
+    assert emitted == [('a_one', [1.0, 2.0]), ('a_one', [3.0])] # no block of a_two, whose last block failed
+    assert diagnostics['a_two'][1].summary() == {'negative_emissions': 1}
+    assert list(spill_dir.iterdir()) == []
+
+    clean_data, diagnostics, _ = run_sources([BlockSource(tmp_path, 'a')], chunksize=2, verbose=False)
+    assert clean_data == {}
+    assert list(diagnostics) == ['a_one', 'a_two']
+
+
+def test_validate_whole_unless_workers(tmp_path, monkeypatch):
+    """Ensure units are validated whole by default, and by partitions only with more than one worker
+    """
+
+    calls = []
+    def check(name):
+        def check_frame(df, spec_file=None, repair=False, **kwargs):
+            calls.append((name, kwargs.get('workers')))
+            return [], [], df
+        return check_frame
+    monkeypatch.setattr(eev, 'check_ermin_dataframe', check('whole'))
+    monkeypatch.setattr(eev, 'check_ermin_partitioned', check('partitioned'))
+
+    source = Source(tmp_path, verbose=False)
+    df = pd.DataFrame({'producing_entity_id': ['ABW', 'AFG'], 'emission_quantity': [1.0, 2.0]})
+    source.validate(None, df, None)
+    source.validate(None, df, None, workers=2)
+    assert calls == [('whole', None), ('partitioned', 2)]
@@ -0,0 +1,32 @@
+import os
+import pandas as pd
+from utils.specification import load_specification
+
+def test_load_specification(tmp_path):
+    """Ensure specifications are compiled once per file version, with column-wise validators
+    """
+
+    spec = load_specification('../templates/ermin-specification.csv')
+    assert load_specification('../templates/ermin-specification.csv') is spec
+    assert spec.columns[:2] == ['original_inventory_sector', 'unfccc_annex_1_category']
+    assert spec.required['reporting_entity'] and not spec.required['end_time']
+    assert spec.defaults['emission_quantity_units'] == 'kg'
+
+    quantities = pd.Series(['1.5', 'NULL', '', None, 'ten'])
+    assert spec.validators['emission_quantity'](quantities).tolist() == [False, False, False, False, True]
+    methods = pd.Series(['100-year', 'NA', '10-year'])
+    assert spec.validators['carbon_equivalency_method'](methods).tolist() == [False, False, True]
+    assert 'original_inventory_sector' not in spec.validators # {text} is left to ERMIN
+
+    dtypes = spec.frame_dtypes()
+    assert dtypes['emission_quantity'] == 'float64' and dtypes['start_time'] == 'datetime64[ns]'
+    assert dtypes['emitted_product_formula'] == 'category'
+
+    # a changed file is compiled again
+    path = tmp_path / 'spec.csv'
+    pd.read_csv('../templates/climate-trace-specification.csv').to_csv(path, index=False)
+    os.utime(path, (0, 0))
+    first = load_specification(str(path))
+    pd.read_csv('../templates/climate-trace-specification.csv').head(3).to_csv(path, index=False)
+    assert load_specification(str(path)) is not first
+    assert load_specification(str(path)).columns == ['start_date', 'end_date', 'iso3_country']
@@ -0,0 +1,69 @@
+import threading
+import pandas as pd
+from utils.upload import UploadQueue, DONE, FAILED
+from utils.instrumentation import RunReport
+
+def test_upload_queue():
+    """Ensure blocks of a sector are uploaded in order, failures stay within their sector, and put applies backpressure
+    """
+
+    uploaded = []
+    lock = threading.Lock()
+    def upload(sector, df, first):
+        if sector == 'cement' and not first:
+            raise RuntimeError('connection lost')
+        with lock:
+            uploaded.append((sector, df['block'].iat[0], first))
+
+    report = RunReport()
+    uploads = UploadQueue(upload, workers=2, max_pending=1, report=report, stage='upload')
+    for block in range(3):
+        for sector in ['aluminum', 'cement', 'steel']:
+            uploads.put(sector, pd.DataFrame({'block': [block] * 2}))
+    status = uploads.close()
+
+    for sector in ['aluminum', 'steel']:
+        assert [(block, first) for s, block, first in uploaded if s == sector] == [(0, True), (1, False), (2, False)]
+        assert status[sector]['state'] == DONE and status[sector]['rows'] == 6 and status[sector]['pending'] == 0
+    assert status['cement']['state'] == FAILED and status['cement']['blocks'] == 1
+    assert 'connection lost' in status['cement']['error']
+    assert {(r['sector'], r['calls']) for r in report.to_list()} == {('aluminum', 3), ('cement', 2), ('steel', 3)}
+
+    # put blocks while the worker's queue is full
+    started, release = threading.Event(), threading.Event()
+    def slow_upload(sector, df, first):
+        started.set()
+        release.wait()
+    uploads = UploadQueue(slow_upload, workers=1, max_pending=1)
+    uploads.put('aluminum', pd.DataFrame())
+    started.wait() # taken by the worker
+    uploads.put('aluminum', pd.DataFrame()) # fills the queue
+    blocked = threading.Thread(target=uploads.put, args=('aluminum', pd.DataFrame()))
+    blocked.start()
+    blocked.join(timeout=0.2)
+    assert blocked.is_alive()
+    release.set()
+    blocked.join()
+    assert uploads.close()['aluminum']['blocks'] == 3
+
+
+def test_upload_queue_after():
+    """Ensure callbacks run once the sector's queued blocks are uploaded, and not for failed sectors
+    """
+
+    events = []
+    def upload(sector, df, first):
+        if sector == 'cement':
+            raise RuntimeError('connection lost')
+        events.append(('upload', sector))
+
+    uploads = UploadQueue(upload, workers=1)
+    for sector in ['aluminum', 'cement']:
+        uploads.put(sector, pd.DataFrame({'block': [0]}))
+        uploads.after(sector, lambda sector=sector: events.append(('after', sector)))
+    uploads.after('steel', lambda: events.append(('after', 'steel'))) # nothing queued
+    status = uploads.close()
+
+    assert [event for event in events if event[1] == 'aluminum'] == [('upload', 'aluminum'), ('after', 'aluminum')]
+    assert ('after', 'steel') in events and ('after', 'cement') not in events
+    assert status['cement']['state'] == FAILED and status['aluminum']['state'] == DONE
@@ -43,3 +43,102 @@ def test_check_ct_requirements():
     for error in errors:
         assert error in expected_errors
     assert len(errors) == len(expected_errors)
+
+
+def test_check_ct_requirements_order():
+    """Ensure errors of mixed kinds are listed by kind, each in row order as the table is read
+    """
+
+    df = pd.read_csv('climate-trace2-missing-data/climate-trace_aluminum-test_20220403.csv', comment='#', keep_default_na=False)
+    df['start_date'] = [datetime.isoformat(datetime.strptime(datestr, '%m/%d/%y')) for datestr in df.start_date]
+    df['end_date'] = [datetime.isoformat(datetime.strptime(datestr, '%m/%d/%y')) for datestr in df.end_date]
+
+    # AFG ends in 2020; two negative values in one ARM row, before the fixture's negative one; one unconvertible value
+    df = df[~((df['iso3_country'] == 'AFG') & df['start_date'].str.startswith('2021'))].reset_index(drop=True)
+    arm_2015 = (df['iso3_country'] == 'ARM') & df['start_date'].str.startswith('2015')
+    df.loc[arm_2015, 'CO2_emissions_tonnes'] = -5
+    df.loc[arm_2015, 'total_CO2e_20yrGWP'] = -7
+    df.loc[(df['iso3_country'] == 'ARM') & df['start_date'].str.startswith('2016'), 'CH4_emissions_tonnes'] = 'abc'
+
+    warnings, errors = eev.check_ct_requirements(df, sector = 'aluminum')
+
+    assert list(warnings) == []
+    assert list(errors) == [
+        'Error: Data for country ABW starts on 2016-01-01, requirement is on or before 2015-01-01',
+        'Error: Data for country AFG ends on 2020-12-31, requirement is on or after 2021-12-31',
+        'Error: Entry spans more than one year: 2017-01-01T00:00:00\t2018-12-31T00:00:00\tAFG',
+        'Error: country AGO missing from input table.',
+        'Error: Negative CO2_emissions_tonnes emissions -5.0 reported in 2015 for country ARM',
+        'Error: Negative total_CO2e_20yrGWP emissions -7.0 reported in 2015 for country ARM',
+        'Error: Negative total_CO2e_100yrGWP emissions -1000000.0 reported in 2017 for country ARM',
+        'Could not check >=0 status of CH4_emissions_tonnes value abc reported in 2016 for country country because could not convert to float.']
+
+
+def test_ct_requirements_accumulator():
+    """Ensure checking CT requirements block by block matches checking the whole table
+    """
+
+    df = pd.read_csv('climate-trace2-missing-data/climate-trace_aluminum-test_20220403.csv', comment='#', keep_default_na=False)
+    df['start_date'] = [datetime.isoformat(datetime.strptime(datestr, '%m/%d/%y')) for datestr in df.start_date]
+    df['end_date'] = [datetime.isoformat(datetime.strptime(datestr, '%m/%d/%y')) for datestr in df.end_date]
+
+    for block_rows in [7, 100, len(df)]:
+        accumulator = eev.CTRequirementsAccumulator('aluminum')
+        for start in range(0, len(df), block_rows):
+            accumulator.update(df.iloc[start:start + block_rows])
+        assert accumulator.finalize() == eev.check_ct_requirements(df, sector = 'aluminum')
+
+
+def test_check_ermin_partitioned(monkeypatch):
+    """Ensure partitions are checked and repaired separately, constant columns once, and reassembled in order
+    """
+
+    calls = []
+    def check_input_dataframe(df, spec_file=None, repair=False):
+        # stand-in for the ERMIN validator: missing data_version is added, negative quantities flagged
+        calls.append((len(df), sorted(df.columns)))
+        errors = ['Missing this required column: "' + column + '".' for column in ['data_version', 'reporting_entity']
+                  if column not in df]
+        if 'emission_quantity' in df:
+            errors += ['Negative value ' + str(value) for value in df['emission_quantity'] if value < 0]
+        newdf = df.copy()
+        if 'data_version' not in newdf:
+            newdf['data_version'] = float('nan')
+        return [], errors, newdf
+    monkeypatch.setattr(eev.ev, 'check_input_dataframe', check_input_dataframe)
+
+    df = pd.DataFrame({'producing_entity_id': pd.Categorical(['ABW', 'AFG', 'AGO', 'ALB', 'AND']),
+                       'emission_quantity': [1.0, -2.0, 3.0, 4.0, -5.0],
+                       'reporting_entity': pd.Categorical(['climate-trace'] * 5)})
+    warnings, errors, newdf = eev.check_ermin_partitioned(df, spec_file='../templates/ermin-specification.csv',
+                                                          repair=True, partition_rows=2)
+
+    assert eev.constant_columns(df) == ['reporting_entity']
+    assert calls[0] == (1, ['reporting_entity']) # constant columns, once
+    assert [rows for rows, _ in calls[1:]] == [2, 2, 1] # partitions, without the constant columns
+    assert errors == ['Missing this required column: "data_version".', 'Negative value -2.0', 'Negative value -5.0']
+    assert newdf['producing_entity_id'].tolist() == ['ABW', 'AFG', 'AGO', 'ALB', 'AND']
+    assert newdf['reporting_entity'].tolist() == ['climate-trace'] * 5
+    assert newdf['reporting_entity'].dtype == 'category'
+    assert len(newdf.columns) == 4 and newdf['data_version'].isna().all()
+
+
+def test_check_ermin_partitioned_rows(monkeypatch):
+    """Ensure row numbers in messages about a partition name the rows of the whole frame
+    """
+
+    def check_input_dataframe(df, spec_file=None, repair=False):
+        errors = ['Negative emission_quantity in row ' + str(i) for i in range(len(df))
+                  if 'emission_quantity' in df and df['emission_quantity'].iat[i] < 0]
+        return [], errors, df.copy()
+    monkeypatch.setattr(eev.ev, 'check_input_dataframe', check_input_dataframe)
+
+    df = pd.DataFrame({'emitted_product_formula': pd.Categorical(['CO2', 'CH4', 'CO2', 'CH4', 'CO2']),
+                       'emission_quantity': [1.0, -2.0, 3.0, 4.0, -5.0],
+                       'reporting_entity': pd.Categorical(['climate-trace'] * 5)}, index=[10, 11, 12, 13, 14])
+    spec_file = '../templates/ermin-specification.csv'
+
+    warnings, errors = eev.check_ermin_partitioned(df, spec_file=spec_file, partition_by=['emitted_product_formula'])
+    assert errors == ['Negative emission_quantity in row 14', 'Negative emission_quantity in row 11']
+    warnings, errors = eev.check_ermin_partitioned(df, spec_file=spec_file, partition_rows=2)
+    assert errors == ['Negative emission_quantity in row 11', 'Negative emission_quantity in row 14']
@@ -0,0 +1,31 @@
+import pandas as pd
+from utils.versions import VersionRegistry, record_version
+
+def test_version_registry(tmp_path):
+    """Ensure versions are bumped only for newer drops and written once on flush
+    """
+
+    for path in [tmp_path / 'versioning.csv', tmp_path / 'versioning.sqlite']:
+        registry = VersionRegistry(str(path))
+        assert registry.record_many([('climate-trace', 'aluminum', '20220403'),
+                                     ('climate-trace', 'cement', '20220403')]) == [0.0, 0.0]
+        assert not path.exists() # nothing written before flush
+        registry.flush()
+
+        # reloaded registry sees the recorded versions
+        registry = VersionRegistry(str(path))
+        assert registry.record('climate-trace', 'aluminum', '20220403') == 0.0 # same drop
+        assert registry.record('climate-trace', 'aluminum', '20220301') == 0.0 # older drop
+        versions = [registry.record('climate-trace', 'aluminum', date) for date in ['20220501', '20220601', '20220701']]
+        assert versions == [0.1, 0.2, 0.3]
+        registry.flush()
+
+        assert VersionRegistry(str(path)).latest('climate-trace', 'aluminum')[1] == 0.3
+        assert len(VersionRegistry(str(path)).history) == 5
+
+    # record_version writes to the path it is given
+    csv_path = tmp_path / 'versioning.csv'
+    assert record_version('climate-trace', 'cement', '20220801', str(csv_path)) == 0.1
+    written = pd.read_csv(csv_path)
+    assert written['date'].iloc[-1] == '2022-08-01 00:00:00'
+    assert written['date'].iloc[0] == '2022-04-03 00:00:00'
@@ -0,0 +1,63 @@
+import os
+import pandas as pd
+import pyarrow as pa
+from utils.specification import load_specification
+
+# Cleaned ERMIN rows as Arrow tables in specification column order and final
+# types, converted once per sector (or block) and then shared, without further
+# copies, by the DB writer (utils.database) and the file dumpers (utils.staging).
+
+ERMIN_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates', 'ermin-specification.csv')
+
+# Arrow type for each dtype of the compact frame schema (see Specification.frame_dtypes);
+# timestamps are stored to the microsecond, like the database
+ARROW_TYPES = {'float64': pa.float64(),
+               'datetime64[ns]': pa.timestamp('us'),
+               'category': pa.dictionary(pa.int32(), pa.string())}
+
+_schemas = {} # by specification path
+
+
+def ermin_schema(spec_path=ERMIN_SPEC_PATH):
+    """Arrow schema of the ERMIN table: all specification columns, in order"""
+    if spec_path not in _schemas:
+        dtypes = load_specification(spec_path).frame_dtypes()
+        _schemas[spec_path] = pa.schema([(column, ARROW_TYPES[dtype]) for column, dtype in dtypes.items()])
+    return _schemas[spec_path]
+
+
+def ermin_table(df, spec_path=ERMIN_SPEC_PATH):
+    """clean ERMIN rows (e.g. from climate_trace.main) as an Arrow table with the ERMIN schema
+
+    Columns missing from df are all null; extra columns are dropped. Categoricals
+    keep their codes, float and datetime columns are converted without parsing.
+    Timestamp columns still holding text (not in the compact schema) are parsed.
+    A table that already has the schema is returned as it is.
+    """
+    schema = ermin_schema(spec_path)
+    if isinstance(df, pa.Table):
+        if df.schema.equals(schema):
+            return df
+        df = df.to_pandas()
+    arrays = []
+    for field in schema:
+        if field.name in df:
+            arrays.append(_to_arrow(df[field.name], field.type))
+        else:
+            arrays.append(pa.nulls(len(df), field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _to_arrow(column, arrow_type):
+    if pa.types.is_timestamp(arrow_type) and not pd.api.types.is_datetime64_any_dtype(column):
+        column = pd.to_datetime(column)
+    if pa.types.is_dictionary(arrow_type) and not isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype('category')
+    array = pa.Array.from_pandas(column)
+    if array.type == arrow_type:
+        return array
+    try:
+        return array.cast(arrow_type, safe=False)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # e.g. categories that are not text
+        return pa.Array.from_pandas(column.astype('string')).cast(arrow_type)
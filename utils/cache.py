@@ -0,0 +1,91 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+# Bump when a code change alters validation results or the reshaped output,
+# so that entries written by older code are no longer hit.
+CACHE_VERSION = '3'
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+class SectorCache:
+    """On-disk cache of per-sector pipeline results keyed by input content
+
+    Entries are keyed by a hash of the sector's input file, the sector name and
+    every dependency file (e.g. CT spec, ERMIN spec, fill-values table), so any
+    change to one of them is a miss. Each entry is one pickle file; reading an
+    entry refreshes its mtime, and the least recently used entries are evicted
+    once the cache grows beyond max_bytes.
+
+    Parameters:
+    cache_dir (str): directory holding cache entries
+    dependency_paths (list): files whose content every entry depends on (None entries are skipped)
+    max_bytes (int): size bound for all entries together
+    """
+
+    def __init__(self, cache_dir, dependency_paths=(), max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        dependencies = hashlib.sha256(CACHE_VERSION.encode())
+        for path in dependency_paths:
+            if path is not None:
+                _update_with_file(dependencies, path)
+        self._dependency_digest = dependencies.digest()
+
+    def key(self, path, sector, extra=None):
+        """hash of the input file content, the sector name and all dependencies
+
+        extra is anything else the result depends on, e.g. the sector's fill values;
+        it is hashed by its repr."""
+        digest = hashlib.sha256(self._dependency_digest)
+        digest.update(sector.encode())
+        if extra is not None:
+            digest.update(repr(extra).encode())
+        _update_with_file(digest, path)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """return the cached result for key, or None on a miss"""
+        entry = self._entry_path(key)
+        try:
+            with open(entry, 'rb') as f:
+                result = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(entry) # mark as recently used
+        return result
+
+    def put(self, key, result):
+        """store result under key, then evict least recently used entries over max_bytes"""
+        # write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._entry_path(key))
+        self._evict()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.pkl')
+
+    def _evict(self):
+        entries = []
+        for file in os.listdir(self.cache_dir):
+            if file.endswith('.pkl'):
+                stat = os.stat(os.path.join(self.cache_dir, file))
+                entries.append((stat.st_mtime, stat.st_size, file))
+        total = sum(size for _, size, _ in entries)
+        for _, size, file in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, file))
+            total -= size
+
+
+def _update_with_file(digest, path, block_size=1024 * 1024):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
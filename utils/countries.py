@@ -0,0 +1,353 @@
+# Climate TRACE country codes and names, and vectorized lookups on them
+import pandas as pd
+import numpy as np
+import os
+from functools import lru_cache
+from utils import dimensions
+from utils.specification import register_validator
+
+ISO_CODES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates', 'ISO_codes.csv')
+
+COUNTRIES_DICT = {
+    "SCG": "deleted",
+    "ANT": "deleted",
+    "ABW": "Aruba",
+    "AFG": "Afghanistan",
+    "AGO": "Angola",
+    "AIA": "Anguilla",
+    "ALA": "Åland Islands",
+    "ALB": "Albania",
+    "AND": "Andorra",
+    "ARE": "United Arab Emirates",
+    "ARG": "Argentina",
+    "ARM": "Armenia",
+    "ASM": "American Samoa",
+    "ATA": "Antarctica",
+    "ATF": "French Southern Territories",
+    "ATG": "Antigua and Barbuda",
+    "AUS": "Australia",
+    "AUT": "Austria",
+    "AZE": "Azerbaijan",
+    "BDI": "Burundi",
+    "BEL": "Belgium",
+    "BEN": "Benin",
+    "BES": "Bonaire, Sint Eustatius and Saba",
+    "BFA": "Burkina Faso",
+    "BGD": "Bangladesh",
+    "BGR": "Bulgaria",
+    "BHR": "Bahrain",
+    "BHS": "Bahamas",
+    "BIH": "Bosnia and Herzegovina",
+    "BLM": "Saint Barthélemy",
+    "BLR": "Belarus",
+    "BLZ": "Belize",
+    "BMU": "Bermuda",
+    "BOL": "Bolivia (Plurinational State of)",
+    "BRA": "Brazil",
+    "BRB": "Barbados",
+    "BRN": "Brunei Darussalam",
+    "BTN": "Bhutan",
+    "BVT": "Bouvet Island",
+    "BWA": "Botswana",
+    "CAF": "Central African Republic",
+    "CAN": "Canada",
+    "CCK": "Cocos (Keeling) Islands",
+    "CHE": "Switzerland",
+    "CHL": "Chile",
+    "CHN": "China",
+    "CIV": "Côte d'Ivoire",
+    "CMR": "Cameroon",
+    "COD": "Democratic Republic of the Congo",
+    "COG": "Congo",
+    "COK": "Cook Islands",
+    "COL": "Colombia",
+    "COM": "Comoros",
+    "CPV": "Cabo Verde",
+    "CRI": "Costa Rica",
+    "CUB": "Cuba",
+    "CUW": "Curaçao",
+    "CXR": "Christmas Island",
+    "CYM": "Cayman Islands",
+    "CYP": "Cyprus",
+    "CZE": "Czechia",
+    "DEU": "Germany",
+    "DJI": "Djibouti",
+    "DMA": "Dominica",
+    "DNK": "Denmark",
+    "DOM": "Dominican Republic",
+    "DZA": "Algeria",
+    "ECU": "Ecuador",
+    "EGY": "Egypt",
+    "ERI": "Eritrea",
+    "ESH": "Western Sahara",
+    "ESP": "Spain",
+    "EST": "Estonia",
+    "ETH": "Ethiopia",
+    "FIN": "Finland",
+    "FJI": "Fiji",
+    "FLK": "Falkland Islands (Malvinas)",
+    "FRA": "France",
+    "FRO": "Faroe Islands",
+    "FSM": "Micronesia (Federated States of)",
+    "GAB": "Gabon",
+    "GBR": "United Kingdom of Great Britain and Northern Ireland",
+    "GEO": "Georgia",
+    "GGY": "Guernsey",
+    "GHA": "Ghana",
+    "GIB": "Gibraltar",
+    "GIN": "Guinea",
+    "GLP": "Guadeloupe",
+    "GMB": "Gambia",
+    "GNB": "Guinea-Bissau",
+    "GNQ": "Equatorial Guinea",
+    "GRC": "Greece",
+    "GRD": "Grenada",
+    "GRL": "Greenland",
+    "GTM": "Guatemala",
+    "GUF": "French Guiana",
+    "GUM": "Guam",
+    "GUY": "Guyana",
+    "HKG": "China, Hong Kong Special Administrative Region",
+    "HMD": "Heard Island and McDonald Islands",
+    "HND": "Honduras",
+    "HRV": "Croatia",
+    "HTI": "Haiti",
+    "HUN": "Hungary",
+    "IDN": "Indonesia",
+    "IMN": "Isle of Man",
+    "IND": "India",
+    "IOT": "British Indian Ocean Territory",
+    "IRL": "Ireland",
+    "IRN": "Iran (Islamic Republic of)",
+    "IRQ": "Iraq",
+    "ISL": "Iceland",
+    "ISR": "Israel",
+    "ITA": "Italy",
+    "JAM": "Jamaica",
+    "JEY": "Jersey",
+    "JOR": "Jordan",
+    "JPN": "Japan",
+    "KAZ": "Kazakhstan",
+    "KEN": "Kenya",
+    "KGZ": "Kyrgyzstan",
+    "KHM": "Cambodia",
+    "KIR": "Kiribati",
+    "KNA": "Saint Kitts and Nevis",
+    "KOR": "Republic of Korea",
+    "XKX": "Kosovo",
+    "KWT": "Kuwait",
+    "LAO": "Lao People's Democratic Republic",
+    "LBN": "Lebanon",
+    "LBR": "Liberia",
+    "LBY": "Libya",
+    "LCA": "Saint Lucia",
+    "LIE": "Liechtenstein",
+    "LKA": "Sri Lanka",
+    "LSO": "Lesotho",
+    "LTU": "Lithuania",
+    "LUX": "Luxembourg",
+    "LVA": "Latvia",
+    "MAC": "China, Macao Special Administrative Region",
+    "MAF": "Saint Martin (French Part)",
+    "MAR": "Morocco",
+    "MCO": "Monaco",
+    "MDA": "Republic of Moldova",
+    "MDG": "Madagascar",
+    "MDV": "Maldives",
+    "MEX": "Mexico",
+    "MHL": "Marshall Islands",
+    "MKD": "The former Yugoslav Republic of Macedonia",
+    "MLI": "Mali",
+    "MLT": "Malta",
+    "MMR": "Myanmar",
+    "MNE": "Montenegro",
+    "MNG": "Mongolia",
+    "MNP": "Northern Mariana Islands",
+    "MOZ": "Mozambique",
+    "MRT": "Mauritania",
+    "MSR": "Montserrat",
+    "MTQ": "Martinique",
+    "MUS": "Mauritius",
+    "MWI": "Malawi",
+    "MYS": "Malaysia",
+    "MYT": "Mayotte",
+    "NAM": "Namibia",
+    "NCL": "New Caledonia",
+    "NER": "Niger",
+    "NFK": "Norfolk Island",
+    "NGA": "Nigeria",
+    "NIC": "Nicaragua",
+    "NIU": "Niue",
+    "NLD": "Netherlands",
+    "NOR": "Norway",
+    "NPL": "Nepal",
+    "NRU": "Nauru",
+    "NZL": "New Zealand",
+    "OMN": "Oman",
+    "PAK": "Pakistan",
+    "PAN": "Panama",
+    "PCN": "Pitcairn",
+    "PER": "Peru",
+    "PHL": "Philippines",
+    "PLW": "Palau",
+    "PNG": "Papua New Guinea",
+    "POL": "Poland",
+    "PRI": "Puerto Rico",
+    "PRK": "Democratic People's Republic of Korea",
+    "PRT": "Portugal",
+    "PRY": "Paraguay",
+    "PSE": "State of Palestine",
+    "PYF": "French Polynesia",
+    "QAT": "Qatar",
+    "REU": "Réunion",
+    "ROU": "Romania",
+    "RUS": "Russian Federation",
+    "RWA": "Rwanda",
+    "SAU": "Saudi Arabia",
+    "SDN": "Sudan",
+    "SEN": "Senegal",
+    "SGP": "Singapore",
+    "SGS": "South Georgia and the South Sandwich Islands",
+    "SHN": "Saint Helena",
+    "SJM": "Svalbard and Jan Mayen Islands",
+    "SLB": "Solomon Islands",
+    "SLE": "Sierra Leone",
+    "SLV": "El Salvador",
+    "SMR": "San Marino",
+    "SOM": "Somalia",
+    "SPM": "Saint Pierre and Miquelon",
+    "SRB": "Serbia",
+    "SSD": "South Sudan",
+    "STP": "Sao Tome and Principe",
+    "SUR": "Suriname",
+    "SVK": "Slovakia",
+    "SVN": "Slovenia",
+    "SWE": "Sweden",
+    "SWZ": "Eswatini",
+    "SXM": "Sint Maarten (Dutch part)",
+    "SYC": "Seychelles",
+    "SYR": "Syrian Arab Republic",
+    "TCA": "Turks and Caicos Islands",
+    "TCD": "Chad",
+    "TGO": "Togo",
+    "THA": "Thailand",
+    "TJK": "Tajikistan",
+    "TKL": "Tokelau",
+    "TKM": "Turkmenistan",
+    "TLS": "Timor-Leste",
+    "TON": "Tonga",
+    "TTO": "Trinidad and Tobago",
+    "TUN": "Tunisia",
+    "TUR": "Turkey",
+    "TUV": "Tuvalu",
+    "TWN": "Taiwan",
+    "TZA": "United Republic of Tanzania",
+    "UGA": "Uganda",
+    "UKR": "Ukraine",
+    "UMI": "United States Minor Outlying Islands",
+    "URY": "Uruguay",
+    "USA": "United States of America",
+    "UZB": "Uzbekistan",
+    "VAT": "Holy See",
+    "VCT": "Saint Vincent and the Grenadines",
+    "VEN": "Venezuela (Bolivarian Republic of)",
+    "VGB": "British Virgin Islands",
+    "VIR": "United States Virgin Islands",
+    "VNM": "Viet Nam",
+    "VUT": "Vanuatu",
+    "WLF": "Wallis and Futuna Islands",
+    "WSM": "Samoa",
+    "YEM": "Yemen",
+    "ZAF": "South Africa",
+    "ZMB": "Zambia",
+    "ZWE": "Zimbabwe",
+}
+
+
+def build_country_table():
+    """the country dimension table: a record array with one row for every code in COUNTRIES_DICT
+    (the codes Climate TRACE accepts), in order, giving its iso3 code and name and, where
+    templates/ISO_codes.csv lists it, its ISO short name, alpha2 and numeric codes
+    ('' and -1 where it does not)"""
+    iso_codes = pd.read_csv(ISO_CODES_PATH, encoding='utf-8-sig', keep_default_na=False, dtype=str)
+    iso_codes = iso_codes.set_index('Alpha-3 code').reindex(list(COUNTRIES_DICT.keys())).fillna('')
+    numeric = pd.to_numeric(iso_codes['Numeric'].replace('', '-1'))
+    return np.rec.fromarrays([np.array(list(COUNTRIES_DICT.keys())),
+                              np.array(list(COUNTRIES_DICT.values())),
+                              iso_codes['English short name'].to_numpy(dtype=str),
+                              iso_codes['Alpha-2 code'].to_numpy(dtype=str),
+                              numeric.to_numpy(dtype=np.int32)],
+                             names=['iso3', 'name', 'iso_name', 'alpha2', 'numeric'])
+
+
+@lru_cache(maxsize=None)
+def country_registry():
+    """return the country registry, built once per process
+
+    A DataFrame indexed by iso3 code, from the country dimension table (see
+    build_country_table), with missing values where ISO codes are not listed.
+    For lookups by hand; country_codes and country_names use the table itself.
+    """
+    countries = dimensions.table('countries')
+    registry = pd.DataFrame({'name': countries['name'].astype(object)},
+                            index=pd.Index(countries['iso3'].astype(object), name='iso3'))
+    for column in ['iso_name', 'alpha2']:
+        registry[column] = pd.Series(countries[column].astype(object), index=registry.index).replace('', np.nan)
+    registry['numeric'] = pd.array(np.where(countries['numeric'] < 0, None, countries['numeric']), dtype='Int64')
+    return registry
+
+
+@lru_cache(maxsize=None)
+def _sorted_iso3():
+    """table positions of the iso3 codes in sorted order, and the sorted codes, for searchsorted"""
+    iso3 = dimensions.table('countries')['iso3']
+    order = np.argsort(iso3, kind='stable')
+    return order, iso3[order]
+
+
+def country_codes(column):
+    """return the position in the country table (see build_country_table) of each value in column
+
+    Values that are not valid iso3 codes (including missing values) get -1. Distinct
+    values are looked up once, by binary search in the table's fixed-width codes
+    (attached, not copied, in pool workers).
+    """
+    if not hasattr(column, 'dtype'): # e.g. a list
+        column = np.asarray(column, dtype=object)
+    codes, uniques = pd.factorize(column)
+    order, iso3 = _sorted_iso3()
+    uniques = np.asarray(uniques, dtype=str)
+    found = np.minimum(np.searchsorted(iso3, uniques), len(iso3) - 1)
+    positions = np.where(iso3[found] == uniques, order[found], -1)
+    # code -1 (missing value) picks the trailing -1
+    return np.append(positions, -1)[codes]
+
+
+def invalid_country_codes(column):
+    """bool array marking values of column that are not valid iso3 codes"""
+    return country_codes(column) == -1
+
+
+def country_names(column):
+    """return the country name for each iso3 code in column, as a Series aligned with it
+
+    Codes that are not in the registry get a missing name. A categorical column
+    gives a categorical result, looked up once per category.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        name_codes, names = pd.factorize(country_names(pd.Series(column.cat.categories)))
+        # code -1 (missing id) picks the trailing -1 (missing name)
+        name_codes = np.append(name_codes, -1)
+        return pd.Series(pd.Categorical.from_codes(name_codes[column.cat.codes.to_numpy()], categories=names),
+                         index=column.index)
+    names = np.append(dimensions.table('countries')['name'].astype(object), np.nan)
+    # position -1 picks the trailing nan
+    return pd.Series(names[country_codes(column)], index=column.index, dtype=object)
+
+
+dimensions.register_table('countries', build_country_table)
+dimensions.on_attach(country_registry.cache_clear)
+dimensions.on_attach(_sorted_iso3.cache_clear)
+
+# lets specifications validate {iso3_country} columns column-wise
+register_validator('{iso3_country}', invalid_country_codes)
@@ -1,8 +1,15 @@
 import psycopg2
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy import types
 import pandas as pd
 from geoalchemy2 import types as gtypes
+import io
+import os
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+from utils.specification import load_specification
+from utils.arrow import ermin_table
 
 gtypes.Geometry
 
@@ -13,6 +20,27 @@ CONN_INFO = {
     'DB_HOST':  'rds-climate-trace.watttime.org'
 }
 
+ERMIN_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates', 'ermin-specification.csv')
+
+TIMESTAMP_COLUMNS = ['reporting_timestamp', 'start_time', 'end_time']
+
+# columns identifying one emissions value, used to merge re-uploaded sectors
+ERMIN_NATURAL_KEY = ['reporting_entity', 'original_inventory_sector', 'producing_entity_id',
+                     'emitted_product_formula', 'carbon_equivalency_method', 'start_time', 'end_time']
+
+# an existing row is only rewritten when one of these changed
+ERMIN_CHANGE_COLUMNS = ['emission_quantity', 'data_version']
+
+# stand-ins for nulls in natural key columns, so that keys are compared with =, which
+# can use the natural key index and hash joins (IS NOT DISTINCT FROM can use neither)
+KEY_NULL = "'<null>'"
+KEY_NULL_TIMESTAMP = "'-infinity'"
+
+# rows per COPY block; bounds the size of the CSV buffer held in memory
+COPY_BLOCK_ROWS = 100000
+
+_engines = {} # one pooled engine per connection URL for the whole run
+
 
 def connect(CONN_INFO):
     '''Connect to database with info specified in connection info.
@@ -31,20 +59,228 @@ def connect(CONN_INFO):
     return engine
 
 
-def insert_clean_data(df):
-    if len(df.columns) != 38:
-        ermin_spec = pd.read_csv('../templates/ermin-specification.csv')
-        columns = ermin_spec['Structured name']
-        empty_ermin_df = pd.DataFrame(columns=columns)
-        empty_ermin_df[df.columns] = df
+def get_engine(conn_info=CONN_INFO, url=None):
+    '''Return a pooled engine, creating it on first use.
+
+    Pass url (e.g. "sqlite://") to use another database, such as a local stand-in.
+    Subsequent calls with the same connection info reuse the same engine.'''
+
+    key = url if url is not None else tuple(sorted(conn_info.items()))
+    if key not in _engines:
+        _engines[key] = create_engine(url) if url is not None else connect(conn_info)
+    return _engines[key]
+
+
+def pad_to_ermin_columns(df, spec_path=ERMIN_SPEC_PATH):
+    '''Return df with exactly the ERMIN columns, in specification order.
+
+    Missing columns are added as nulls and timestamp columns are parsed.'''
+
+    ermin_df = df.reindex(columns=load_specification(spec_path).columns)
+
+    for column in TIMESTAMP_COLUMNS:
+        ermin_df[column] = pd.to_datetime(ermin_df[column])
+
+    return ermin_df
+
+
+def insert_clean_data(df, engine=None):
+    ermin_df = ermin_table(df).to_pandas()
+
+    if engine is None:
+        engine = get_engine()
+
+    with engine.begin() as connection:
+        ermin_df.to_sql('ermin',
+                  connection,
+                  if_exists='append',
+                  index=False)
+
+
+def copy_clean_data(df, engine=None, table='ermin'):
+    '''Bulk load one sector into the ERMIN table in a single transaction.
+
+    On PostgreSQL rows are streamed through COPY FROM STDIN in CSV blocks of
+    COPY_BLOCK_ROWS rows. Other databases (e.g. a SQLite stand-in) fall back to
+    batched INSERTs. Either way the sector is loaded completely or not at all.
+
+    Parameters:
+    df (DataFrame or pyarrow.Table): cleaned ERMIN data for one sector; a table
+                                     from utils.arrow.ermin_table is used as it is
+    engine (Engine): database engine, defaults to the shared engine from get_engine()
+    table (str): name of the target table
+
+    Returns:
+    rows (int): number of rows loaded
+    '''
+    ermin_rows = ermin_table(df)
+
+    if engine is None:
+        engine = get_engine()
+
+    with engine.begin() as connection:
+        _ensure_table(connection, ermin_rows, table)
+        _load_frame(connection, ermin_rows, table)
+
+    return ermin_rows.num_rows
+
+
+def upsert_clean_data(df, engine=None, table='ermin'):
+    '''Merge one sector into the ERMIN table, writing only new or changed rows.
+
+    Rows are bulk loaded into a temporary staging table and merged on the ERMIN
+    natural key (ERMIN_NATURAL_KEY). Existing rows are updated only when
+    emission_quantity or data_version differs; rows with a new key are inserted;
+    unchanged rows are not written. Of rows of df sharing a key, the last one
+    is merged. The whole merge is one transaction.
+
+    Parameters:
+    df (DataFrame or pyarrow.Table): cleaned ERMIN data for one sector; a table
+                                     from utils.arrow.ermin_table is used as it is
+    engine (Engine): database engine, defaults to the shared engine from get_engine()
+    table (str): name of the target table
+
+    Returns:
+    inserted (int): number of new rows
+    updated (int): number of existing rows whose quantity or version changed
+    '''
+    ermin_rows = _last_per_key(ermin_table(df))
+
+    if engine is None:
+        engine = get_engine()
+
+    stage = table + '_stage'
+    with engine.begin() as connection:
+        if _ensure_table(connection, ermin_rows, table):
+            # nothing to merge with yet
+            _load_frame(connection, ermin_rows, table)
+            _create_key_index(connection, table)
+            return ermin_rows.num_rows, 0
+        _create_key_index(connection, table)
+
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text(f'CREATE TEMP TABLE {stage} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP'))
+            different = 'IS DISTINCT FROM'
+        else:
+            connection.execute(text(f'CREATE TEMP TABLE {stage} AS SELECT * FROM {table} WHERE 0'))
+            different = 'IS NOT'
+        _load_frame(connection, ermin_rows, stage)
+
+        columns = ['"' + column + '"' for column in ermin_rows.column_names]
+        key_match = _key_match('t', 's')
+        changed = ' OR '.join(f't."{column}" {different} s."{column}"' for column in ERMIN_CHANGE_COLUMNS)
+
+        updated = connection.execute(text(
+            f'UPDATE {table} AS t SET ' + ', '.join(f'{column} = s.{column}' for column in columns) +
+            f' FROM {stage} AS s WHERE {key_match} AND ({changed})')).rowcount
+        inserted = connection.execute(text(
+            f'INSERT INTO {table} ({", ".join(columns)}) SELECT {", ".join("s." + column for column in columns)}'
+            f' FROM {stage} AS s WHERE NOT EXISTS (SELECT 1 FROM {table} AS t WHERE {key_match})')).rowcount
+
+        if connection.dialect.name != 'postgresql':
+            connection.execute(text(f'DROP TABLE {stage}'))
+
+    return inserted, updated
+
+
+def delete_clean_data(keys, engine=None, table='ermin'):
+    '''Delete the rows of the ERMIN table with the given natural keys.
+
+    Used for rows that are missing from the latest drop of a sector (see
+    utils.delta). Keys are bulk loaded into a temporary staging table and matched
+    on ERMIN_NATURAL_KEY, in one transaction.
+
+    Parameters:
+    keys (DataFrame): ERMIN_NATURAL_KEY columns of the rows to delete
+    engine (Engine): database engine, defaults to the shared engine from get_engine()
+    table (str): name of the target table
+
+    Returns:
+    deleted (int): number of rows deleted
+    '''
+    if len(keys) == 0:
+        return 0
+    ermin_rows = ermin_table(keys)
+
+    if engine is None:
+        engine = get_engine()
+
+    stage = table + '_stage'
+    with engine.begin() as connection:
+        if not inspect(connection).has_table(table):
+            return 0
+
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text(f'CREATE TEMP TABLE {stage} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP'))
+        else:
+            connection.execute(text(f'CREATE TEMP TABLE {stage} AS SELECT * FROM {table} WHERE 0'))
+        _load_frame(connection, ermin_rows, stage)
+
+        key_match = _key_match('t', 's')
+        deleted = connection.execute(text(
+            f'DELETE FROM {table} AS t WHERE EXISTS (SELECT 1 FROM {stage} AS s WHERE {key_match})')).rowcount
+
+        if connection.dialect.name != 'postgresql':
+            connection.execute(text(f'DROP TABLE {stage}'))
+
+    return deleted
+
+
+def _key(alias=None):
+    '''The ERMIN_NATURAL_KEY columns of table alias as SQL expressions, with nulls replaced by KEY_NULL.'''
+    prefix = '' if alias is None else alias + '.'
+    return [f'COALESCE({prefix}"{column}", {KEY_NULL_TIMESTAMP if column in TIMESTAMP_COLUMNS else KEY_NULL})'
+            for column in ERMIN_NATURAL_KEY]
+
+
+def _key_match(target, stage):
+    '''SQL condition matching rows of target and stage (table aliases) with the same natural key.'''
+    return ' AND '.join(f'{t} = {s}' for t, s in zip(_key(target), _key(stage)))
+
+
+def _create_key_index(connection, table):
+    '''Index table on the natural key expressions of _key, for merges and deletes, if not done yet.'''
+    connection.execute(text(f'CREATE INDEX IF NOT EXISTS {table}_natural_key ON {table} ({", ".join(_key())})'))
+
+
+def _last_per_key(ermin_rows):
+    '''The last row of each natural key of an ERMIN Arrow table, in their original order.'''
+    row_numbers = pa.array(range(ermin_rows.num_rows), type=pa.int64())
+    last = ermin_rows.select(ERMIN_NATURAL_KEY).append_column('row', row_numbers) \
+        .group_by(ERMIN_NATURAL_KEY).aggregate([('row', 'max')])['row_max']
+    if len(last) == ermin_rows.num_rows:
+        return ermin_rows
+    return ermin_rows.take(last.take(pc.sort_indices(last)))
+
+
+def _ensure_table(connection, ermin_rows, table):
+    '''Create table with the columns of ermin_rows if it does not exist yet, as COPY needs it to.
 
-    empty_ermin_df['reporting_timestamp'] = pd.to_datetime(empty_ermin_df['reporting_timestamp'])
-    empty_ermin_df['start_time'] = pd.to_datetime(empty_ermin_df['start_time'])
-    empty_ermin_df['end_time'] = pd.to_datetime(empty_ermin_df['end_time'])
+    Returns:
+    created (bool): whether table was created
+    '''
+    if inspect(connection).has_table(table):
+        return False
+    ermin_rows.slice(0, 0).to_pandas().to_sql(table, connection, index=False)
+    return True
 
-    engine = connect(CONN_INFO)
 
-    empty_ermin_df.to_sql('ermin',
-              engine,
-              if_exists='append',
-              index=False)
+def _load_frame(connection, ermin_rows, table):
+    '''Bulk load an ERMIN Arrow table (see utils.arrow) into table within the caller's transaction.'''
+    if connection.dialect.name == 'postgresql':
+        column_list = ', '.join('"' + column + '"' for column in ermin_rows.column_names)
+        copy_sql = f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT csv)"
+        # values are quoted and nulls left empty, so that empty strings stay empty strings
+        options = pacsv.WriteOptions(include_header=False, quoting_style='all_valid')
+        cursor = connection.connection.cursor()
+        for batch in ermin_rows.to_batches(max_chunksize=COPY_BLOCK_ROWS):
+            buffer = io.BytesIO()
+            pacsv.write_csv(batch, buffer, options)
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+    else:
+        ermin_rows.to_pandas().to_sql(table,
+                                      connection,
+                                      if_exists='append',
+                                      index=False,
+                                      chunksize=COPY_BLOCK_ROWS)
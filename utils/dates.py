@@ -0,0 +1,70 @@
+# Date normalization shared by the inventory scripts
+#
+# Inputs hold a handful of distinct dates repeated over many rows, so each
+# distinct value is parsed once and the result is broadcast back to the rows.
+import pandas as pd
+import numpy as np
+from datetime import datetime
+
+ISO_FORMAT = 'iso' # anything datetime.fromisoformat accepts, e.g. 2015-01-01 or 2015-01-01T00:00:00
+
+# formats tried by detect_format, in order
+DATE_FORMATS = [ISO_FORMAT, '%m/%d/%y', '%m/%d/%Y', '%Y']
+
+
+def detect_format(column, sample_size=100):
+    """return the first of DATE_FORMATS that parses the distinct values among the
+    first sample_size non-missing values of column, or None if none does"""
+    sample = pd.unique(column.dropna().head(sample_size))
+    for date_format in DATE_FORMATS:
+        try:
+            for value in sample:
+                _parse(value, date_format)
+        except (TypeError, ValueError):
+            continue
+        return date_format
+    return None
+
+
+def parse_dates(column, date_format=None):
+    """parse a column of dates (strings, or e.g. integer years) into datetime64
+
+    Parameters:
+    column (Series): dates to parse, missing values become NaT
+    date_format (str): one of DATE_FORMATS or a strptime format,
+                       detected from a sample of column if None
+
+    Returns:
+    dates (Series): datetime64[ns] values aligned with column
+
+    Raises ValueError if the format cannot be detected or a value does not match it.
+    """
+    codes, uniques = _factorize(column, date_format)
+    parsed = pd.DatetimeIndex(uniques).as_unit('ns').to_numpy()
+    # code -1 (missing value) picks the trailing NaT
+    parsed = np.append(parsed, np.datetime64('NaT', 'ns'))
+    return pd.Series(parsed[codes], index=column.index)
+
+
+def to_iso(column, date_format=None):
+    """like parse_dates, but returns ISO 8601 strings (e.g. 2015-01-01T00:00:00),
+    as datetime.isoformat writes them, missing where column is missing"""
+    codes, uniques = _factorize(column, date_format)
+    formatted = np.array([date.isoformat() for date in uniques] + [None], dtype=object)
+    return pd.Series(formatted[codes], index=column.index)
+
+
+def _factorize(column, date_format):
+    """codes of each row into the parsed distinct values of column"""
+    if date_format is None:
+        date_format = detect_format(column)
+        if date_format is None:
+            raise ValueError('Could not detect date format of column ' + str(column.name))
+    codes, uniques = pd.factorize(column)
+    return codes, [_parse(value, date_format) for value in uniques]
+
+
+def _parse(value, date_format):
+    if date_format == ISO_FORMAT:
+        return datetime.fromisoformat(str(value))
+    return datetime.strptime(str(value), date_format)
@@ -0,0 +1,156 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from utils.fill_values import fill_columns, CHANGELOG_COLUMN
+
+# Row-level changes between successive drops of a sector. A snapshot of every
+# ingested drop holds the key columns of its ERMIN rows and two 64-bit hashes
+# per row, one of the key and one of the values; the next drop is compared to
+# it by hash, so only added and changed rows need to be validated and uploaded.
+# Requires pyarrow (snapshots are Parquet files).
+
+# columns identifying one emissions value (as utils.database.ERMIN_NATURAL_KEY)
+ROW_KEY = ['reporting_entity', 'original_inventory_sector', 'producing_entity_id',
+           'emitted_product_formula', 'carbon_equivalency_method', 'start_time', 'end_time']
+
+# a row with a known key has changed when one of these differs
+ROW_VALUES = ['emission_quantity', 'emission_quantity_units']
+
+KEY_HASH = 'key_hash'
+VALUE_HASH = 'value_hash'
+
+
+def row_hashes(df, columns):
+    """64-bit hash of the given columns of each row (categoricals hash by value, not code)"""
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+def snapshot(df):
+    """the snapshot of a drop: its key columns (those of ROW_KEY it has) plus key and value hashes"""
+    key = [column for column in ROW_KEY if column in df]
+    snap = df[key].reset_index(drop=True)
+    snap[KEY_HASH] = row_hashes(df, key)
+    snap[VALUE_HASH] = row_hashes(df, [column for column in ROW_VALUES if column in df])
+    return snap
+
+
+def _key_columns(snap):
+    return [column for column in snap.columns if column not in [KEY_HASH, VALUE_HASH]]
+
+
+def diff(df, previous):
+    """compare the ERMIN rows of a new drop to the snapshot of the previous one
+
+    Parameters:
+    df (DataFrame): ERMIN rows of the new drop
+    previous (DataFrame): snapshot of the previous drop, or None if there is none
+
+    Returns:
+    delta (DataFrame): rows of df that are new or whose values changed
+    removed (DataFrame): key columns of the rows of the previous drop missing from df
+    snap (DataFrame): snapshot of df, to be saved once the delta is ingested
+    stats (dict): number of rows added, changed, removed and unchanged
+    """
+    snap = snapshot(df)
+    if previous is None:
+        stats = {'added': len(df), 'changed': 0, 'removed': 0, 'unchanged': 0}
+        return df, snap[_key_columns(snap)].iloc[:0], snap, stats
+
+    previous = previous.drop_duplicates(KEY_HASH, keep='last')
+    position = pd.Index(previous[KEY_HASH].to_numpy()).get_indexer(snap[KEY_HASH].to_numpy())
+    added = position == -1
+    changed = ~added & (previous[VALUE_HASH].to_numpy()[position] != snap[VALUE_HASH].to_numpy())
+    removed = ~np.isin(previous[KEY_HASH].to_numpy(), snap[KEY_HASH].to_numpy())
+
+    stats = {'added': int(added.sum()), 'changed': int(changed.sum()), 'removed': int(removed.sum()),
+             'unchanged': int(len(df) - added.sum() - changed.sum())}
+    delta = df[added | changed].reset_index(drop=True) if stats['unchanged'] > 0 else df
+    return delta, previous.loc[removed, _key_columns(previous)].reset_index(drop=True), snap, stats
+
+
+def is_unchanged(stats):
+    return stats['added'] == 0 and stats['changed'] == 0 and stats['removed'] == 0
+
+
+def changelog(stats):
+    """version changelog text, e.g. '120 rows added, 3 changed, 0 removed'"""
+    return f"{stats['added']} rows added, {stats['changed']} changed, {stats['removed']} removed"
+
+
+def keep_changes(df, snapshots, reporting_entity, sector):
+    """diff the ERMIN rows of a sector against its snapshot in snapshots (a SnapshotStore)
+
+    If there is a previous drop, the data_version_changelog column of the delta
+    (where present) is set to the changes found.
+
+    Returns:
+    delta (DataFrame): added and changed rows
+    changes (dict): delta (change statistics), removed (key columns of removed rows),
+                    snapshot (to save with record_changes once ingested) and
+                    changelog (None for the first drop)
+    """
+    previous = snapshots.load(reporting_entity, sector)
+    delta, removed, snap, stats = diff(df, previous)
+    changes = {'delta': stats, 'removed': removed, 'snapshot': snap, 'changelog': None}
+    if previous is not None:
+        changes['changelog'] = changelog(stats)
+        if CHANGELOG_COLUMN in delta and len(delta) > 0:
+            fill_columns(delta, {CHANGELOG_COLUMN: changes['changelog']})
+    return delta, changes
+
+
+def record_changes(changes, snapshots, reporting_entity, sector, version_registry=None, removed_sink=None, key=None):
+    """once the delta of a sector is ingested: pass on its removed rows, fill in the changelog
+    of its version and save its snapshot, so that the next drop is compared to this one
+
+    Parameters:
+    changes (dict): as returned by keep_changes
+    version_registry (VersionRegistry): registry whose version for this drop gets the changelog
+    removed_sink (callable): called as removed_sink(key, removed) if rows were removed
+    key (str): passed to removed_sink, defaults to sector
+    """
+    if removed_sink is not None and len(changes['removed']) > 0:
+        removed_sink(sector if key is None else key, changes['removed'])
+    if version_registry is not None and changes['changelog'] is not None:
+        version_registry.set_changelog(reporting_entity, sector, changes['changelog'])
+    if not is_unchanged(changes['delta']):
+        snapshots.save(reporting_entity, sector, changes['snapshot'])
+
+
+class SnapshotStore:
+    """Snapshots of the last ingested drop of each sector, one Parquet file each
+
+    Parameters:
+    snapshot_dir (str): directory holding <reporting_entity>_<sector>.parquet files
+    """
+
+    def __init__(self, snapshot_dir):
+        self.snapshot_dir = snapshot_dir
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+    def path(self, reporting_entity, sector):
+        return os.path.join(self.snapshot_dir, reporting_entity + '_' + sector + '.parquet')
+
+    def load(self, reporting_entity, sector):
+        """the snapshot of the sector's last ingested drop, or None"""
+        path = self.path(reporting_entity, sector)
+        if not os.path.exists(path):
+            return None
+        return pd.read_parquet(path)
+
+    def save(self, reporting_entity, sector, snap):
+        """replace the sector's snapshot, atomically"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_dir, suffix='.tmp')
+        os.close(fd)
+        snap.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.path(reporting_entity, sector))
+
+    def fingerprint(self, reporting_entity, sector):
+        """hash of the sector's snapshot file (None if there is none), e.g. for cache keys"""
+        path = self.path(reporting_entity, sector)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
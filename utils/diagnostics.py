@@ -0,0 +1,184 @@
+import re
+import numpy as np
+
+# Message templates by error code. Fields are stored per occurrence and only
+# formatted into these when the diagnostics are printed or written.
+MESSAGES = {
+    'late_start': 'Error: Data for country {country} starts on {date}, requirement is on or before {limit}',
+    'early_end': 'Error: Data for country {country} ends on {date}, requirement is on or after {limit}',
+    'spanning_entry': 'Error: Entry spans more than one year: {start_date}\t{end_date}\t{country}',
+    'missing_country': 'Error: country {country} missing from input table.',
+    'negative_emissions': 'Error: Negative {column} emissions {value} reported in {year} for country {country}',
+    'unconvertible_emissions': 'Could not check >=0 status of {column} value {value} reported in {year} for country country because could not convert to float.',
+    'invalid_code': 'The value {value} was not a valid {syntax} code.',
+    'missing_column': 'Missing this required column: "{column}".',
+    'message': '{message}', # free-form, e.g. from the ERMIN validator
+}
+
+# ERMIN reports missing columns as text; they are recognized once, when added
+MISSING_COLUMN = re.compile(r'^Missing this required column: "(.*)"\.$')
+
+DEFAULT_MAX_EXAMPLES = 1000
+
+
+class Diagnostics:
+    """Warnings or errors stored as codes with compact per-occurrence fields
+
+    Every occurrence is counted per code, but fields are only kept for the first
+    max_examples occurrences of each code, so a systematic problem (e.g. every
+    row negative) costs a counter, not millions of strings. Messages are formatted
+    from MESSAGES only when iterated, so the object can be used where a list of
+    messages was used before: len() is the number of occurrences, iteration and
+    slicing give the kept messages by code, each code followed by a line counting
+    the occurrences that were not kept.
+
+    Parameters:
+    max_examples (int): occurrences kept per code
+    """
+
+    def __init__(self, max_examples=DEFAULT_MAX_EXAMPLES):
+        self.max_examples = max_examples
+        self.counts = {} # occurrences per code, in order of first occurrence
+        self._examples = {} # per code, list of (size, fields) batches; fields are scalars or arrays of size
+
+    @classmethod
+    def from_messages(cls, messages, max_examples=DEFAULT_MAX_EXAMPLES):
+        diagnostics = cls(max_examples=max_examples)
+        diagnostics += messages
+        return diagnostics
+
+    def add(self, code, rows=None, count=None, **fields):
+        """record occurrences of code
+
+        Fields are scalars (shared by all occurrences) or arrays with one entry per
+        occurrence. If rows (an array of row positions) is given, array fields are
+        whole columns and only the kept rows are gathered from them; otherwise the
+        number of occurrences is the length of the array fields, or 1. If count is
+        given, it is the number of occurrences, of which the fields hold the first
+        (e.g. when only up to max_examples were gathered).
+        """
+        arrays = [name for name, value in fields.items() if not _is_scalar(value)]
+        if rows is not None:
+            size = len(rows)
+        elif len(arrays) > 0:
+            size = len(fields[arrays[0]])
+        else:
+            size = 1
+        self._add(code, size, fields, arrays, rows, count)
+
+    def _add(self, code, size, fields, arrays, rows=None, count=None):
+        if size == 0:
+            return
+        self.counts[code] = self.counts.get(code, 0) + (size if count is None else count)
+        examples = self._examples.setdefault(code, [])
+        keep = min(size, self.max_examples - sum(kept for kept, _ in examples))
+        if keep <= 0:
+            return
+        kept_fields = dict(fields)
+        for name in arrays:
+            values = np.asarray(fields[name], dtype=object) if isinstance(fields[name], list) else np.asarray(fields[name])
+            kept_fields[name] = values[np.asarray(rows)[:keep]] if rows is not None else values[:keep]
+        examples.append((keep, kept_fields))
+
+    def append(self, message):
+        """record one free-form message"""
+        match = MISSING_COLUMN.match(message)
+        if match is not None:
+            self.add('missing_column', column=match.group(1))
+        else:
+            self.add('message', message=message)
+
+    def __iadd__(self, other):
+        """merge another Diagnostics, or a list of messages"""
+        if not isinstance(other, Diagnostics):
+            for message in other:
+                self.append(message)
+            return self
+        for code, count in other.counts.items():
+            kept = 0
+            for size, fields in other._examples.get(code, []):
+                self._add(code, size, fields, [name for name in fields if not _is_scalar(fields[name])])
+                kept += size
+            if count > kept: # occurrences the other one only counted
+                self.counts[code] = self.counts.get(code, 0) + count - kept
+        return self
+
+    def fields(self, code, name):
+        """values of one field over the kept occurrences of code, e.g. fields('missing_column', 'column')"""
+        values = []
+        for size, fields in self._examples.get(code, []):
+            value = fields[name]
+            values += [value] * size if _is_scalar(value) else _to_python(value)
+        return values
+
+    def unique(self):
+        """a copy without repeated messages, e.g. the same problem reported for every block of a table"""
+        unique = Diagnostics(max_examples=self.max_examples)
+        seen = set()
+        for code in self.counts:
+            for row in self._rows(code):
+                message = MESSAGES[code].format(**row)
+                if message not in seen:
+                    seen.add(message)
+                    unique.add(code, **row)
+        return unique
+
+    def summary(self):
+        """number of occurrences per code"""
+        return dict(self.counts)
+
+    def messages(self, limit=None):
+        """formatted messages, see the class description"""
+        messages = []
+        for code, count in self.counts.items():
+            kept = 0
+            for row in self._rows(code):
+                if limit is not None and len(messages) >= limit:
+                    return messages
+                messages.append(MESSAGES[code].format(**row))
+                kept += 1
+            if count > kept:
+                if limit is not None and len(messages) >= limit:
+                    return messages
+                messages.append('... and ' + str(count - kept) + ' more ' + code + ' (not shown)')
+        return messages
+
+    def _rows(self, code):
+        for size, fields in self._examples.get(code, []):
+            columns = {name: [value] * size if _is_scalar(value) else _to_python(value)
+                       for name, value in fields.items()}
+            for i in range(size):
+                yield {name: values[i] for name, values in columns.items()}
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def __iter__(self):
+        return iter(self.messages())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) and index.start is None and index.step is None and index.stop is not None:
+            return self.messages(limit=max(index.stop, 0)) # e.g. printing the first 10, formats only those
+        return self.messages()[index]
+
+    def __eq__(self, other):
+        if isinstance(other, Diagnostics):
+            return self.counts == other.counts and self.messages() == other.messages()
+        if isinstance(other, list):
+            return self.messages() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return 'Diagnostics(' + repr(self.summary()) + ')'
+
+
+def _is_scalar(value):
+    return value is None or np.isscalar(value)
+
+
+def _to_python(values):
+    """array values as Python objects, so that e.g. floats and dates format as before"""
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return [str(value) for value in values]
+    return values.tolist()
@@ -0,0 +1,77 @@
+import atexit
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Dimension tables (country codes, ISO codes, ...) as compact NumPy record
+# arrays: fixed-width text and integer columns, no Python objects. A table is
+# built once, by the function registered for it, and can be published to a
+# directory of .npy files that process-pool workers memory-map (see attach)
+# instead of rebuilding it: pages are shared between processes and nothing is
+# parsed or unpickled at worker startup. Forked workers already share the
+# tables (and lookups derived from them) of the parent, copy-on-write, and
+# keep those.
+
+_builders = {} # by table name
+_tables = {}   # built or attached tables of this process, by name
+_published = None # directory this process published its tables to
+_attach_hooks = [] # called after attach, e.g. to drop lookups derived from the built tables
+
+
+def register_table(name, build):
+    """register build() as the function building dimension table name (a NumPy record array)"""
+    _builders[name] = build
+
+
+def on_attach(hook):
+    """register hook() to be called after attach"""
+    _attach_hooks.append(hook)
+
+
+def table(name):
+    """dimension table name: attached from the published file if there is one, else built once per process"""
+    if name not in _tables:
+        _tables[name] = _builders[name]()
+    return _tables[name]
+
+
+def publish(directory=None):
+    """write every registered table to directory as <name>.npy, to be attached by other processes
+
+    Parameters:
+    directory (str): where to write the tables; defaults to a temporary directory,
+                     removed when this process exits
+
+    Returns:
+    directory (str): the directory to pass to attach
+    """
+    global _published
+    if directory is None:
+        if _published is not None:
+            return _published
+        directory = tempfile.mkdtemp(prefix='dimensions_')
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+    for name in _builders:
+        np.save(os.path.join(directory, name + '.npy'), table(name), allow_pickle=False)
+    _published = directory
+    return directory
+
+
+def attach(directory):
+    """use the tables published to directory (read-only memory maps) instead of building them;
+    e.g. the initializer of a ProcessPoolExecutor, with initargs=(publish(),)
+
+    Tables this process already has (e.g. inherited from the parent by a forked worker)
+    are kept, and the attach hooks are only called if a table was attached.
+    """
+    attached = False
+    for file in os.listdir(directory):
+        name, extension = os.path.splitext(file)
+        if extension == '.npy' and name not in _tables:
+            _tables[name] = np.load(os.path.join(directory, file), mmap_mode='r', allow_pickle=False)
+            attached = True
+    if attached:
+        for clear in _attach_hooks:
+            clear()
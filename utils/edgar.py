@@ -0,0 +1,188 @@
+import pandas as pd
+import re
+from utils.import_data import list_data_files, data_file_info, excel_engine, staged_sheet, DEFAULT_PATH_TO_DATA
+from utils.reshape import wide_to_long
+from utils.staging import stage_raw_data
+from utils.dates import to_iso
+from utils.parallel import process_pool
+
+# EDGAR workbook sheets: header block (compound, unit, source) in the first rows,
+# column names in row 8, one row per country and IPCC category with a column per year
+
+IPCC_CODE_COLUMN = re.compile(r'^ipcc_code_([1-3][0-9]{3})_for_standard_report$')
+IPCC_NAME_COLUMN = re.compile(r'^ipcc_code_([1-3][0-9]{3})_for_standard_report_name$')
+YEAR_COLUMN = re.compile(r'.*([1-3][0-9]{3})')
+# gas in a workbook name, e.g. edgar_v60-CH4_20220414 or edgar_EDGARv6.0_FT2020_fossil_CO2_GHG_booklet2021
+WORKBOOK_GAS = re.compile(r'(?<![A-Za-z0-9])(CO2|CH4|N2O|F-gases)(?![A-Za-z0-9])')
+WORKBOOK_DATE = re.compile(r'_([0-9]{8})$')
+
+
+def skip_sheet(sheet):
+    """the 'TOTALS BY COUNTRY' sheets and the sheets with 1996 IPCC codes are not loaded"""
+    return sheet == 'TOTALS BY COUNTRY' or re.match(r".+1996", sheet) is not None
+
+
+def workbook_gas(workbook):
+    """the gas of a workbook, from its name without extension; if none is named,
+    the name without its inventory prefix and drop date"""
+    match = WORKBOOK_GAS.search(workbook)
+    if match is not None:
+        return match.group(1)
+    return WORKBOOK_DATE.sub('', data_file_info(workbook))
+
+
+def workbook_date(workbook):
+    """the drop date (YYYYMMDD) at the end of a workbook name without extension, or None"""
+    match = WORKBOOK_DATE.search(workbook)
+    return None if match is None else match.group(1)
+
+
+def get_header_info(raw_df):
+    df_header = raw_df.set_index('Content:')
+    emitted_product_formula = df_header.loc['Compound:', 'Emissions by country and main source category']
+    emissions_quantity_units = df_header.loc['Unit:', 'Emissions by country and main source category']
+    measurement_method_doi_or_url = df_header.loc['Data download:',  'Emissions by country and main source category']
+
+    return emitted_product_formula, emissions_quantity_units, measurement_method_doi_or_url
+
+
+def remove_header(raw_df):
+    df = raw_df.iloc[8:, :].reset_index(drop=True) # get rid of header rows for continued manipulation
+    df.columns = df.iloc[0,:]
+    df = df.drop(0, axis=0)
+
+    return df
+
+
+def ipcc_columns(columns):
+    """return the (code column, name column) of the IPCC categories, resolved once from the header"""
+    code_column = name_column = None
+    for column in columns:
+        if not isinstance(column, str):
+            continue
+        if IPCC_CODE_COLUMN.match(column) is not None:
+            code_column = column
+        elif IPCC_NAME_COLUMN.match(column) is not None:
+            name_column = column
+    if code_column is None or name_column is None:
+        raise KeyError('Could not find IPCC code and name columns in ' + str(list(columns)))
+    return code_column, name_column
+
+
+def ipcc_sector(df):
+    """original_inventory_sector for each row, e.g. '1.A.1.a Main Activity Electricity and Heat Production'"""
+    code_column, name_column = ipcc_columns(df.columns)
+    return df[code_column].astype(str) + ' ' + df[name_column].astype(str)
+
+
+def clean_column_names(df):
+    """converts year columns to integers, and drops other uneeded columns"""
+
+    columns_to_drop = [column for column in df.columns if
+                       re.match(r'ipcc_code_([1-3][0-9]{3})_for_standard_report', str(column))
+                       is not None] + ['IPCC_annex', 'C_group_IM24_sh']
+    df = df.drop(columns=columns_to_drop)
+
+    # build the whole mapping first, then rename once
+    renames = {'Country_code_A3': 'producing_entity_id',
+               'Name': 'producing_entity_name'}
+    for column in df.columns:
+        match_year = YEAR_COLUMN.match(str(column))
+        if match_year:
+            renames[column] = int(match_year.group(0).lstrip('Y_'))
+
+    return df.rename(columns=renames)
+
+
+def check_for_nan_columns(df):
+    """a couple of csvs have nan columns that prevent following rows from running, check for them and remove them """
+    isna = df.columns.isna()
+    column_to_drop = df.columns[isna]
+    if isna.sum() >= 1:
+        return df.drop(columns=column_to_drop)
+    else:
+        return df
+
+
+def clean_sheet(df_with_header):
+    """convert one raw EDGAR sheet into long ERMIN-style rows, one per country, category and year"""
+    emitted_product_formula, emissions_quantity_units, measurement_method_doi_or_url = \
+        get_header_info(df_with_header)
+    df = remove_header(df_with_header)
+    df['original_inventory_sector'] = ipcc_sector(df)
+    df = check_for_nan_columns(df)
+    df = clean_column_names(df)
+    year_columns = [col for col in df.columns if re.match(r'\d{4}', str(col)) is not None]
+    df[year_columns] = df[year_columns].astype(float) # convert all numeric columns to floats
+    # summing bio and fossil totals for each country/sector
+    df = df.groupby(by = ['producing_entity_name', 'producing_entity_id','original_inventory_sector'], as_index=False)[year_columns].sum()
+    df = wide_to_long(df,
+                      id_columns=['producing_entity_id', 'producing_entity_name', 'original_inventory_sector'],
+                      value_columns={year: {'year': year} for year in year_columns},
+                      value_name='emission_quantity')
+    df['start_time'] = to_iso(df['year'], '%Y')
+    df = df.drop(columns=['year'])
+    df['emitted_product_formula'] = emitted_product_formula
+    df['emission_quantity_units'] = emissions_quantity_units
+    df['measurement_method_doi_or_url'] = measurement_method_doi_or_url
+    df['reporting_entity'] = 'edgar'
+    return df
+
+
+def list_sheets(path_to_data=DEFAULT_PATH_TO_DATA, stage_dir=None, verbose=True):
+    """list (sheet, path) for every EDGAR sheet to load, in workbook order
+
+    If stage_dir is given, workbooks are first converted to one Parquet file per
+    sheet there (only when changed, see utils.staging), and those are listed instead.
+    """
+    if stage_dir is not None:
+        staged = stage_raw_data('edgar', path_to_data=path_to_data, staging_dir=stage_dir, verbose=verbose)
+        sheets = [(staged_sheet(path), path) for path in staged]
+        return [(sheet, path) for sheet, path in sheets if sheet is not None and not skip_sheet(sheet)]
+
+    sheets = []
+    for _, path in list_data_files('edgar', path_to_data):
+        if path.endswith('.xlsx') | path.endswith('.xls'):
+            sheet_names = pd.ExcelFile(path, engine=excel_engine()).sheet_names
+            sheets += [(sheet, path) for sheet in sheet_names if not skip_sheet(sheet)]
+    return sheets
+
+
+def read_sheet(sheet, path):
+    """read one raw sheet, from its workbook or its staged Parquet file"""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_excel(path, sheet_name=sheet, engine=excel_engine())
+
+
+def load_sheet(sheet, path):
+    """read and clean one sheet, from its workbook or its staged Parquet file"""
+    return clean_sheet(read_sheet(sheet, path))
+
+
+def _load_sheet_job(job):
+    return load_sheet(*job)
+
+
+def iter_edgar_data(path_to_data=DEFAULT_PATH_TO_DATA, stage_dir=None, workers=1, verbose=True):
+    """yield (sheet, DataFrame) of cleaned long data for every EDGAR sheet
+
+    Parameters:
+    path_to_data (str): directory containing EDGAR workbooks
+    stage_dir (str): if given, read sheets from Parquet copies staged in this directory
+    workers (int): number of worker processes reading and cleaning sheets in parallel
+    verbose (bool): print each sheet as it is loaded
+    """
+    sheets = list_sheets(path_to_data, stage_dir=stage_dir, verbose=verbose)
+    if workers > 1:
+        with process_pool(workers) as executor:
+            # results come back in sheet order
+            for (sheet, _), df in zip(sheets, executor.map(_load_sheet_job, sheets)):
+                if verbose:
+                    print(sheet)
+                yield sheet, df
+    else:
+        for sheet, path in sheets:
+            if verbose:
+                print(sheet)
+            yield sheet, load_sheet(sheet, path)
@@ -0,0 +1,104 @@
+import pandas as pd
+from utils.reshape import constant_column
+
+# fill table columns; the file has no header row
+FILL_COLUMNS = ['sector', 'column', 'value']
+
+# columns whose fill values come from the version registry and the run time,
+# not from the table, when they are listed for a sector
+VERSION_COLUMN = 'data_version'
+CHANGELOG_COLUMN = 'data_version_changelog'
+TIMESTAMP_COLUMN = 'reporting_timestamp'
+
+
+class FillValues:
+    """Missing values fill table (Step 2.5), indexed by sector and column
+
+    The table lists, per sector, ERMIN columns missing from the input and the
+    value to fill them with. Values are cast to the dtypes of the frame schema
+    (see Specification.frame_dtypes) when set, so filling a sector only builds
+    constant columns. Values that do not cast (e.g. 'NULL' for a float column)
+    are kept as text for the validators to judge.
+
+    Parameters:
+    table (DataFrame): sector, column and value columns, e.g. from load
+    dtypes (dict): dtype by column name; columns not listed are categorical
+    """
+
+    def __init__(self, table=None, dtypes=None):
+        self.dtypes = dtypes if dtypes is not None else {}
+        self.values = {} # {sector: {column: value}}, columns in table order
+        if table is not None:
+            for sector, column, value in table[FILL_COLUMNS].itertuples(index=False):
+                self.set(sector, column, value)
+
+    @classmethod
+    def load(cls, path, dtypes=None):
+        """read a sector, column, value CSV (quoted values may contain commas)"""
+        table = pd.read_csv(path, names=FILL_COLUMNS, dtype=str, keep_default_na=False, skipinitialspace=True)
+        table = table.apply(lambda column: column.str.strip())
+        return cls(table, dtypes=dtypes)
+
+    def set(self, sector, column, value):
+        """set the value to fill column with for sector, cast to the column's dtype"""
+        self.values.setdefault(sector, {})[column] = _cast(value, self.dtypes.get(column, 'category'))
+
+    def set_all(self, column, value):
+        """set the value of column for every sector that fills it, e.g. the reporting_timestamp of this run"""
+        for sector, columns in self.values.items():
+            if column in columns:
+                self.set(sector, column, value)
+
+    def set_version(self, sector, version, changelog):
+        """fill data_version and data_version_changelog of sector, where listed, with a registry version"""
+        columns = self.values.get(sector, {})
+        if VERSION_COLUMN in columns:
+            self.set(sector, VERSION_COLUMN, version)
+        if CHANGELOG_COLUMN in columns:
+            self.set(sector, CHANGELOG_COLUMN, changelog)
+
+    def set_versions(self, version_registry, reporting_entity):
+        """set_version for every sector with a version in version_registry"""
+        for sector in self.values:
+            latest = version_registry.latest(reporting_entity, sector)
+            if latest is not None:
+                self.set_version(sector, latest[1], latest[2])
+
+    def sectors(self):
+        return list(self.values)
+
+    def __getitem__(self, sector):
+        """{column: value} to fill for sector (empty if none)"""
+        return dict(self.values.get(sector, {}))
+
+
+def _cast(value, dtype):
+    if dtype == 'float64':
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return value
+    if dtype.startswith('datetime64'):
+        try:
+            return pd.Timestamp(value)
+        except (TypeError, ValueError):
+            return value
+    return str(value)
+
+
+def fill_columns(df, values, dtypes=None):
+    """add a constant column to df for each (column, value) in values, in one assignment
+
+    Parameters:
+    df (DataFrame): frame to fill, modified in place
+    values (dict): {column: value}, e.g. FillValues()[sector]; a list of (column, value) tuples also works
+    dtypes (dict): dtype by column name; columns not listed are categorical
+    """
+    values = dict(values)
+    if len(values) == 0:
+        return df
+    dtypes = dtypes if dtypes is not None else {}
+    columns = {column: constant_column(value, len(df), dtypes.get(column, 'category'))
+               for column, value in values.items()}
+    df[list(columns)] = pd.DataFrame(columns, index=df.index)
+    return df
@@ -1,31 +1,167 @@
 import pandas as pd
 import os
+from utils.specification import load_specification
 
 
-def import_data_from_local(reporting_entity, 
-                           path_to_data = '/Users/christyjlewis/Google Drive/My Drive/Climate TRACE /Metamodeling/data/raw_data/',
-                           verbose=True):
-    """take reporting entity name from cleaner and export a dictionary with original
-    filename as key and data as value
+DEFAULT_PATH_TO_DATA = '/Users/christyjlewis/Google Drive/My Drive/Climate TRACE /Metamodeling/data/raw_data/'
+
+# Parquet metadata entry naming the workbook sheet a staged file holds (see utils.staging)
+STAGED_SHEET_KEY = b'sheet'
+
+
+def list_data_files(reporting_entity, path_to_data=DEFAULT_PATH_TO_DATA):
+    """list (file_info, path) for every file in path_to_data belonging to reporting_entity
 
     files input must have the following naming structures to be successfuly inported:
 
     inventory-name_file-description_YYYYMMDD """
 
-    data = {}
+    files = []
     for file in os.listdir(path_to_data):
-        inventory = file.split('_')[0]
-        file_info = file.split('.')[0].strip(inventory).lstrip('_')
-        if inventory == reporting_entity:
+        if file.split('_')[0] == reporting_entity:
+            files.append((data_file_info(file), os.path.join(path_to_data, file)))
+    return files
+
+
+def data_file_info(file):
+    """file_info of an input file name: the name without its inventory prefix and extension"""
+    inventory = file.split('_')[0]
+    # drop the inventory prefix by length; str.strip would also eat matching
+    # characters from the end of names such as staged workbook sheets
+    return os.path.splitext(file)[0][len(inventory):].lstrip('_')
+
+
+def staged_sheet(path):
+    """the workbook sheet held by a staged Parquet file (see utils.staging), or None"""
+    import pyarrow.parquet as pq # only needed for staged inputs
+
+    metadata = pq.read_schema(path).metadata or {}
+    sheet = metadata.get(STAGED_SHEET_KEY)
+    return None if sheet is None else sheet.decode()
+
+
+def excel_engine():
+    """pandas engine for reading workbooks: calamine if python-calamine is installed
+    (much faster for large workbooks), otherwise openpyxl"""
+    try:
+        import python_calamine
+    except ImportError:
+        return 'openpyxl'
+    return 'calamine'
+
+
+def spec_read_options(spec_file):
+    """build read_csv options from a specification CSV
+
+    Only columns named in the specification are read (usecols), and columns
+    whose syntax is a float are parsed directly as float64 (dtype).
+
+    Returns:
+    options (dict): {'usecols': callable, 'dtype': dict}
+    """
+    return load_specification(spec_file).read_options()
+
+
+def iter_data_from_local(reporting_entity,
+                         path_to_data=DEFAULT_PATH_TO_DATA,
+                         verbose=True,
+                         dtype=None,
+                         usecols=None,
+                         chunksize=None):
+    """take reporting entity name from cleaner and yield (file_info, DataFrame) one table at a time
+
+    CSV and Parquet files yield one item keyed by file_info, workbooks yield one item per
+    sheet keyed by sheet name. Only the table currently being yielded is held in memory.
+
+    Parameters:
+    reporting_entity (str): inventory name at the start of each filename
+    path_to_data (str): directory containing input files
+    verbose (bool): print each file as it is imported
+    dtype (dict): column dtypes for CSV files, e.g. from spec_read_options
+    usecols (list or callable): columns to read from CSV files, e.g. from spec_read_options
+    chunksize (int): if given, CSV and Parquet files are read in blocks of this many rows and
+                     each block is yielded with the file's file_info
+
+    If a CSV file cannot be parsed with the requested dtypes (e.g. a non-numeric
+    value in a float column), it is read again without them so that validation
+    can report the offending values."""
+
+    for file_info, path in list_data_files(reporting_entity, path_to_data):
+        yield from read_data_file(file_info, path, verbose=verbose, dtype=dtype,
+                                  usecols=usecols, chunksize=chunksize)
+
+
+def read_data_file(file_info, path, verbose=True, dtype=None, usecols=None, chunksize=None):
+    """yield (file_info, DataFrame) for a single input file, see iter_data_from_local"""
+    file = os.path.basename(path)
+    if verbose:
+        print(f'Importing {file}')
+    if file.endswith('.csv'):
+        if chunksize is not None:
+            yield from _iter_csv_chunks(file_info, path, dtype, usecols, chunksize)
+            return
+        try:
+            table = pd.read_csv(path, dtype=dtype, usecols=usecols)
+        except ValueError:
+            if dtype is None:
+                raise
             if verbose:
-                print(f'Importing {file}')
-            if file.endswith('.csv'):
-                df = pd.read_csv(os.path.join(path_to_data,file))
-                data[file_info] = df
-            elif file.endswith('.xlsx') | file.endswith('.xls'):
-                f = pd.ExcelFile(path_to_data + file, engine='openpyxl')
-                sheet_names = f.sheet_names
-                sheets = {sheet: f.parse(sheet_name=sheet) for sheet in sheet_names}
-                data.update(sheets)
-    return data
+                print(f'Could not read {file} with specified dtypes, reading without them')
+            table = pd.read_csv(path, usecols=usecols)
+        yield file_info, table
+    elif file.endswith('.xlsx') | file.endswith('.xls'):
+        f = pd.ExcelFile(path, engine=excel_engine())
+        for sheet in f.sheet_names:
+            yield sheet, f.parse(sheet_name=sheet)
+    elif file.endswith('.parquet'):
+        # staged inputs (see utils.staging) are already typed, so only usecols applies
+        yield from _iter_parquet(file_info, path, usecols, chunksize)
+
+
+def _iter_csv_chunks(file_info, path, dtype, usecols, chunksize):
+    """read a CSV file in blocks, see read_data_file
+
+    Numeric columns are read as text and converted block by block; a block holding
+    a value that does not convert keeps that column as text for validation to
+    report, as a whole file that cannot be parsed with its dtypes does."""
+    numeric = {column: column_dtype for column, column_dtype in (dtype or {}).items()
+               if pd.api.types.is_numeric_dtype(column_dtype)}
+    text_dtype = dict(dtype or {}, **{column: str for column in numeric})
+    for chunk in pd.read_csv(path, dtype=text_dtype, usecols=usecols, chunksize=chunksize):
+        for column, column_dtype in numeric.items():
+            if column in chunk:
+                values = pd.to_numeric(chunk[column], errors='coerce')
+                if not (values.isna() & chunk[column].notna()).any():
+                    chunk[column] = values.astype(column_dtype)
+        yield file_info, chunk
+
+
+def _iter_parquet(file_info, path, usecols, chunksize):
+    import pyarrow.parquet as pq # only needed for staged inputs
+
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    # staged workbook sheets are keyed by sheet name, as when read from the workbook
+    sheet = (parquet_file.schema_arrow.metadata or {}).get(STAGED_SHEET_KEY)
+    if sheet is not None:
+        file_info = sheet.decode()
+    columns = parquet_file.schema_arrow.names
+    if usecols is not None:
+        columns = [column for column in columns if (usecols(column) if callable(usecols) else column in usecols)]
+    if chunksize is None:
+        yield file_info, parquet_file.read(columns=columns).to_pandas()
+    else:
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield file_info, batch.to_pandas()
+
+
+def import_data_from_local(reporting_entity,
+                           path_to_data = DEFAULT_PATH_TO_DATA,
+                           verbose=True):
+    """take reporting entity name from cleaner and export a dictionary with original
+    filename as key and data as value
+
+    files input must have the following naming structures to be successfuly inported:
+
+    inventory-name_file-description_YYYYMMDD """
 
+    return dict(iter_data_from_local(reporting_entity, path_to_data=path_to_data, verbose=verbose))
@@ -0,0 +1,142 @@
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+REPORT_COLUMNS = ['sector', 'stage', 'calls', 'wall_seconds', 'cpu_seconds', 'rows_in', 'rows_out', 'rss_delta_mb']
+
+
+class RunReport:
+    """Wall time, CPU time, rows and memory growth per sector and pipeline stage
+
+    Measurements of the same stage of a sector (e.g. one per block in chunked
+    mode) are added up, except rss_delta_mb, the largest change of resident
+    memory over one call (see current_rss_mb). A disabled report measures
+    nothing, so stages can be wrapped unconditionally. Stages may be measured
+    from several threads.
+
+    Parameters:
+    enabled (bool): record measurements
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.records = {} # keyed by (sector, stage), in order of first measurement
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, sector, stage, rows_in=None):
+        """measure the enclosed block as stage of sector
+
+        Yields a dict; set its 'rows_out' entry to record the number of rows produced,
+        or its 'discard' entry to True to drop the measurement.
+        """
+        measurement = {'rows_out': None, 'discard': False}
+        if not self.enabled:
+            yield measurement
+            return
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        start_rss = current_rss_mb()
+        try:
+            yield measurement
+        finally:
+            if not measurement['discard']:
+                self.add({'sector': sector,
+                          'stage': stage,
+                          'calls': 1,
+                          'wall_seconds': time.perf_counter() - start_wall,
+                          'cpu_seconds': time.process_time() - start_cpu,
+                          'rows_in': rows_in,
+                          'rows_out': measurement['rows_out'],
+                          'rss_delta_mb': _minus(current_rss_mb(), start_rss)})
+
+    def add(self, record):
+        """add one measurement, e.g. from a report made in a worker process"""
+        with self._lock:
+            self._add(record)
+
+    def _add(self, record):
+        key = (record['sector'], record['stage'])
+        if key not in self.records:
+            self.records[key] = dict(record)
+            return
+        total = self.records[key]
+        for column in ['calls', 'wall_seconds', 'cpu_seconds', 'rows_in', 'rows_out']:
+            if record[column] is not None:
+                total[column] = record[column] if total[column] is None else total[column] + record[column]
+        total['rss_delta_mb'] = _max(total['rss_delta_mb'], record['rss_delta_mb'])
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+
+    def to_list(self):
+        """measurements as a list of dicts, e.g. to return from a worker process"""
+        with self._lock:
+            return [dict(record) for record in self.records.values()]
+
+    def write(self, path):
+        """write the report as JSON (path ending in .json) or CSV"""
+        directory = os.path.dirname(path)
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+        if path.endswith('.json'):
+            with open(path, 'w') as f:
+                json.dump(self.to_list(), f, indent=1)
+        else:
+            pd.DataFrame(self.to_list(), columns=REPORT_COLUMNS).to_csv(path, index=False)
+
+
+def current_rss_mb():
+    """resident memory of this process now, in MB (None where /proc is unavailable)
+
+    The change over a stage is what it left allocated (e.g. its result); temporaries
+    freed before it ends are not included, see profiled for the peak. Stages running
+    at the same time in other threads are included.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return None
+
+
+def profiled(output_prefix, function, *args, **kwargs):
+    """call function under cProfile and tracemalloc
+
+    Writes <output_prefix>.prof (load with pstats or snakeviz) and
+    <output_prefix>.tracemalloc.txt (top allocation sites, and the peak traced memory).
+    """
+    profile = cProfile.Profile()
+    tracemalloc.start()
+    try:
+        result = profile.runcall(function, *args, **kwargs)
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    profile.dump_stats(output_prefix + '.prof')
+    with open(output_prefix + '.tracemalloc.txt', 'w') as f:
+        f.write('Peak traced memory: %.1f MB\n' % (peak / 1024 ** 2))
+        for stat in snapshot.statistics('lineno')[:25]:
+            f.write(str(stat) + '\n')
+    return result
+
+
+def _max(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+def _minus(a, b):
+    if a is None or b is None:
+        return None
+    return a - b
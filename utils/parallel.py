@@ -0,0 +1,28 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from utils import dimensions
+
+
+def imap_bounded(executor, fn, iterable, window):
+    """like executor.map, but only keeps `window` tasks (and their inputs) in flight;
+    items that are already results (dicts, e.g. cache hits) are passed through in order"""
+    pending = deque()
+    for item in iterable:
+        if isinstance(item, dict):
+            future = Future()
+            future.set_result(item)
+        else:
+            future = executor.submit(fn, item)
+        pending.append(future)
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def process_pool(workers, mp_context=None):
+    """ProcessPoolExecutor whose workers attach to the dimension tables published by this
+    process (see utils.dimensions) rather than building their own; mp_context is passed on,
+    e.g. multiprocessing.get_context('spawn')"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=dimensions.attach,
+                               initargs=(dimensions.publish(),))
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from utils.dates import parse_dates, ISO_FORMAT
+
+
+# Declarative description of the Climate TRACE emissions columns.
+# Each wide value column maps to the constant ERMIN descriptor columns
+# attached to its rows in the long table.
+CT_EMISSIONS_COLUMNS = {
+    'CO2_emissions_tonnes': {'emission_quantity_units': 'tonnes',
+                             'emitted_product_formula': 'CO2',
+                             'carbon_equivalency_method': 'NA'},
+    'CH4_emissions_tonnes': {'emission_quantity_units': 'tonnes',
+                             'emitted_product_formula': 'CH4',
+                             'carbon_equivalency_method': 'NA'},
+    'N2O_emissions_tonnes': {'emission_quantity_units': 'tonnes',
+                             'emitted_product_formula': 'N2O',
+                             'carbon_equivalency_method': 'NA'},
+    'total_CO2e_20yrGWP': {'emission_quantity_units': 'tonnes',
+                           'emitted_product_formula': 'CO2e',
+                           'carbon_equivalency_method': '20-year'},
+    'total_CO2e_100yrGWP': {'emission_quantity_units': 'tonnes',
+                            'emitted_product_formula': 'CO2e',
+                            'carbon_equivalency_method': '100-year'},
+}
+
+
+def wide_to_long(df, id_columns, value_columns, value_name='emission_quantity'):
+    """reshape a wide table into a long table in a single pass
+
+    Rows are stacked one value column at a time (all rows for the first value
+    column, then all rows for the second, ...), matching the order of a
+    sequence of concats or of DataFrame.melt.
+
+    Parameters:
+    df (DataFrame): wide input table
+    id_columns (list): columns repeated for every value column
+    value_columns (dict): maps each value column to a dict of
+                          {descriptor column: constant value} attached to its rows.
+                          All entries must use the same descriptor columns.
+    value_name (str): name of the stacked value column (kept as float64)
+
+    Returns:
+    long_df (DataFrame): id columns, value column, then categorical descriptor columns
+    """
+    n_rows = len(df)
+    n_values = len(value_columns)
+    value_column_names = list(value_columns)
+
+    # take() keeps each id column's dtype instead of re-inferring it from a tiled array
+    row_positions = np.tile(np.arange(n_rows), n_values)
+    long_data = {}
+    for column in id_columns:
+        long_data[column] = df[column].take(row_positions).reset_index(drop=True)
+
+    values = df[value_column_names].to_numpy(dtype='float64')
+    long_data[value_name] = pd.Series(values.ravel(order='F'))
+
+    descriptor_columns = list(value_columns[value_column_names[0]]) if n_values > 0 else []
+    for descriptor in descriptor_columns:
+        codes, categories = pd.factorize(pd.Series([value_columns[column][descriptor]
+                                                    for column in value_column_names],
+                                                   dtype=object))
+        long_data[descriptor] = pd.Categorical.from_codes(np.repeat(codes, n_rows),
+                                                          categories=categories)
+
+    return pd.DataFrame(long_data)
+
+
+def constant_column(value, n_rows, dtype='category'):
+    """a column holding value in every row, cast to dtype (see Specification.frame_dtypes)
+
+    As a categorical, this costs one byte per row. If value cannot be cast to a
+    float or timestamp dtype (e.g. 'NULL'), it is kept as a categorical string
+    for the validators to judge. A None value gives a column of missing values.
+    """
+    if value is None:
+        return pd.Series(pd.Categorical.from_codes(np.full(n_rows, -1, dtype='int8'), categories=[]))
+    if dtype == 'float64':
+        try:
+            return pd.Series(np.full(n_rows, float(value)))
+        except (TypeError, ValueError):
+            pass
+    elif dtype.startswith('datetime64'):
+        try:
+            return pd.Series(np.full(n_rows, pd.Timestamp(value).to_datetime64()).astype(dtype))
+        except (TypeError, ValueError):
+            pass
+    return pd.Series(pd.Categorical.from_codes(np.zeros(n_rows, dtype='int8'), categories=[value]))
+
+
+def compact_frame(df, dtypes):
+    """cast the columns of df to the compact frame schema, in place
+
+    Text columns become categoricals (unless most of their values are distinct),
+    float columns float64 and timestamp columns datetime64. Columns already of the
+    target dtype are left alone, and columns whose values do not all convert keep
+    their values, so that validators can report them.
+
+    Parameters:
+    df (DataFrame): frame to convert
+    dtypes (dict): target dtype keyed by column, e.g. from Specification.frame_dtypes;
+                   columns of df not in dtypes are left alone
+
+    Returns:
+    df (DataFrame): the same frame
+    """
+    for column in df.columns:
+        dtype = dtypes.get(column)
+        if dtype is None or df[column].dtype == dtype:
+            continue
+        if dtype == 'category':
+            codes, uniques = pd.factorize(df[column])
+            if len(uniques) <= len(df) // 2 or len(df) < 2:
+                df[column] = pd.Categorical.from_codes(codes, categories=uniques)
+        elif dtype == 'float64':
+            try:
+                df[column] = df[column].astype('float64')
+            except (TypeError, ValueError):
+                pass
+        elif dtype.startswith('datetime64'):
+            try:
+                df[column] = parse_dates(df[column], ISO_FORMAT).astype(dtype)
+            except (TypeError, ValueError):
+                pass
+    return df
+
+
+def concat_frames(frames):
+    """concatenate frames (e.g. the blocks of a sector) without losing categorical dtypes
+
+    pd.concat turns categoricals with different categories into object columns,
+    so the categories are unified first.
+    """
+    frames = list(frames)
+    if len(frames) == 0:
+        return pd.DataFrame()
+    for column in frames[0].columns:
+        if all(column in frame and isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames):
+            categories = union_categoricals([pd.Categorical([], categories=frame[column].cat.categories)
+                                             for frame in frames]).categories
+            frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
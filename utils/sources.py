@@ -0,0 +1,447 @@
+# Source adapters and a runner that processes every registered inventory in one job
+import os
+import shutil
+import tempfile
+from collections import deque, namedtuple
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path
+import pandas as pd
+from utils.cache import SectorCache
+from utils.delta import SnapshotStore
+import utils.delta as delta
+from utils.diagnostics import Diagnostics
+from utils.instrumentation import RunReport, profiled
+from utils.parallel import imap_bounded, process_pool
+from utils.reshape import compact_frame, concat_frames
+from utils.specification import load_specification
+import utils.validation as eev
+
+ERMIN_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates', 'ermin-specification.csv')
+
+# stage names in run reports
+STAGE_LOAD = 'load'
+STAGE_NORMALIZE = 'normalize'
+STAGE_DELTA = 'delta'
+STAGE_VALIDATE = 'validate'
+
+# One unit of work of a source, e.g. a sector file or a workbook sheet.
+# name is unique within the source and keys results, caching and versions;
+# part is e.g. the sheet of a workbook (None if the whole file is the unit);
+# version is the drop date (YYYYMMDD) to record, or None.
+Unit = namedtuple('Unit', ['name', 'path', 'part', 'version'])
+
+SOURCES = {} # source adapter classes keyed by reporting entity name
+
+
+def register_source(cls):
+    """class decorator making a Source subclass available to run_sources by its name"""
+    SOURCES[cls.name] = cls
+    return cls
+
+
+class Source:
+    """Adapter between one inventory's raw drops and ERMIN rows
+
+    Subclasses set name and implement discover, load and normalize; validate,
+    dependencies and fingerprint have defaults. Sources that can read units in
+    row blocks also implement load_blocks, check_blocks and convert. Instances
+    are sent to worker processes, so they should only hold picklable settings.
+
+    Parameters:
+    datadir (str): directory holding the raw drop
+    ermin_specification (str): path to the ERMIN specification CSV
+    verbose (bool): print progress
+    """
+
+    name = None
+
+    def __init__(self, datadir, ermin_specification=ERMIN_SPEC_PATH, verbose=True):
+        self.datadir = datadir
+        self.ermin_specification = ermin_specification
+        self.verbose = verbose
+
+    def discover(self):
+        """list the Units of the drop in datadir"""
+        raise NotImplementedError
+
+    def load(self, unit):
+        """read one unit into a DataFrame"""
+        raise NotImplementedError
+
+    def normalize(self, unit, df, report):
+        """check source-specific requirements and convert to ERMIN rows
+
+        Returns:
+        warnings, errors (Diagnostics): problems found
+        df (DataFrame): ERMIN rows, or None if the unit must be skipped
+        """
+        raise NotImplementedError
+
+    def validate(self, unit, df, report, workers=1):
+        """check (and repair) ERMIN rows, returning (warnings, errors, df) like check_ermin_dataframe
+
+        With more than one worker, partitions are checked in workers processes (see
+        check_ermin_partitioned, which does not relate constant columns to the others)."""
+        compact_frame(df, load_specification(self.ermin_specification).frame_dtypes())
+        if workers > 1:
+            warnings, errors, df = eev.check_ermin_partitioned(df, spec_file=self.ermin_specification, repair=True,
+                                                               workers=workers)
+        else:
+            warnings, errors, df = eev.check_ermin_dataframe(df, spec_file=self.ermin_specification, repair=True)
+        return Diagnostics.from_messages(warnings), Diagnostics.from_messages(errors), df
+
+    def load_blocks(self, unit, chunksize):
+        """iterate over the rows of one unit in blocks of chunksize rows, see run_sources(chunksize=...);
+        None if the source only loads whole units"""
+        return None
+
+    def check_blocks(self, unit, blocks, report):
+        """checks needing all rows of a unit read in blocks, made before any block is converted
+
+        Returns:
+        warnings, errors (Diagnostics): problems found
+        """
+        return Diagnostics(), Diagnostics()
+
+    def convert(self, unit, df, report):
+        """convert one block, checked by check_blocks, to ERMIN rows"""
+        raise NotImplementedError
+
+    def set_version(self, unit, version, changelog):
+        """called with the version recorded for unit before it is processed, e.g. to fill data_version"""
+
+    def refresh(self, unit, df):
+        """fill values specific to this run (e.g. a timestamp) into clean ERMIN rows of unit, computed
+        or taken from the cache, before they are passed on; such values are not in fingerprint"""
+        return df
+
+    def dependencies(self):
+        """files every unit's result depends on besides its own input, e.g. specifications"""
+        return [self.ermin_specification]
+
+    def fingerprint(self, unit):
+        """anything besides files that unit's result depends on, e.g. settings; part of its cache key"""
+        return None
+
+
+def process_unit(source, unit, instrument=False, snapshots=None, ermin_workers=1, df=None):
+    """load, normalize and validate one unit; runs in a worker process when scheduled in parallel
+
+    With snapshots (a SnapshotStore), only rows added or changed since the unit's
+    last ingested drop are validated and returned, see utils.delta.keep_changes.
+
+    Parameters:
+    ermin_workers (int): worker processes validating partitions of the unit's rows, see Source.validate
+    df (DataFrame): the unit's table, if already loaded
+
+    Returns:
+    result (dict): source and unit names, warnings and errors (Diagnostics),
+                   df (clean ERMIN rows, or None if the unit failed a check or nothing changed),
+                   stages (list of step measurements, empty unless instrument),
+                   changes (see utils.delta.keep_changes, None without snapshots)
+    """
+    report = RunReport(enabled=instrument)
+    result = _new_result(source, unit)
+    try:
+        if df is None:
+            with report.stage(unit.name, STAGE_LOAD) as stage:
+                df = source.load(unit)
+                stage['rows_out'] = len(df)
+        with report.stage(unit.name, STAGE_NORMALIZE, rows_in=len(df)) as stage:
+            warnings, errors, df = source.normalize(unit, df, report)
+            stage['rows_out'] = None if df is None else len(df)
+        result['warnings'] += warnings
+        result['errors'] += errors
+        if df is None or len(errors) > 0:
+            return result
+        if snapshots is not None:
+            with report.stage(unit.name, STAGE_DELTA, rows_in=len(df)) as stage:
+                df, result['changes'] = delta.keep_changes(df, snapshots, source.name, unit.name)
+                stage['rows_out'] = len(df)
+            if source.verbose:
+                stats = result['changes']['delta']
+                print(source.name + ' ' + unit.name + ': ' + delta.changelog(stats) + ', ' + str(stats['unchanged']) + ' unchanged')
+            if len(df) == 0:
+                return result
+        with report.stage(unit.name, STAGE_VALIDATE, rows_in=len(df)) as stage:
+            warnings, errors, df = source.validate(unit, df, report, workers=ermin_workers)
+            stage['rows_out'] = len(df)
+        result['warnings'] += warnings
+        result['errors'] += errors
+        if len(errors) == 0:
+            result['df'] = df
+        return result
+    finally:
+        result['stages'] = report.to_list()
+
+
+def process_unit_blocks(source, unit, chunksize, spill_dir=None, instrument=False, ermin_workers=1):
+    """load, check, convert and validate one unit in blocks of chunksize rows
+
+    The unit is streamed twice, so only one block is in memory at a time. The first
+    pass runs source.check_blocks over all blocks. If it finds no errors, the second
+    converts and validates each block. Blocks are only passed on once all of them
+    are valid: until then they are spilled to Parquet files in spill_dir (without
+    spill_dir, they are dropped once validated). Sources that only load whole units
+    are processed by process_unit instead.
+
+    Returns:
+    result (dict): as for process_unit, with step measurements added up over blocks and
+                   blocks, the paths of the spilled blocks in order (empty if a block
+                   failed validation); df is None unless the unit was loaded whole
+    """
+    if source.load_blocks(unit, chunksize) is None:
+        return process_unit(source, unit, instrument, ermin_workers=ermin_workers)
+
+    report = RunReport(enabled=instrument)
+    result = _new_result(source, unit)
+    try:
+        warnings, errors = source.check_blocks(unit, _measured_blocks(source.load_blocks(unit, chunksize), unit.name, report), report)
+        result['warnings'] += warnings
+        result['errors'] += errors
+        if len(errors) > 0:
+            return result
+
+        for df in _measured_blocks(source.load_blocks(unit, chunksize), unit.name, report):
+            with report.stage(unit.name, STAGE_NORMALIZE, rows_in=len(df)) as stage:
+                df = source.convert(unit, df, report)
+                stage['rows_out'] = len(df)
+            with report.stage(unit.name, STAGE_VALIDATE, rows_in=len(df)) as stage:
+                warnings, errors, df = source.validate(unit, df, report, workers=ermin_workers)
+                stage['rows_out'] = len(df)
+            result['warnings'] += warnings
+            result['errors'] += errors
+            if len(errors) > 0:
+                break
+            if spill_dir is not None:
+                fd, path = tempfile.mkstemp(dir=spill_dir, suffix='.parquet')
+                os.close(fd)
+                result['blocks'].append(path)
+                df.to_parquet(path, index=False)
+        return result
+    finally:
+        if len(result['errors']) > 0:
+            remove_blocks(result)
+        result['stages'] = report.to_list()
+
+
+def remove_blocks(result):
+    """delete the spilled blocks of a result of process_unit_blocks"""
+    for path in result['blocks']:
+        if os.path.exists(path):
+            os.remove(path)
+    result['blocks'] = []
+
+
+def _new_result(source, unit):
+    return {'source': source.name, 'unit': unit.name, 'warnings': Diagnostics(), 'errors': Diagnostics(),
+            'df': None, 'stages': [], 'changes': None, 'blocks': []}
+
+
+def _measured_blocks(blocks, unit_name, report):
+    """iterate over blocks, measuring the time spent reading each as the load stage"""
+    while True:
+        with report.stage(unit_name, STAGE_LOAD) as stage:
+            df = next(blocks, None)
+            if df is not None:
+                stage['rows_out'] = len(df)
+            else:
+                stage['discard'] = True # the end of the unit, not a block
+        if df is None:
+            return
+        yield df
+
+
+def _process_job(job):
+    """a job is arguments for process_unit, an already available (cached) result,
+    or a prepared call, e.g. of process_unit_blocks or a profiled process_unit"""
+    if isinstance(job, dict):
+        return job
+    if callable(job):
+        return job()
+    return process_unit(*job)
+
+
+def run_sources(sources, sink=None, workers=1, cache_dir=None, cache_max_mb=2048,
+                version_registry=None, report=None, error_output=None, verbose=True, all_errors=False,
+                snapshot_dir=None, removed_sink=None, when_loaded=None, chunksize=None, spill_dir=None,
+                ermin_workers=1, profile_unit=None, profile_prefix='profile_'):
+    """process the units of all sources as one job
+
+    Units of all sources share one pool of worker processes and are scheduled
+    in turn (the first unit of each source, then the second of each, ...), so
+    every inventory makes progress at once and a large one does not hold up the
+    others. Results are handed on in that order.
+
+    Parameters:
+    sources (list): Source instances, e.g. SOURCES[name](datadir) for each registered name
+    sink (callable): called as sink(key, df) with the clean ERMIN rows of each unit (or, with
+                     chunksize, of each block), where key is <source>_<unit>; if None, they are
+                     collected in the returned dict
+    workers (int): number of worker processes (1 processes units in this process)
+    cache_dir (str): if given, results of units whose input and dependencies are unchanged since
+                     a previous run are reused from here (see utils.cache), one subdirectory per source;
+                     values specific to this run are filled in afterwards, see Source.refresh
+    cache_max_mb (int): size bound of each source's cache
+    version_registry (VersionRegistry): if given, the version of each unit is recorded in it
+    report (RunReport): report to add step measurements to
+    error_output (str): if given, write all warnings and errors to this file
+    verbose (bool): print progress; the errors of failed units are printed regardless
+    all_errors (bool): print all errors of each failed unit, not just the first 10
+    snapshot_dir (str): if given, a snapshot of each ingested unit is kept here, and only rows added or
+                        changed since then are validated and passed on (see utils.delta); the changelog
+                        of each new version in version_registry is filled from the changes
+    removed_sink (callable): with snapshot_dir, called as removed_sink(key, keys) with the key columns
+                             of rows of the last ingested drop of a unit missing from this one
+    when_loaded (callable): with snapshot_dir, called as when_loaded(key, commit) once the rows of a unit
+                            are passed on; commit() passes on the removed rows, fills in the changelog and
+                            saves the snapshot, and must only be called once the rows are stored, e.g. by
+                            UploadQueue.after. If None, the rows are taken to be stored when sink returns
+    chunksize (int): if given, units of sources that can (see Source.load_blocks) are read and processed
+                     in blocks of this many rows (see process_unit_blocks), and passed to sink block
+                     by block once all their blocks are valid; without sink, the blocks are not kept.
+                     They are not cached and not compared with snapshots
+    spill_dir (str): with chunksize, where validated blocks wait for the rest of their unit
+                     (default a temporary directory, removed at the end)
+    ermin_workers (int): worker processes validating partitions of each unit, when units are
+                         processed in this process (workers is 1); with 1, each unit is
+                         validated whole (see Source.validate)
+    profile_unit (str): run the unit with this key under cProfile and tracemalloc (see
+                        utils.instrumentation.profiled), writing <profile_prefix><key>.* files
+
+    Returns:
+    clean_data (dict): clean ERMIN DataFrames keyed by <source>_<unit> (empty if sink is given)
+    diagnostics (dict): (warnings, errors) keyed by <source>_<unit>
+    changes (dict): rows added, changed, removed and unchanged keyed by <source>_<unit>
+                    (empty without snapshot_dir)
+    """
+    if report is None:
+        report = RunReport(enabled=False)
+    caches = {}
+    if cache_dir is not None and chunksize is None: # blocks go to sink, so nothing to cache
+        caches = {source.name: SectorCache(os.path.join(cache_dir, source.name),
+                                           dependency_paths=source.dependencies(),
+                                           max_bytes=cache_max_mb * 1024 * 1024)
+                  for source in sources}
+    # (source, unit, cache key) of each job, in job order, where the cache key is None for jobs
+    # served from the cache; results come back in that order, and a unit name may occur twice
+    # (e.g. two drops)
+    scheduled = deque()
+    # with snapshots of the last ingested drops, only changed rows are validated and passed on
+    snapshots = SnapshotStore(snapshot_dir) if snapshot_dir is not None and chunksize is None else None
+    clean_data = {}
+
+    def jobs(spill_dir):
+        for source, unit in _interleave({source: source.discover() for source in sources}):
+            key = source.name + '_' + unit.name
+            if version_registry is not None and unit.version is not None:
+                version_registry.record(source.name, unit.name, unit.version)
+                source.set_version(unit, *version_registry.latest(source.name, unit.name)[1:])
+            if chunksize is not None:
+                job = partial(process_unit_blocks, source, unit, chunksize, spill_dir, report.enabled,
+                              ermin_workers if workers == 1 else 1)
+                if key == profile_unit:
+                    job = partial(profiled, profile_prefix + key, job)
+                scheduled.append((source, unit, None))
+                yield job
+                continue
+            cache_key = None
+            if source.name in caches:
+                cache = caches[source.name]
+                extra = source.fingerprint(unit)
+                if snapshots is not None: # the result is the change since the snapshot
+                    extra = (extra, snapshots.fingerprint(source.name, unit.name))
+                cache_key = cache.key(unit.path, unit.name, extra=extra)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    if verbose:
+                        print(source.name + ' ' + unit.name + ': input unchanged, using cached results')
+                    cached['stages'] = [] # measured in the run that computed them
+                    scheduled.append((source, unit, None))
+                    yield cached
+                    continue
+            job = (source, unit, report.enabled, snapshots,
+                   ermin_workers if workers == 1 else 1) # no pools within the unit worker processes
+            if key == profile_unit:
+                job = partial(profiled, profile_prefix + key, process_unit, *job)
+            scheduled.append((source, unit, cache_key))
+            yield job
+
+    diagnostics = {}
+    changes = {}
+    with ExitStack() as stack:
+        if chunksize is not None and sink is not None and spill_dir is None:
+            spill_dir = tempfile.mkdtemp(prefix='blocks_')
+            stack.callback(shutil.rmtree, spill_dir, ignore_errors=True)
+        elif sink is None:
+            spill_dir = None # blocks are only validated
+        if workers > 1:
+            executor = stack.enter_context(process_pool(workers))
+            results = imap_bounded(executor, _process_job, jobs(spill_dir), window=2 * workers)
+        else:
+            results = map(_process_job, jobs(spill_dir))
+
+        for result in results:
+            source, unit, cache_key = scheduled.popleft()
+            key = result['source'] + '_' + result['unit']
+            report.extend(result['stages'])
+            diagnostics[key] = (result['warnings'], result['errors'])
+            if len(result['errors']) > 0:
+                print('\n' + key + ' encountered ' + count_by_code(result['errors']) + ', skipped' +
+                      ('' if all_errors else ' (printing up to 10)') + ':')
+                print('\n'.join(result['errors'] if all_errors else result['errors'][:10]))
+            if result['df'] is not None:
+                df = source.refresh(unit, result['df'])
+                if sink is not None:
+                    sink(key, df)
+                else:
+                    clean_data[key] = df
+            for path in result.get('blocks', []): # all blocks of the unit are valid
+                sink(key, source.refresh(unit, pd.read_parquet(path)))
+                os.remove(path)
+            if result['changes'] is not None:
+                changes[key] = result['changes']['delta']
+                if len(result['errors']) == 0: # ingested, the next drop is compared to this one
+                    commit = partial(delta.record_changes, result['changes'], snapshots, result['source'],
+                                     result['unit'], version_registry, removed_sink, key=key)
+                    if when_loaded is not None:
+                        when_loaded(key, commit)
+                    else:
+                        commit()
+            if cache_key is not None:
+                caches[result['source']].put(cache_key, result)
+
+    if error_output is not None:
+        print('Writing all warnings and errors to output file ' + error_output)
+        write_diagnostics(diagnostics, error_output)
+
+    return clean_data, diagnostics, changes
+
+
+def _interleave(units_by_source):
+    """yield (source, unit) taking one unit of each source in turn"""
+    queues = [(source, deque(units)) for source, units in units_by_source.items() if len(units) > 0]
+    while queues:
+        for source, units in queues:
+            yield source, units.popleft()
+        queues = [(source, units) for source, units in queues if units]
+
+
+def count_by_code(errors):
+    """e.g. '12 errors (negative_emissions: 10, spanning_entry: 2)'"""
+    return str(len(errors)) + ' errors (' + \
+        ', '.join(code + ': ' + str(count) for code, count in errors.summary().items()) + ')'
+
+
+def write_diagnostics(diagnostics, path):
+    """write warnings and errors keyed by unit, as returned by run_sources, to a text file"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        for key, (warnings, errors) in diagnostics.items():
+            if len(warnings) > 0:
+                f.write('\n' + key + ' encountered warnings:\n')
+                f.write('\n'.join(warnings))
+            if len(errors) > 0:
+                f.write('\n' + key + ' encountered errors:\n')
+                f.write('\n'.join(errors))
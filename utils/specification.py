@@ -0,0 +1,129 @@
+import pandas as pd
+import numpy as np
+import os
+
+# syntaxes whose values are floats, optionally with NULL (or empty) for missing
+FLOAT_SYNTAXES = ['{float}', '[{float}|NULL]']
+
+# syntaxes whose values are points in time
+TIMESTAMP_SYNTAXES = ['{timestamp}']
+
+_specifications = {} # compiled specifications keyed by (absolute path, mtime)
+
+
+def load_specification(spec_file):
+    """return the compiled Specification for spec_file
+
+    Specifications are compiled once per process and reused until the file
+    changes (its modification time differs)."""
+
+    path = os.path.abspath(spec_file)
+    key = (path, os.path.getmtime(path))
+    if key not in _specifications:
+        # drop stale compilations of the same file
+        for stale in [k for k in _specifications if k[0] == path]:
+            del _specifications[stale]
+        _specifications[key] = Specification(path)
+    return _specifications[key]
+
+
+class Specification:
+    """Specification CSV (e.g. templates/ermin-specification.csv) compiled for reuse
+
+    Attributes:
+    path (str): path of the specification CSV
+    rows (list): one dict per specification row, as returned by ermin's load_spec
+    columns (list): structured column names, in specification order
+    required (dict): True for columns whose Required field is "Yes", keyed by column
+    syntax (dict): value syntax, keyed by column
+    defaults (dict): default value for columns that have one, keyed by column
+    validators (dict): column-wise validators for columns whose syntax is known here,
+                       each taking a Series and returning a bool array marking invalid values
+    """
+
+    def __init__(self, path):
+        self.path = path
+        table = pd.read_csv(path, keep_default_na=False, dtype=str)
+        table = table[table['Structured name'] != '']
+
+        self.rows = table.to_dict('records')
+        self.columns = table['Structured name'].tolist()
+        self.required = dict(zip(self.columns, table['Required'] == 'Yes'))
+        self.syntax = dict(zip(self.columns, table['Value syntax']))
+        self.defaults = {}
+        if 'Default' in table:
+            self.defaults = {column: default for column, default in zip(self.columns, table['Default'])
+                             if default != ''}
+        self.validators = {}
+        for column, syntax in self.syntax.items():
+            validator = compile_validator(syntax)
+            if validator is not None:
+                self.validators[column] = validator
+
+    def columns_with_syntax(self, syntaxes):
+        """columns whose value syntax is one of syntaxes, in specification order"""
+        return [column for column in self.columns if self.syntax[column] in syntaxes]
+
+    def read_options(self):
+        """read_csv options reading only specification columns, with float columns as float64
+
+        Returns:
+        options (dict): {'usecols': callable, 'dtype': dict}
+        """
+        # a callable tolerates spec columns that are absent from a file;
+        # the validators then report them as missing
+        return {'usecols': frozenset(self.columns).__contains__,
+                'dtype': {column: 'float64' for column in self.columns_with_syntax(FLOAT_SYNTAXES)}}
+
+    def frame_dtypes(self):
+        """dtypes of the compact frame schema (see utils.reshape.compact_frame)
+
+        Float columns are float64, timestamp columns datetime64[ns], and all
+        other columns category, since they hold few distinct values per sector.
+
+        Returns:
+        dtypes (dict): dtype name keyed by column, in specification order
+        """
+        dtypes = {}
+        for column in self.columns:
+            if self.syntax[column] in FLOAT_SYNTAXES:
+                dtypes[column] = 'float64'
+            elif self.syntax[column] in TIMESTAMP_SYNTAXES:
+                dtypes[column] = 'datetime64[ns]'
+            else:
+                dtypes[column] = 'category'
+        return dtypes
+
+
+# Column-wise validators for syntaxes that can be checked here, keyed by syntax.
+# Other modules add their own with register_validator.
+SYNTAX_VALIDATORS = {}
+
+
+def register_validator(syntax, validator):
+    """make validator(Series) -> bool array of invalid values available for syntax"""
+    SYNTAX_VALIDATORS[syntax] = validator
+    _specifications.clear() # compile again on next load, picking up the new validator
+
+
+def compile_validator(syntax):
+    """return the column-wise validator for syntax, or None if it is only checked by ERMIN"""
+    if syntax in SYNTAX_VALIDATORS:
+        return SYNTAX_VALIDATORS[syntax]
+    if syntax.startswith('[') and syntax.endswith(']') and '{' not in syntax:
+        # enumeration of literal options, e.g. [20-year|100-year|NA]
+        options = [option.strip() for option in syntax[1:-1].split('|')]
+        return lambda column: (column.notna() & ~column.astype(str).isin(options)).to_numpy()
+    return None
+
+
+def _invalid_floats(column):
+    """values that are neither missing ('', 'NULL', nan) nor convertible to float"""
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return np.zeros(len(column), dtype=bool)
+    missing = column.isna() | column.isin(['', 'NULL'])
+    return (pd.to_numeric(column.where(~missing), errors='coerce').isna() & ~missing).to_numpy()
+
+
+for _syntax in FLOAT_SYNTAXES:
+    register_validator(_syntax, _invalid_floats)
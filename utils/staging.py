@@ -0,0 +1,139 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import os
+import uuid
+from utils.import_data import list_data_files, excel_engine, DEFAULT_PATH_TO_DATA, STAGED_SHEET_KEY
+
+# Parquet staging for raw inputs and cleaned ERMIN output.
+# Requires pyarrow (used by pandas for all Parquet reading and writing).
+
+ERMIN_PARTITION_COLUMNS = ['reporting_entity', 'original_inventory_sector', 'year']
+
+
+def _arrow_safe(df):
+    """make a raw table storable as Parquet
+
+    Column names become strings, and object columns holding a mix of types
+    (e.g. header rows above numbers in EDGAR sheets) are stored as strings.
+    """
+    df = df.copy(deep=False)
+    df.columns = [str(column) for column in df.columns]
+    for column in df.columns:
+        if df[column].dtype == object:
+            inferred = pd.api.types.infer_dtype(df[column], skipna=True)
+            if inferred not in ['string', 'empty', 'floating', 'integer', 'boolean']:
+                df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+    return df
+
+
+def stage_raw_data(reporting_entity,
+                   path_to_data=DEFAULT_PATH_TO_DATA,
+                   staging_dir='staged',
+                   dtype=None,
+                   usecols=None,
+                   verbose=True):
+    """convert raw CSV/workbook drops into typed, compressed Parquet files
+
+    Each CSV becomes <staging_dir>/<original name>.parquet, and each workbook
+    sheet becomes <staging_dir>/<workbook name>_<sheet name>.parquet, with the
+    sheet name stored in its metadata (see utils.import_data.staged_sheet), so
+    iter_data_from_local(reporting_entity, staging_dir) yields the same keys as
+    reading the raw drop. Files whose staged copy is newer than the source are
+    not converted again.
+
+    Staged copies of files no longer in path_to_data (e.g. earlier drops) stay
+    in staging_dir; read the returned paths rather than all of staging_dir.
+
+    Parameters:
+    reporting_entity (str): inventory name at the start of each filename
+    path_to_data (str): directory containing raw input files
+    staging_dir (str): directory to write Parquet files to
+    dtype (dict): column dtypes for CSV files, e.g. from spec_read_options
+    usecols (list or callable): columns to keep from CSV files
+
+    Returns:
+    staged (list): paths of the Parquet files for the files now in path_to_data
+    """
+    os.makedirs(staging_dir, exist_ok=True)
+    staged = []
+    for file_info, path in list_data_files(reporting_entity, path_to_data):
+        file = os.path.basename(path)
+        if file.endswith('.csv'):
+            target = os.path.join(staging_dir, file[:-len('.csv')] + '.parquet')
+            if not _is_current(target, path):
+                if verbose:
+                    print(f'Staging {file}')
+                try:
+                    df = pd.read_csv(path, dtype=dtype, usecols=usecols)
+                except ValueError:
+                    # leave values that don't match the dtypes for the validators to report
+                    df = pd.read_csv(path, usecols=usecols)
+                _arrow_safe(df).to_parquet(target, index=False, compression='zstd')
+            staged.append(target)
+        elif file.endswith('.xlsx') | file.endswith('.xls'):
+            f = pd.ExcelFile(path, engine=excel_engine())
+            stem = os.path.splitext(file)[0]
+            for sheet in f.sheet_names:
+                # sheet names repeat across workbooks (e.g. 'IPCC 2006' in every EDGAR gas workbook)
+                target = os.path.join(staging_dir, f'{stem}_{sheet}.parquet')
+                if not _is_current(target, path):
+                    if verbose:
+                        print(f'Staging {file}, sheet {sheet}')
+                    table = pa.Table.from_pandas(_arrow_safe(f.parse(sheet_name=sheet)), preserve_index=False)
+                    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                                           STAGED_SHEET_KEY: sheet.encode()})
+                    pq.write_table(table, target, compression='zstd')
+                staged.append(target)
+        elif file.endswith('.parquet'):
+            staged.append(path)
+    return staged
+
+
+def _is_current(target, source):
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source)
+
+
+def write_ermin_parquet(df, root_path, partition_cols=ERMIN_PARTITION_COLUMNS, append=False):
+    """write a cleaned ERMIN table as a Parquet dataset partitioned by entity/sector/year
+
+    df is a DataFrame or an Arrow table (e.g. from utils.arrow.ermin_table, which
+    is written without conversion). The year partition is taken from start_time.
+    Existing files in the partitions being written are replaced, so re-running a
+    sector does not duplicate it. With append, files are added next to the
+    existing ones instead, e.g. for the second and later blocks of a sector
+    written in blocks.
+    """
+    table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+    if 'year' in partition_cols:
+        start_time = table['start_time']
+        if pa.types.is_timestamp(start_time.type):
+            year = pc.year(start_time)
+        else:
+            year = pc.utf8_slice_codeunits(start_time.cast(pa.string()), 0, 4)
+        table = table.append_column('year', year)
+    if append:
+        # a fresh file name per call, so earlier blocks are not overwritten
+        options = {'existing_data_behavior': 'overwrite_or_ignore',
+                   'basename_template': 'part-' + uuid.uuid4().hex + '-{i}.parquet'}
+    else:
+        options = {'existing_data_behavior': 'delete_matching'}
+    pq.write_to_dataset(table, root_path, partition_cols=partition_cols, compression='zstd', **options)
+
+
+def write_ermin_csv(table, path, append=False):
+    """write a cleaned ERMIN Arrow table (see utils.arrow.ermin_table) as CSV, with a header
+    unless append, in which case the rows are added to the end of the file"""
+    with open(path, 'ab' if append else 'wb') as f:
+        pacsv.write_csv(table, f, pacsv.WriteOptions(include_header=not append))
+
+
+def read_ermin_parquet(root_path, columns=None, filters=None):
+    """read (a subset of) a partitioned ERMIN dataset
+
+    e.g. read_ermin_parquet('ermin', columns=['start_time', 'emission_quantity'],
+                            filters=[('original_inventory_sector', '=', 'aluminum')])
+    """
+    return pd.read_parquet(root_path, columns=columns, filters=filters)
@@ -0,0 +1,146 @@
+import queue
+import threading
+import traceback
+from utils.instrumentation import RunReport
+
+# sector states reported by UploadQueue.status
+QUEUED = 'queued'
+UPLOADING = 'uploading'
+DONE = 'done'
+FAILED = 'failed'
+
+DEFAULT_MAX_PENDING = 2
+
+
+class UploadQueue:
+    """Upload sectors in worker threads while the pipeline keeps validating
+
+    Pass put as the sink of climate_trace.main: each clean sector (or block of a
+    sector, with chunksize) is queued and written by upload(sector, df, first) in
+    one of the worker threads, where first is True for the first block of a
+    sector. Uploads are I/O bound, so threads overlap them with the CPU-bound
+    validation of the following sectors.
+
+    Each sector is assigned to one worker, so the blocks of a sector are uploaded
+    in order and never concurrently. Each worker holds at most max_pending
+    frames; put blocks while its worker is full, so validation cannot run
+    ahead of the uploads by more than workers * max_pending frames.
+
+    If uploading a block fails, the sector is marked failed and its remaining
+    blocks are skipped; other sectors carry on. after queues a callback behind
+    a sector's blocks, e.g. to record what was loaded only once it is.
+
+    Parameters:
+    upload (callable): called as upload(sector, df, first)
+    workers (int): number of uploader threads
+    max_pending (int): frames queued per worker before put blocks
+    report (RunReport): if given, each upload is measured as stage of its sector
+                        (CPU time is that of the whole process)
+    stage (str): stage name for report
+    """
+
+    def __init__(self, upload, workers=2, max_pending=DEFAULT_MAX_PENDING, report=None, stage='upload'):
+        self.upload = upload
+        self.report = report if report is not None else RunReport(enabled=False)
+        self.stage = stage
+        self._status = {} # per sector: state, frames pending, blocks and rows uploaded, error
+        self._lock = threading.Lock()
+        self._assigned = {} # worker index per sector
+        self._queues = [queue.Queue(maxsize=max_pending) for _ in range(workers)]
+        self._threads = [threading.Thread(target=self._work, args=(q,), daemon=True) for q in self._queues]
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, sector, df):
+        """queue df for upload, blocking while the sector's worker is full"""
+        with self._lock:
+            if sector not in self._assigned:
+                self._assigned[sector] = len(self._assigned) % len(self._queues)
+                self._status[sector] = {'state': QUEUED, 'pending': 0, 'blocks': 0, 'rows': 0, 'error': None}
+            status = self._status[sector]
+            status['pending'] += 1
+            if status['state'] == DONE:
+                status['state'] = QUEUED
+            worker = self._assigned[sector]
+        self._queues[worker].put((sector, df, None))
+
+    def after(self, sector, callback):
+        """call callback() in the sector's worker once the frames queued for sector so far are uploaded,
+        or right away if none were; it is not called if an upload of the sector failed, and if it
+        raises, the sector is marked failed"""
+        with self._lock:
+            worker = self._assigned.get(sector)
+        if worker is None:
+            callback()
+        else:
+            self._queues[worker].put((sector, None, callback))
+
+    def close(self):
+        """wait for all queued uploads to finish and stop the workers
+
+        Returns:
+        status (dict): see status()
+        """
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join()
+        return self.status()
+
+    def status(self):
+        """per sector: state (queued, uploading, done or failed), frames pending,
+        blocks and rows uploaded, and the traceback if failed"""
+        with self._lock:
+            return {sector: dict(status) for sector, status in self._status.items()}
+
+    def failed(self):
+        return [sector for sector, status in self.status().items() if status['state'] == FAILED]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _work(self, q):
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            sector, df, callback = item
+            with self._lock:
+                status = self._status[sector]
+                failed = status['state'] == FAILED
+                if callback is None:
+                    if failed:
+                        status['pending'] -= 1
+                    else:
+                        status['state'] = UPLOADING
+                        first = status['blocks'] == 0
+            if failed:
+                continue # skip the rest of a failed sector
+            if callback is not None:
+                self._call(status, callback)
+                continue
+            try:
+                with self.report.stage(sector, self.stage, rows_in=len(df)):
+                    self.upload(sector, df, first)
+            except Exception:
+                with self._lock:
+                    status['pending'] -= 1
+                    status['state'] = FAILED
+                    status['error'] = traceback.format_exc()
+                continue
+            with self._lock:
+                status['pending'] -= 1
+                status['blocks'] += 1
+                status['rows'] += len(df)
+                status['state'] = DONE if status['pending'] == 0 else QUEUED
+
+    def _call(self, status, callback):
+        try:
+            callback()
+        except Exception:
+            with self._lock:
+                status['state'] = FAILED
+                status['error'] = traceback.format_exc()
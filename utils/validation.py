@@ -1,7 +1,21 @@
 # wraps CT-specific validation around ERMIN validators
 from ermin import validation as ev
+from utils.specification import load_specification
+from utils.dates import parse_dates, ISO_FORMAT
+from utils.countries import COUNTRIES_DICT # also re-exported for existing users
+from utils.diagnostics import Diagnostics, MISSING_COLUMN
+from utils.reshape import compact_frame, concat_frames
+from utils.parallel import imap_bounded, process_pool
+from contextlib import ExitStack
 import pandas as pd
+import numpy as np
 import datetime
+import re
+
+DEFAULT_PARTITION_ROWS = 500000
+
+# row numbers in ERMIN messages, positions in the frame it was handed
+ROW_REFERENCE = re.compile(r'\b(rows?) (\d+)\b', re.IGNORECASE)
 
 
 # Function to check CT-specific requirements,
@@ -42,53 +56,147 @@ def check_ct_requirements(input_df, sector,
                                  (i.e. columns to be checked for negative values)
 
        Returns:
-       warnings (list): a list of warnings encountered
-       errors (list): a list of errors encountered
+       warnings (Diagnostics): warnings encountered
+       errors (Diagnostics): errors encountered, see utils.diagnostics
+    """
+    accumulator = CTRequirementsAccumulator(sector,
+                                            max_start_date=max_start_date,
+                                            min_end_date=min_end_date,
+                                            emissions_columns=emissions_columns)
+    accumulator.update(input_df)
+    return accumulator.finalize()
+
+
+class CTRequirementsAccumulator:
+    """Running form of check_ct_requirements for tables read in row blocks
+
+       Row-level checks (entries spanning years, negative emissions) are made
+       as each block arrives. Per-country first start and last end dates, and
+       the set of countries seen, are kept as running aggregates and checked
+       in finalize(), so memory does not grow with the number of rows.
+
+       Parameters: as for check_ct_requirements, without input_df
+    """
+
+    def __init__(self, sector,
+                 max_start_date=datetime.date(2015, 1, 1),
+                 min_end_date=datetime.date(2021,12,31),
+                 emissions_columns = ['CO2_emissions_tonnes', 'CH4_emissions_tonnes', 'N2O_emissions_tonnes', 'total_CO2e_100yrGWP','total_CO2e_20yrGWP']
+                 ):
+        self.sector = sector
+        self.max_start_date = max_start_date
+        self.min_end_date = min_end_date
+        self.emissions_columns = emissions_columns
+        self.dates_by_country = None # first start_date and last end_date per country, in order of appearance
+        self.spanning_errors = Diagnostics()
+        self.negative_errors = Diagnostics()
+
+    def update(self, input_df):
+        """check one block of rows"""
+        # Parse each distinct date string once, then broadcast to rows
+        start_dates = _parse_iso_dates(input_df['start_date'])
+        end_dates = _parse_iso_dates(input_df['end_date'])
+        end_years = end_dates.astype('datetime64[Y]').astype(int) + 1970
+        countries = input_df['iso3_country'].to_numpy()
+
+        # For each country, keep the aggregate date span
+        dates_by_country = pd.DataFrame({'start_date': start_dates,
+                                         'end_date': end_dates,
+                                         'iso3_country': countries}).groupby('iso3_country', sort=False)
+        dates_by_country = pd.DataFrame({'start_date': dates_by_country['start_date'].min(),
+                                         'end_date': dates_by_country['end_date'].max()})
+        if self.dates_by_country is not None:
+            dates_by_country = pd.concat([self.dates_by_country, dates_by_country]).groupby(level=0, sort=False)
+            dates_by_country = pd.DataFrame({'start_date': dates_by_country['start_date'].min(),
+                                             'end_date': dates_by_country['end_date'].max()})
+        self.dates_by_country = dates_by_country
+
+        # For each entry, ensure time starts and ends in same year
+        start_years = start_dates.astype('datetime64[Y]').astype(int) + 1970
+        self.spanning_errors.add('spanning_entry', rows=np.flatnonzero(start_years != end_years),
+                                 start_date=input_df['start_date'].to_numpy(),
+                                 end_date=input_df['end_date'].to_numpy(),
+                                 country=countries)
+
+        # Ensure nan or positive float for all sectors and all emissions quantities
+        # except for "forest-sink" and "net-forest-emissions"
+        if self.sector not in ['forest-sink','net-forest-emissions','other-agricultural-soil-emissions']:
+            emissions_columns = self.emissions_columns
+            values = np.empty((len(input_df), len(emissions_columns)))
+            unconvertible = np.zeros((len(input_df), len(emissions_columns)), dtype=bool)
+            for j, emission_column in enumerate(emissions_columns):
+                values[:, j], unconvertible[:, j] = _emissions_to_float(input_df[emission_column])
+            negative = values < 0
+
+            # one occurrence per row and column, row by row as the values are read;
+            # only the kept examples are gathered
+            columns = np.array(emissions_columns, dtype=object)
+            kept = slice(0, self.negative_errors.max_examples)
+            rows, columns_j = np.nonzero(negative)
+            rows, columns_j, count = rows[kept], columns_j[kept], len(rows)
+            self.negative_errors.add('negative_emissions', count=count, column=columns[columns_j],
+                                     value=values[rows, columns_j], year=end_years[rows], country=countries[rows])
+            rows, columns_j = np.nonzero(unconvertible)
+            rows, columns_j, count = rows[kept], columns_j[kept], len(rows)
+            raw_values = np.array([input_df[emissions_columns[j]].iat[i] for i, j in zip(rows, columns_j)], dtype=object)
+            self.negative_errors.add('unconvertible_emissions', count=count, column=columns[columns_j],
+                                     value=raw_values, year=end_years[rows])
+
+    def finalize(self):
+        """check the per-country aggregates and return (warnings, errors) for all blocks"""
+        warnings = Diagnostics()
+        errors = Diagnostics()
+
+        # For each country, ensure aggregate dates span correct minimum rate
+        if self.dates_by_country is not None:
+            countries = self.dates_by_country.index.to_numpy()
+            first_starts = self.dates_by_country['start_date'].to_numpy().astype('datetime64[D]')
+            last_ends = self.dates_by_country['end_date'].to_numpy().astype('datetime64[D]')
+            errors.add('late_start', rows=np.flatnonzero(first_starts > np.datetime64(self.max_start_date)),
+                       country=countries, date=first_starts, limit=str(self.max_start_date))
+            errors.add('early_end', rows=np.flatnonzero(last_ends < np.datetime64(self.min_end_date)),
+                       country=countries, date=last_ends, limit=str(self.min_end_date))
+
+        errors += self.spanning_errors
+
+        # Ensure all countries present
+        countrylist = set() if self.dates_by_country is None else set(self.dates_by_country.index)
+        missing = [country for country in COUNTRIES_DICT if not country in countrylist]
+        errors.add('missing_country', country=np.array(missing, dtype=object))
+
+        errors += self.negative_errors
+        return warnings, errors
+
+
+def _parse_iso_dates(dates):
+    """Parse a column of ISO date strings into a datetime64[D] array (NaT where missing)"""
+    return parse_dates(dates, ISO_FORMAT).to_numpy().astype('datetime64[D]')
+
+
+def _emissions_to_float(column):
+    """Convert an emissions column to floats, treating '' and 'NULL' as missing
+
+       Returns:
+       values (ndarray): float values, nan where missing or unconvertible
+       unconvertible (ndarray): bool mask of values that could not be converted to float
     """
-    warnings = []
-    errors = []
-
-    # For each country, ensure aggregate dates span correct minimum rate
-    for country in input_df['iso3_country'].unique():
-        start_dates = input_df.loc[input_df['iso3_country'] == country, 'start_date']
-        start_dates = [datetime.datetime.fromisoformat(date).date() for date in start_dates]
-        end_dates = input_df.loc[input_df['iso3_country'] == country, 'end_date']
-        end_dates = [datetime.datetime.fromisoformat(date).date() for date in end_dates]
-        if min(start_dates) > max_start_date:
-            errors.append('Error: Data for country ' + country + ' starts on ' + str(min(start_dates)) + ', requirement is on or before ' + str(max_start_date))
-        if max(end_dates) < min_end_date:
-            errors.append('Error: Data for country ' + country + ' ends on ' + str(max(end_dates)) + ', requirement is on or after ' + str(min_end_date))
-
-    # For each entry, ensure time starts and ends in same year
-    for i in range(len(input_df)):
-        start_year = datetime.datetime.fromisoformat(input_df.at[i,'start_date']).year
-        end_year = datetime.datetime.fromisoformat(input_df.at[i,'end_date']).year
-        if start_year != end_year:
-            errors.append('Error: Entry spans more than one year: ' + str('\t'.join(input_df.loc[i,['start_date','end_date','iso3_country']].tolist())))
-
-    # Ensure all countries present
-    countrylist = input_df['iso3_country'].unique()
-    for country in COUNTRIES_DICT:
-        if not country in countrylist:
-            errors.append('Error: country ' + country + ' missing from input table.')
-
-    # Ensure nan or positive float for all sectors and all emissions quantities
-    # except for "forest-sink" and "net-forest-emissions"
-    if sector not in ['forest-sink','net-forest-emissions','other-agricultural-soil-emissions']:
-        for i in range(len(input_df)):
-            for emission_column in emissions_columns:
-                emissions_val = input_df.at[i,emission_column]
-                year = str(datetime.datetime.fromisoformat(input_df.at[i,'end_date']).year)
-                country = input_df.at[i,'iso3_country']
-                if emissions_val != '' and emissions_val != 'NULL':
-                    try:
-                        emissions_val = float(emissions_val)
-                        if emissions_val < 0:
-                            errors.append('Error: Negative ' + emission_column + ' emissions ' + str(emissions_val) + ' reported in ' + year + ' for country ' + country)
-                    except ValueError:
-                        errors.append('Could not check >=0 status of ' + emission_column + ' value ' + emissions_val + ' reported in ' + year + ' for country ' + 'country because could not convert to float.')
-
-    return warnings, errors
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return column.to_numpy(dtype='float64', na_value=np.nan), np.zeros(len(column), dtype=bool)
+
+    values = np.array(pd.to_numeric(column, errors='coerce'), dtype='float64')
+    unconvertible = np.isnan(values) & column.notna().to_numpy() & ~column.isin(['', 'NULL']).to_numpy()
+    # fall back to float() for the rare values to_numeric rejects, e.g. 'nan'
+    for i in np.nonzero(unconvertible)[0]:
+        try:
+            value = float(column.iat[i])
+        except (TypeError, ValueError):
+            continue
+        values[i] = value
+        unconvertible[i] = False
+    return values, unconvertible
+
+# CT-specific value syntaxes, checked here rather than by ERMIN
+CT_STRINGTYPES = ['{iso3_country}']
 
 # Wrapper function for using ERMIN module to validate data
 # But using climate_trace specification.
@@ -113,25 +221,23 @@ def check_input_dataframe(input_df,
 
        Returns:
        warnings (list): a list of warnings encountered
-       errors (list): a list of errors encountered
+       errors (Diagnostics): errors encountered, see utils.diagnostics
        newdf (DataFrame): only returned if repair
     """
 
-    errors = []
+    errors = Diagnostics()
 
     # Check ct-specific stringtype syntax first
-    ct_stringtypes = ['iso3_country']
-    spec = ev.load_spec(spec_file)
+    spec = load_specification(spec_file)
 
     # check for any CT-specific types
-    for row in spec:
-        syntax = row['Value syntax']
-        fieldname = row['Structured name']
-        if syntax in ct_stringtypes and fieldname in df:
-            # There is a field with CT-specific syntax,
-            # see if it is contained in the inputs
-            for value in df[fieldname]:
-                errors += check_syntax(value, syntax)
+    for fieldname in spec.columns_with_syntax(CT_STRINGTYPES):
+        if fieldname in input_df:
+            # There is a field with CT-specific syntax, validate the whole
+            # column at once and report each distinct invalid value
+            invalid = spec.validators[fieldname](input_df[fieldname])
+            errors.add('invalid_code', value=pd.unique(input_df[fieldname][invalid]).astype(str),
+                       syntax=spec.syntax[fieldname].strip('{}'))
 
     # Now check remaining fields with ERMIN checker
     if repair:
@@ -148,6 +254,181 @@ def check_input_dataframe(input_df,
         return warnings, errors
 
 
+def check_ermin_dataframe(input_df, spec_file=None, repair=False):
+    """ERMIN check of a frame in the compact schema (see utils.reshape.compact_frame)
+
+       ERMIN checks timestamp syntax on strings, so datetime64 columns are handed
+       to it as categoricals of ISO strings, formatted once per distinct value;
+       categorical, float and other columns are passed as they are. A repaired
+       frame is returned in the compact schema.
+
+       Parameters:
+       input_df (DataFrame): ERMIN rows, e.g. from climate_trace.convert_to_ermin
+       spec_file (str): path to the ERMIN specification CSV
+       repair (bool): if True, repair missing/invalid and return new DataFrame
+
+       Returns:
+       warnings (list): a list of warnings encountered
+       errors (list): a list of errors encountered
+       newdf (DataFrame): only returned if repair
+    """
+    timestamps = {}
+    for column in input_df.columns:
+        if pd.api.types.is_datetime64_any_dtype(input_df[column]):
+            codes, uniques = pd.factorize(input_df[column])
+            timestamps[column] = pd.Categorical.from_codes(codes, categories=[date.isoformat() for date in uniques])
+    if len(timestamps) > 0:
+        input_df = input_df.assign(**timestamps) # shallow, the other columns are shared
+
+    if not repair:
+        return ev.check_input_dataframe(input_df, spec_file=spec_file, repair=False)
+    warnings, errors, newdf = ev.check_input_dataframe(input_df, spec_file=spec_file, repair=True)
+    return warnings, errors, compact_frame(newdf, load_specification(spec_file).frame_dtypes())
+
+
+def check_ermin_partitioned(input_df, spec_file=None, repair=False, partition_by=None,
+                            partition_rows=DEFAULT_PARTITION_ROWS, workers=1):
+    """check_ermin_dataframe over partitions of a frame, optionally in worker processes
+
+       Columns holding the same value in every row (e.g. filled values, units,
+       reporting_entity) are checked once, on a single row; the other columns are
+       checked per partition, either the rows of each value of partition_by
+       (e.g. ['emitted_product_formula', 'carbon_equivalency_method']) or blocks
+       of partition_rows rows. Only one partition at a time is handed to ERMIN
+       (or two per worker), so its working copies are bounded by the partition
+       size, not the frame size. Repaired partitions are concatenated, and the
+       constant columns broadcast to them as categoricals.
+
+       Checks relating a constant column to a varying one are not made, and with
+       partition_by the repaired rows come back grouped by partition, so callers
+       opt in to this (see Source.validate); check_ermin_dataframe checks the
+       whole frame. Row numbers in messages about a partition are turned into
+       labels of input_df's index.
+
+       Parameters:
+       input_df (DataFrame): ERMIN rows, e.g. from climate_trace.convert_to_ermin
+       spec_file (str): path to the ERMIN specification CSV
+       repair (bool): if True, repair missing/invalid and return new DataFrame
+       partition_by (list): columns whose values partition the rows (default None, row blocks)
+       partition_rows (int): rows per block if partition_by is None
+       workers (int): number of worker processes checking partitions (1 checks them in this process)
+
+       Returns:
+       warnings (list): a list of warnings encountered
+       errors (list): a list of errors encountered
+       newdf (DataFrame): only returned if repair
+    """
+    constants = constant_columns(input_df)
+    varying = [column for column in input_df.columns if column not in constants]
+    if len(input_df) == 0 or len(varying) == 0:
+        return check_ermin_dataframe(input_df, spec_file=spec_file, repair=repair)
+
+    warnings, errors, parts = [], [], []
+    probe = None
+    if len(constants) > 0:
+        result = check_ermin_dataframe(input_df.iloc[:1][constants], spec_file=spec_file, repair=repair)
+        # the varying columns are checked with the partitions
+        warnings += _without_missing(result[0], varying)
+        errors += _without_missing(result[1], varying)
+        probe = result[2] if repair else None
+
+    jobs = ((part, index, spec_file, repair) for index, part in _partitions(input_df, varying, partition_by, partition_rows))
+    with ExitStack() as stack:
+        if workers > 1:
+            executor = stack.enter_context(process_pool(workers))
+            results = imap_bounded(executor, _check_partition, jobs, window=2 * workers)
+        else:
+            results = map(_check_partition, jobs)
+        for result in results:
+            warnings += _without_missing(result[0], constants)
+            errors += _without_missing(result[1], constants)
+            if repair:
+                parts.append(result[2])
+    warnings, errors = _unique_missing(warnings), _unique_missing(errors)
+    if not repair:
+        return warnings, errors
+
+    newdf = concat_frames(parts)
+    del parts
+    if probe is None or len(probe) == 0: # the single row was dropped by the repair
+        probe = input_df.iloc[:1][constants].reset_index(drop=True)
+    rows = np.zeros(len(newdf), dtype=np.intp)
+    for column in probe.columns:
+        if column in constants or column not in newdf:
+            newdf[column] = probe[column].take(rows).reset_index(drop=True)
+    order = [column for column in load_specification(spec_file).columns if column in newdf]
+    order += [column for column in newdf.columns if column not in order]
+    if order != list(newdf.columns):
+        newdf = newdf[order]
+    return warnings, errors, newdf
+
+
+def constant_columns(df):
+    """columns of df holding the same (non-missing) value in every row"""
+    constants = []
+    if len(df) == 0:
+        return constants
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            values = df[column].cat.codes.to_numpy()
+            if values[0] >= 0 and (values == values[0]).all():
+                constants.append(column)
+        else:
+            values = df[column].to_numpy()
+            if not pd.isna(values[0]) and (values == values[0]).all():
+                constants.append(column)
+    return constants
+
+
+def _partitions(df, columns, partition_by, partition_rows):
+    """yield (index labels, rows) of each partition, the rows renumbered from 0"""
+    if partition_by is not None:
+        for positions in df.groupby(partition_by, observed=True, sort=False).indices.values():
+            part = df.iloc[positions][columns]
+            yield part.index.to_numpy(), part.reset_index(drop=True)
+    else:
+        for start in range(0, len(df), partition_rows):
+            part = df.iloc[start:start + partition_rows][columns]
+            yield part.index.to_numpy(), part.reset_index(drop=True)
+
+
+def _check_partition(job):
+    part, index, spec_file, repair = job
+    result = check_ermin_dataframe(part, spec_file=spec_file, repair=repair)
+    return (_rebase_rows(result[0], index), _rebase_rows(result[1], index)) + tuple(result[2:])
+
+
+def _rebase_rows(messages, index):
+    """messages with the row numbers of a partition replaced by the index labels of those rows"""
+    def label(match):
+        row = int(match.group(2))
+        return match.group(1) + ' ' + str(index[row]) if row < len(index) else match.group(0)
+    return [ROW_REFERENCE.sub(label, message) for message in messages]
+
+
+def _without_missing(messages, columns):
+    """messages without those reporting one of columns as missing (they are checked elsewhere)"""
+    kept = []
+    for message in messages:
+        match = MISSING_COLUMN.match(message)
+        if match is None or match.group(1) not in columns:
+            kept.append(message)
+    return kept
+
+
+def _unique_missing(messages):
+    """messages with each missing column reported once, not once per partition"""
+    seen = set()
+    kept = []
+    for message in messages:
+        if MISSING_COLUMN.match(message) is not None:
+            if message in seen:
+                continue
+            seen.add(message)
+        kept.append(message)
+    return kept
+
+
 def check_syntax(value, syntax):
     """CT-specific syntax checker, e.g. for {iso3_country} stringtype
        
@@ -155,9 +436,12 @@ def check_syntax(value, syntax):
 
        Currently, the only accepted string type is {iso3_country}
 
+       Checks a single value; to check a whole column use the specification's
+       validators, as check_input_dataframe does.
+
        Parameters:
        value (str): input value to be checked
-       stringtype (str): acceptable syntax description
+       syntax (str): acceptable syntax description
 
        Returns:
        list: list of errors, empty if no errors
@@ -166,270 +450,15 @@ def check_syntax(value, syntax):
 
     # First check non-string options (bool, int, float, timestamp)
     if type(value) is not str:
-        raise ValueError('Syntax is ' + stringtype + ', but this type was provided: ' + str(type(value)))
+        raise ValueError('Syntax is ' + syntax + ', but this type was provided: ' + str(type(value)))
     else:      
         # Now we know the value is a string
 
         # Test each syntax type
-        if stringtype == "{iso3_country}":
+        if syntax == "{iso3_country}":
             if value not in COUNTRIES_DICT:
                 error_list.append('The value ' + value + ' was not a valid iso3_country code.')
         else:
-            raise ValueError('Error: unknown climatetrace stringtype "' + stringtype + '"')
+            raise ValueError('Error: unknown climatetrace stringtype "' + syntax + '"')
 
     return error_list
-
-COUNTRIES_DICT = {
-    "SCG": "deleted",
-    "ANT": "deleted",
-    "ABW": "Aruba",
-    "AFG": "Afghanistan",
-    "AGO": "Angola",
-    "AIA": "Anguilla",
-    "ALA": "Åland Islands",
-    "ALB": "Albania",
-    "AND": "Andorra",
-    "ARE": "United Arab Emirates",
-    "ARG": "Argentina",
-    "ARM": "Armenia",
-    "ASM": "American Samoa",
-    "ATA": "Antarctica",
-    "ATF": "French Southern Territories",
-    "ATG": "Antigua and Barbuda",
-    "AUS": "Australia",
-    "AUT": "Austria",
-    "AZE": "Azerbaijan",
-    "BDI": "Burundi",
-    "BEL": "Belgium",
-    "BEN": "Benin",
-    "BES": "Bonaire, Sint Eustatius and Saba",
-    "BFA": "Burkina Faso",
-    "BGD": "Bangladesh",
-    "BGR": "Bulgaria",
-    "BHR": "Bahrain",
-    "BHS": "Bahamas",
-    "BIH": "Bosnia and Herzegovina",
-    "BLM": "Saint Barthélemy",
-    "BLR": "Belarus",
-    "BLZ": "Belize",
-    "BMU": "Bermuda",
-    "BOL": "Bolivia (Plurinational State of)",
-    "BRA": "Brazil",
-    "BRB": "Barbados",
-    "BRN": "Brunei Darussalam",
-    "BTN": "Bhutan",
-    "BVT": "Bouvet Island",
-    "BWA": "Botswana",
-    "CAF": "Central African Republic",
-    "CAN": "Canada",
-    "CCK": "Cocos (Keeling) Islands",
-    "CHE": "Switzerland",
-    "CHL": "Chile",
-    "CHN": "China",
-    "CIV": "Côte d'Ivoire",
-    "CMR": "Cameroon",
-    "COD": "Democratic Republic of the Congo",
-    "COG": "Congo",
-    "COK": "Cook Islands",
-    "COL": "Colombia",
-    "COM": "Comoros",
-    "CPV": "Cabo Verde",
-    "CRI": "Costa Rica",
-    "CUB": "Cuba",
-    "CUW": "Curaçao",
-    "CXR": "Christmas Island",
-    "CYM": "Cayman Islands",
-    "CYP": "Cyprus",
-    "CZE": "Czechia",
-    "DEU": "Germany",
-    "DJI": "Djibouti",
-    "DMA": "Dominica",
-    "DNK": "Denmark",
-    "DOM": "Dominican Republic",
-    "DZA": "Algeria",
-    "ECU": "Ecuador",
-    "EGY": "Egypt",
-    "ERI": "Eritrea",
-    "ESH": "Western Sahara",
-    "ESP": "Spain",
-    "EST": "Estonia",
-    "ETH": "Ethiopia",
-    "FIN": "Finland",
-    "FJI": "Fiji",
-    "FLK": "Falkland Islands (Malvinas)",
-    "FRA": "France",
-    "FRO": "Faroe Islands",
-    "FSM": "Micronesia (Federated States of)",
-    "GAB": "Gabon",
-    "GBR": "United Kingdom of Great Britain and Northern Ireland",
-    "GEO": "Georgia",
-    "GGY": "Guernsey",
-    "GHA": "Ghana",
-    "GIB": "Gibraltar",
-    "GIN": "Guinea",
-    "GLP": "Guadeloupe",
-    "GMB": "Gambia",
-    "GNB": "Guinea-Bissau",
-    "GNQ": "Equatorial Guinea",
-    "GRC": "Greece",
-    "GRD": "Grenada",
-    "GRL": "Greenland",
-    "GTM": "Guatemala",
-    "GUF": "French Guiana",
-    "GUM": "Guam",
-    "GUY": "Guyana",
-    "HKG": "China, Hong Kong Special Administrative Region",
-    "HMD": "Heard Island and McDonald Islands",
-    "HND": "Honduras",
-    "HRV": "Croatia",
-    "HTI": "Haiti",
-    "HUN": "Hungary",
-    "IDN": "Indonesia",
-    "IMN": "Isle of Man",
-    "IND": "India",
-    "IOT": "British Indian Ocean Territory",
-    "IRL": "Ireland",
-    "IRN": "Iran (Islamic Republic of)",
-    "IRQ": "Iraq",
-    "ISL": "Iceland",
-    "ISR": "Israel",
-    "ITA": "Italy",
-    "JAM": "Jamaica",
-    "JEY": "Jersey",
-    "JOR": "Jordan",
-    "JPN": "Japan",
-    "KAZ": "Kazakhstan",
-    "KEN": "Kenya",
-    "KGZ": "Kyrgyzstan",
-    "KHM": "Cambodia",
-    "KIR": "Kiribati",
-    "KNA": "Saint Kitts and Nevis",
-    "KOR": "Republic of Korea",
-    "XKX": "Kosovo",
-    "KWT": "Kuwait",
-    "LAO": "Lao People's Democratic Republic",
-    "LBN": "Lebanon",
-    "LBR": "Liberia",
-    "LBY": "Libya",
-    "LCA": "Saint Lucia",
-    "LIE": "Liechtenstein",
-    "LKA": "Sri Lanka",
-    "LSO": "Lesotho",
-    "LTU": "Lithuania",
-    "LUX": "Luxembourg",
-    "LVA": "Latvia",
-    "MAC": "China, Macao Special Administrative Region",
-    "MAF": "Saint Martin (French Part)",
-    "MAR": "Morocco",
-    "MCO": "Monaco",
-    "MDA": "Republic of Moldova",
-    "MDG": "Madagascar",
-    "MDV": "Maldives",
-    "MEX": "Mexico",
-    "MHL": "Marshall Islands",
-    "MKD": "The former Yugoslav Republic of Macedonia",
-    "MLI": "Mali",
-    "MLT": "Malta",
-    "MMR": "Myanmar",
-    "MNE": "Montenegro",
-    "MNG": "Mongolia",
-    "MNP": "Northern Mariana Islands",
-    "MOZ": "Mozambique",
-    "MRT": "Mauritania",
-    "MSR": "Montserrat",
-    "MTQ": "Martinique",
-    "MUS": "Mauritius",
-    "MWI": "Malawi",
-    "MYS": "Malaysia",
-    "MYT": "Mayotte",
-    "NAM": "Namibia",
-    "NCL": "New Caledonia",
-    "NER": "Niger",
-    "NFK": "Norfolk Island",
-    "NGA": "Nigeria",
-    "NIC": "Nicaragua",
-    "NIU": "Niue",
-    "NLD": "Netherlands",
-    "NOR": "Norway",
-    "NPL": "Nepal",
-    "NRU": "Nauru",
-    "NZL": "New Zealand",
-    "OMN": "Oman",
-    "PAK": "Pakistan",
-    "PAN": "Panama",
-    "PCN": "Pitcairn",
-    "PER": "Peru",
-    "PHL": "Philippines",
-    "PLW": "Palau",
-    "PNG": "Papua New Guinea",
-    "POL": "Poland",
-    "PRI": "Puerto Rico",
-    "PRK": "Democratic People's Republic of Korea",
-    "PRT": "Portugal",
-    "PRY": "Paraguay",
-    "PSE": "State of Palestine",
-    "PYF": "French Polynesia",
-    "QAT": "Qatar",
-    "REU": "Réunion",
-    "ROU": "Romania",
-    "RUS": "Russian Federation",
-    "RWA": "Rwanda",
-    "SAU": "Saudi Arabia",
-    "SDN": "Sudan",
-    "SEN": "Senegal",
-    "SGP": "Singapore",
-    "SGS": "South Georgia and the South Sandwich Islands",
-    "SHN": "Saint Helena",
-    "SJM": "Svalbard and Jan Mayen Islands",
-    "SLB": "Solomon Islands",
-    "SLE": "Sierra Leone",
-    "SLV": "El Salvador",
-    "SMR": "San Marino",
-    "SOM": "Somalia",
-    "SPM": "Saint Pierre and Miquelon",
-    "SRB": "Serbia",
-    "SSD": "South Sudan",
-    "STP": "Sao Tome and Principe",
-    "SUR": "Suriname",
-    "SVK": "Slovakia",
-    "SVN": "Slovenia",
-    "SWE": "Sweden",
-    "SWZ": "Eswatini",
-    "SXM": "Sint Maarten (Dutch part)",
-    "SYC": "Seychelles",
-    "SYR": "Syrian Arab Republic",
-    "TCA": "Turks and Caicos Islands",
-    "TCD": "Chad",
-    "TGO": "Togo",
-    "THA": "Thailand",
-    "TJK": "Tajikistan",
-    "TKL": "Tokelau",
-    "TKM": "Turkmenistan",
-    "TLS": "Timor-Leste",
-    "TON": "Tonga",
-    "TTO": "Trinidad and Tobago",
-    "TUN": "Tunisia",
-    "TUR": "Turkey",
-    "TUV": "Tuvalu",
-    "TWN": "Taiwan",
-    "TZA": "United Republic of Tanzania",
-    "UGA": "Uganda",
-    "UKR": "Ukraine",
-    "UMI": "United States Minor Outlying Islands",
-    "URY": "Uruguay",
-    "USA": "United States of America",
-    "UZB": "Uzbekistan",
-    "VAT": "Holy See",
-    "VCT": "Saint Vincent and the Grenadines",
-    "VEN": "Venezuela (Bolivarian Republic of)",
-    "VGB": "British Virgin Islands",
-    "VIR": "United States Virgin Islands",
-    "VNM": "Viet Nam",
-    "VUT": "Vanuatu",
-    "WLF": "Wallis and Futuna Islands",
-    "WSM": "Samoa",
-    "YEM": "Yemen",
-    "ZAF": "South Africa",
-    "ZMB": "Zambia",
-    "ZWE": "Zimbabwe",
-}
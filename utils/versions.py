@@ -1,39 +1,138 @@
 from datetime import datetime
 import pandas as pd
+import os
+import sqlite3
+import tempfile
+import threading
 
+VERSION_COLUMNS = ['reporting_entity', 'sector', 'date', 'version', 'changelog']
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+INITIAL_CHANGELOG = 'initial commit, first round of data'
 
-def record_version(reporting_entity, sector, date, path_to_version_csv):
-    """date comes in as YYYYMMDD"""
 
-    version_df = pd.read_csv(path_to_version_csv)
+class VersionRegistry:
+    """Versioning table loaded once and indexed by (reporting_entity, sector)
+
+    New versions are recorded in memory and written in one go by flush().
+    Its methods may be called from several threads, e.g. set_changelog once
+    a sector's upload is done (see utils.upload.UploadQueue.after).
+    Paths ending in .db or .sqlite use a SQLite table named "versions",
+    any other path is a CSV file like scripts/versioning.csv.
+
+    Parameters:
+    path (str): path to versioning CSV or SQLite file (created on flush if missing)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.is_sqlite = os.path.splitext(path)[1] in ['.db', '.sqlite']
+        self.history = self._load()
+        self.new_rows = [] # recorded since load, written by flush()
+        self._lock = threading.RLock()
+
+        # latest (date, version, changelog) per (reporting_entity, sector)
+        self.latest_versions = {}
+        latest = self.history.sort_values(by='date', kind='stable').groupby(['reporting_entity', 'sector']).tail(1)
+        for row in latest.itertuples(index=False):
+            self.latest_versions[(row.reporting_entity, row.sector)] = (row.date, row.version, row.changelog)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            history = pd.DataFrame(columns=VERSION_COLUMNS)
+        elif self.is_sqlite:
+            with sqlite3.connect(self.path) as connection:
+                history = pd.read_sql('SELECT * FROM versions', connection)
+        else:
+            history = pd.read_csv(self.path)
+        history['date'] = pd.to_datetime(history['date'])
+        return history
+
+    def latest(self, reporting_entity, sector):
+        """return (date, version, changelog) of the latest version, or None if there is none"""
+        return self.latest_versions.get((reporting_entity, sector))
+
+    def record(self, reporting_entity, sector, date, changelog='NULL'):
+        """record a data drop dated YYYYMMDD, return its version
 
-    specific_version_info = version_df[(version_df.reporting_entity == reporting_entity) & \
-                                       (version_df.sector == sector)].copy()
-    date = datetime.strptime(date, '%Y%m%d')
+        The first drop of a sector is version 0.0. A drop newer than the latest
+        version gets the next version (+0.1) with the given changelog; an older
+        or same-dated drop records nothing and returns the latest version.
+        """
+        date = datetime.strptime(date, '%Y%m%d')
+        with self._lock:
+            latest = self.latest(reporting_entity, sector)
 
-    if specific_version_info.empty:
-        version = '0.0'
-        changelog = 'initial commit, first round of data'
-    else:
-        specific_version_info['date'] = pd.to_datetime(specific_version_info['date'])
-        version_index = version_df.columns.get_loc('version')
-        date_index = version_df.columns.get_loc('date')
-        date_of_last_version = specific_version_info.sort_values(by='date', ascending=False).iloc[0,date_index]
-        version = specific_version_info.sort_values(by='date', ascending=False).iloc[0, version_index]
+            if latest is None:
+                version = 0.0
+                changelog = INITIAL_CHANGELOG
+            else:
+                date_of_last_version, version, _ = latest
+                if date <= date_of_last_version:
+                    return version
+                version = round(version + 0.1, 1)
 
-        if date <= date_of_last_version:
+            self.latest_versions[(reporting_entity, sector)] = (date, version, changelog)
+            self.new_rows.append({'reporting_entity': reporting_entity,
+                                  'sector': sector,
+                                  'date': date,
+                                  'version': version,
+                                  'changelog': changelog})
+            return version
+
+    def set_changelog(self, reporting_entity, sector, changelog):
+        """set the changelog of the sector's version recorded since loading, e.g. once its
+        row-level changes are known (see utils.delta); no effect if none was recorded"""
+        with self._lock:
+            for row in self.new_rows:
+                if row['reporting_entity'] == reporting_entity and row['sector'] == sector:
+                    row['changelog'] = changelog
+                    self.latest_versions[(reporting_entity, sector)] = (row['date'], row['version'], changelog)
+
+    def record_many(self, drops):
+        """record several (reporting_entity, sector, date) drops, return their versions"""
+        return [self.record(reporting_entity, sector, date) for reporting_entity, sector, date in drops]
+
+    def flush(self):
+        """write versions recorded since loading, atomically"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if len(self.new_rows) == 0:
             return
+        new_rows = pd.DataFrame(self.new_rows, columns=VERSION_COLUMNS)
+
+        if self.is_sqlite:
+            new_rows['date'] = new_rows['date'].dt.strftime(DATE_FORMAT)
+            with sqlite3.connect(self.path) as connection: # one transaction
+                connection.execute('CREATE TABLE IF NOT EXISTS versions '
+                                   '(reporting_entity TEXT, sector TEXT, date TEXT, version REAL, changelog TEXT)')
+                connection.execute('CREATE INDEX IF NOT EXISTS versions_entity_sector ON versions (reporting_entity, sector)')
+                new_rows.to_sql('versions', connection, if_exists='append', index=False)
         else:
-            version += 0.1
-            changelog = 'NULL'
+            history = pd.concat([self.history, new_rows], axis=0) if len(self.history) > 0 else new_rows
+            # write next to the target, then swap it in so readers never see a partial file
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', newline='') as f:
+                history.to_csv(f, index=False, date_format=DATE_FORMAT)
+            os.replace(tmp_path, self.path)
+
+        self.history = pd.concat([self.history, new_rows], axis=0) if len(self.history) > 0 else new_rows
+        self.new_rows = []
 
-    row = pd.DataFrame({'reporting_entity':[reporting_entity],
-                         'sector': [sector],
-                         'date': [date],
-                         'version': [version],
-                        'changelog': [changelog]})
 
-    version_df = pd.concat([version_df, row], axis=0)
-    version_df.to_csv('versioning.csv', index=False)
+def record_version(reporting_entity, sector, date, path_to_version_csv):
+    """date comes in as YYYYMMDD
+
+    Returns the data version for this drop: a new version if the drop is newer than the
+    last recorded one, otherwise the last recorded version. Uploads compare this version
+    (as data_version) to decide which rows have changed.
 
+    Loads and rewrites the whole table; when recording many sectors, use one
+    VersionRegistry and flush it once instead."""
 
+    registry = VersionRegistry(path_to_version_csv)
+    version = registry.record(reporting_entity, sector, date)
+    registry.flush()
+    return version